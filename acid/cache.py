@@ -0,0 +1,65 @@
+import json 
+import uuid 
+import threading 
+from hashlib import sha1 
+from collections import OrderedDict 
+from typing import Any, Awaitable, Callable 
+
+
+INQUIRE_CACHE_MAX_SIZE = 256 
+
+
+class InquireCache: 
+    """
+    查询接口的结果缓存, 以请求内容为 key, 以代数区分新旧 
+
+    每次写入数据库后代数加一, 之前缓存的结果全部失效; ETag 由进程标识, 代数和 key 组成, 
+    代数不变时同一请求的结果不变, 可以直接返回 304 
+    """
+    def __init__(self, name: str, max_size: int = INQUIRE_CACHE_MAX_SIZE): 
+        self.name = name 
+        self.max_size = max_size 
+        # 写入发生在数据库线程中, 读取发生在事件循环中
+        self.lock = threading.Lock() 
+        self.generation = 0 
+        self.instance_id = uuid.uuid4().hex[:8] 
+        self.entry_dict: OrderedDict[str, tuple[int, str, bytes]] = OrderedDict() 
+
+    def bump(self) -> None: 
+        with self.lock: 
+            self.generation += 1 
+
+    def _get_etag(self, key: str, generation: int) -> str: 
+        return f'"{self.name}-{self.instance_id}-{generation}-{sha1(key.encode()).hexdigest()[:16]}"' 
+
+    def get_etag(self, key: str) -> str: 
+        with self.lock: 
+            return self._get_etag(key, self.generation) 
+
+    async def get_or_inquire(self, key: str, inquire_func: Callable[..., Awaitable[Any]], *args: Any) -> tuple[str, bytes]: 
+        """
+        返回 ETag 和序列化后的结果, 缓存失效时调用 inquire_func 查询 
+        """
+        with self.lock: 
+            generation = self.generation 
+            entry = self.entry_dict.get(key) 
+            if entry is not None and entry[0] == generation: 
+                self.entry_dict.move_to_end(key) 
+                return entry[1], entry[2] 
+
+        response = await inquire_func(*args) 
+        body = json.dumps(response, ensure_ascii=False, separators=(',', ':')).encode() 
+        etag = self._get_etag(key, generation) 
+
+        # 查询期间有写入时, 结果仍以查询前的代数保存, 下次读取时会被重新查询
+        with self.lock: 
+            self.entry_dict[key] = (generation, etag, body) 
+            self.entry_dict.move_to_end(key) 
+            while len(self.entry_dict) > self.max_size: 
+                self.entry_dict.popitem(last=False) 
+
+        return etag, body 
+
+
+anime_inquire_cache = InquireCache('anime') 
+episode_inquire_cache = InquireCache('episode') 
@@ -1,19 +1,22 @@
 import os 
+import asyncio 
+from collections import defaultdict 
 
-from sqlmodel import Session, select, and_  
+from sqlmodel import Session, select, and_, or_, true, text, tuple_, delete  
+from sqlalchemy import update 
 
-from settings import AnimeSourcesParsed 
+from settings import AnimeSources, AnimeSourcesParsed 
 from model import AnimeChange, AnimeAdd, AnimeInquire, AnimeDelete, EpisodeInquire  
-from database import engine, AnimeDB, EpisodeUpdateTaskDB 
+from database import ( 
+    run_in_db_executor, engine, anime_fts_available, ANIME_FTS_TABLE_NAME, ANIME_FTS_MIN_QUERY_LENGTH, 
+    AnimeDB, AnimeEpisodeDB, EpisodeUpdateTaskDB, FeedCacheDB, 
+) 
+from acid.cache import anime_inquire_cache 
 from utils import anime 
 
 
-def add_anime(anime_add: AnimeAdd) -> dict[str, str | list[dict[str, str]]]: 
-    uuid = anime.get_uuid(anime_add.name, anime_add.season)     
-    dir_path = anime.get_dir_path(anime_add.name, anime_add.season) 
-
-    os.makedirs(dir_path, exist_ok=True) 
-
+def _anime_add_to_anime_db(anime_add: AnimeAdd) -> AnimeDB | dict[str, str | list]: 
+    # 校验不通过时返回错误信息 
     if anime_add.search_text is None and anime_add.http_url is None: 
         return {'code': 0, 'msg': 'Search text and http url cannot be empty at the same time', 'detail': []} 
 
@@ -34,218 +37,403 @@ def add_anime(anime_add: AnimeAdd) -> dict[str, str | list[dict[str, str]]]:
             search_text = anime_add.search_text 
             http_url = anime.get_http_url(anime_add.source, anime_add.search_text) 
 
-    anime_db = AnimeDB( 
-        uuid=uuid, 
+    return AnimeDB( 
+        uuid=anime.get_uuid(anime_add.name, anime_add.season), 
         name=anime_add.name, 
         season=anime_add.season, 
-        dir_path=dir_path, 
-        source=anime_add.source, 
+        dir_path=anime.get_dir_path(anime_add.name, anime_add.season), 
+        source=anime_add.source.value, 
         search_text=search_text, 
         http_url=http_url, 
-        episodes_str='', 
         newest_pub_date=0., 
         auto_update=anime_add.auto_update, 
         under_management=False, 
     ) 
 
-    with Session(engine) as session: 
-        if session.exec(
-            select(AnimeDB).where(and_(AnimeDB.name == anime_db.name, AnimeDB.season == anime_db.season))
-        ).first() is not None: 
-            return {'code': 0, 'msg': 'Anime is already in the library', 'detail': []} 
-        
-        session.add(anime_db) 
-        session.commit() 
 
-    return {'code': 1, 'msg': 'Anime added successfully', 'detail': []} 
+@run_in_db_executor 
+def _inquire_anime_name_season_exist(name_season_set: set[tuple[str, int]]) -> set[tuple[str, int]]: 
+    with Session(engine) as session: 
+        return set(session.exec( 
+            select(AnimeDB.name, AnimeDB.season).where(tuple_(AnimeDB.name, AnimeDB.season).in_(name_season_set)) 
+        ).all()) 
 
 
-def change_anime(anime_change: AnimeChange) -> dict[str, str | list[dict[str, str]]]: 
+@run_in_db_executor 
+def _add_anime_db_list(anime_db_list: list[AnimeDB]) -> None: 
     with Session(engine) as session: 
-        anime_db = session.exec(select(AnimeDB).where(AnimeDB.uuid == anime_change.uuid).with_for_update()).first() 
-        if anime_db is None: 
-            return {'code': 0, 'msg': 'Anime dose not exist', 'detail': []} 
-        
-        if anime_db.under_management: 
-            return {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
-        
-        anime_db.under_management = True 
-
-        session.add(anime_db) 
+        # 新番剧需要完整解析 RSS, 不能使用条件请求 
+        session.exec(delete(FeedCacheDB).where( 
+            FeedCacheDB.http_url.in_({anime_db.http_url for anime_db in anime_db_list}) 
+        )) 
+        session.add_all(anime_db_list) 
         session.commit() 
+        anime_inquire_cache.bump() 
+
+
+def _batch_response(response_list: list[dict[str, str | list]], action: str) -> dict[str, str | list]: 
+    success_num = sum(response['code'] for response in response_list) 
+    return { 
+        'code': int(success_num == len(response_list)), 
+        'msg': f'{success_num} of {len(response_list)} anime {action} successfully', 
+        'detail': response_list, 
+    } 
+
+
+async def add_anime_batch(anime_add_list: list[AnimeAdd]) -> dict[str, str | list]: 
+    """
+    先校验全部番剧, 再用一次查询检查是否已存在, 并发创建目录后在一个事务中写入 
+
+    detail 中按顺序返回每个番剧的结果 
+    """
+    response_list: list[dict[str, str | list] | None] = [None] * len(anime_add_list) 
+    index_anime_db_dict: dict[int, AnimeDB] = dict() 
+    name_season_set: set[tuple[str, int]] = set() 
+    for index, anime_add in enumerate(anime_add_list): 
+        anime_db = _anime_add_to_anime_db(anime_add) 
+        if isinstance(anime_db, dict): 
+            response_list[index] = anime_db 
+        elif (anime_db.name, anime_db.season) in name_season_set: 
+            response_list[index] = {'code': 0, 'msg': 'Anime is repeated in the batch', 'detail': []} 
+        else: 
+            name_season_set.add((anime_db.name, anime_db.season)) 
+            index_anime_db_dict[index] = anime_db 
 
-    with Session(engine) as session: 
-        anime_db = session.exec(select(AnimeDB).where(AnimeDB.uuid == anime_change.uuid)).first() 
-        
-        if anime_change.search_text is not None and anime_change.http_url is not None: 
-            anime_db.under_management = False 
-            session.add(anime_db) 
-            session.commit() 
+    if len(name_season_set) > 0: 
+        name_season_exist_set = await _inquire_anime_name_season_exist(name_season_set) 
+        for index, anime_db in list(index_anime_db_dict.items()): 
+            if (anime_db.name, anime_db.season) in name_season_exist_set: 
+                response_list[index] = {'code': 0, 'msg': 'Anime is already in the library', 'detail': []} 
+                del index_anime_db_dict[index] 
 
-            return {'code': 0, 'msg': 'Search text and http url cannot have values at the same time', 'detail': []} 
+    makedirs_result_list = await asyncio.gather(*( 
+        asyncio.to_thread(os.makedirs, anime_db.dir_path, exist_ok=True) for anime_db in index_anime_db_dict.values() 
+    ), return_exceptions=True) 
+    for index, makedirs_result in zip(list(index_anime_db_dict.keys()), makedirs_result_list): 
+        if isinstance(makedirs_result, Exception): 
+            response_list[index] = {'code': 0, 'msg': f'Failed to create directory: {repr(makedirs_result)}', 'detail': []} 
+            del index_anime_db_dict[index] 
 
-        if anime_change.source is not None: 
-            anime_db.source = anime_change.source 
+    if len(index_anime_db_dict) > 0: 
+        await _add_anime_db_list(list(index_anime_db_dict.values())) 
+        for index in index_anime_db_dict: 
+            response_list[index] = {'code': 1, 'msg': 'Anime added successfully', 'detail': []} 
 
-            if anime_change.source in AnimeSourcesParsed: 
+    return _batch_response(response_list, 'added') 
 
-                if anime_change.http_url is not None: 
-                    anime_db.under_management = False 
-                    session.add(anime_db) 
-                    session.commit() 
 
-                    return { 
-                        'code': 0, 'detail': [], 
-                        'msg': f'The selected source {anime_change.source.value} cannot be passed the http url', 
-                    } 
+async def add_anime(anime_add: AnimeAdd) -> dict[str, str | list[dict[str, str]]]: 
+    response = await add_anime_batch([anime_add]) 
+    return response['detail'][0] 
 
-                elif anime_change.search_text is not None: 
-                    anime_db.search_text = anime_change.search_text 
 
-                elif anime_db.search_text is None: 
-                    anime_db.under_management = False 
-                    session.add(anime_db) 
-                    session.commit() 
+def _change_anime_db(anime_db: AnimeDB, anime_change: AnimeChange) -> dict[str, str | list] | None: 
+    # 校验通过后才修改 anime_db, 校验不通过时返回错误信息 
+    if anime_db.under_management: 
+        return {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
 
-                    return { 
-                        'code': 0, 'detail': [],
-                        'msg': f'The selected source {anime_change.source.value} must be passed the search text', 
-                    } 
+    if anime_change.search_text is not None and anime_change.http_url is not None: 
+        return {'code': 0, 'msg': 'Search text and http url cannot have values at the same time', 'detail': []} 
 
-                anime_db.http_url = anime.get_http_url(anime_db.source, anime_db.search_text) 
+    source = anime_change.source if anime_change.source is not None else AnimeSources(anime_db.source) 
 
-            else: 
-                
-                if anime_change.search_text is not None: 
-                    anime_db.under_management = False 
-                    session.add(anime_db) 
-                    session.commit() 
-
-                    return {
-                        'code': 0, 'detail': [], 
-                        'msg': f'The selected source {anime_change.source.value} cannot be passed the search text', 
-                    } 
-                
-                elif anime_change.http_url is not None: 
-                    anime_db.http_url = anime_change.search_text 
-
-                elif anime_db.http_url is None: 
-                    anime_db.under_management = False 
-                    session.add(anime_db) 
-                    session.commit() 
-
-                    return { 
-                        'code': 0, 'detail': [], 
-                        'msg': f'The selected source {anime_change.source.value} must be passed the http url', 
-                    } 
-                
-                anime_db.search_text = None 
+    if source in AnimeSourcesParsed: 
+        if anime_change.http_url is not None: 
+            return {'code': 0, 'msg': f'The selected source {source.value} cannot be passed the http url', 'detail': []} 
+
+        search_text = anime_change.search_text if anime_change.search_text is not None else anime_db.search_text 
+        if search_text is None: 
+            return {'code': 0, 'msg': f'The selected source {source.value} must be passed the search text', 'detail': []} 
 
+        http_url = anime.get_http_url(source, search_text) 
+
+    else: 
+        if anime_change.search_text is not None: 
+            return {'code': 0, 'msg': f'The selected source {source.value} cannot be passed the search text', 'detail': []} 
+
+        if anime_change.http_url is not None: 
+            http_url = anime_change.http_url.unicode_string() 
+        elif anime_db.source not in AnimeSourcesParsed: 
+            http_url = anime_db.http_url 
         else: 
+            # 原来的地址由搜索关键词生成, 不能用于新的来源 
+            http_url = None 
+
+        if not http_url: 
+            return {'code': 0, 'msg': f'The selected source {source.value} must be passed the http url', 'detail': []} 
+
+        search_text = None 
+
+    anime_db.source = source.value 
+    anime_db.search_text = search_text 
+    anime_db.http_url = http_url 
+    if anime_change.auto_update is not None: 
+        anime_db.auto_update = anime_change.auto_update 
+
+    return None 
+
+
+@run_in_db_executor 
+def change_anime_batch(anime_change_list: list[AnimeChange]) -> dict[str, str | list]: 
+    """
+    在一个事务中修改全部番剧, detail 中按顺序返回每个番剧的结果 
+
+    每个番剧用带有 under_management 条件的 UPDATE 写入, 读取后被更新任务锁定的番剧不会被修改 
+    """
+    response_list: list[dict[str, str | list] | None] = [None] * len(anime_change_list) 
+
+    with Session(engine) as session: 
+        uuid_anime_db_dict = { 
+            anime_db.uuid: anime_db for anime_db in session.exec(select(AnimeDB).where( 
+                AnimeDB.uuid.in_({anime_change.uuid for anime_change in anime_change_list}) 
+            )).all() 
+        } 
+        # 读取的番剧只用于校验和生成新的值, 不随 session 提交 
+        session.expunge_all() 
+
+        http_url_set: set[str] = set() 
+        for index, anime_change in enumerate(anime_change_list): 
+            anime_db = uuid_anime_db_dict.get(anime_change.uuid) 
+            if anime_db is None: 
+                response_list[index] = {'code': 0, 'msg': 'Anime dose not exist', 'detail': []} 
+                continue 
+
+            response = _change_anime_db(anime_db, anime_change) 
+            if response is not None: 
+                response_list[index] = response 
+                continue 
+
+            changed_uuid = session.connection().execute( 
+                update(AnimeDB).where(and_( 
+                    AnimeDB.uuid == anime_db.uuid, AnimeDB.under_management == False 
+                )).values( 
+                    source=anime_db.source, search_text=anime_db.search_text, 
+                    http_url=anime_db.http_url, auto_update=anime_db.auto_update, 
+                ).returning(AnimeDB.uuid) 
+            ).scalar_one_or_none() 
+            if changed_uuid is None: 
+                response_list[index] = {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
+                continue 
+
+            http_url_set.add(anime_db.http_url) 
+            response_list[index] = {'code': 1, 'msg': 'Anime changed successfully', 'detail': []} 
+
+        # 修改后的地址需要完整解析 RSS, 不能使用条件请求 
+        if len(http_url_set) > 0: 
+            session.exec(delete(FeedCacheDB).where(FeedCacheDB.http_url.in_(http_url_set))) 
 
-            if anime_change.search_text is not None: 
-                if anime_db.source not in AnimeSourcesParsed: 
-                    anime_db.under_management = False 
-                    session.add(anime_db) 
-                    session.commit() 
-
-                    return { 
-                        'code': 0, 'detail': [], 
-                        'msg': f'The selected source {anime_db.source} cannot be passed the search text', 
-                    } 
-                
-                anime_db.search_text = anime_change.search_text 
-                anime_db.http_url = anime.get_http_url(anime_db.source, anime_db.search_text) 
-
-            if anime_change.http_url is not None: 
-                if anime_db.source in AnimeSourcesParsed: 
-                    anime_db.under_management = False 
-                    session.add(anime_db) 
-                    session.commit() 
-                
-                    return { 
-                        'code': 0, 'detail': [], 
-                        'msg': f'The selected source {anime_db.source} cannot be passed the http url', 
-                    } 
-                
-                anime_db.http_url = anime_change.http_url 
-
-        if anime_change.auto_update is not None: 
-            anime_db.auto_update = anime_change.auto_update 
-
-        anime_db.under_management = False 
-        session.add(anime_db) 
         session.commit() 
+        anime_inquire_cache.bump() 
+
+    return _batch_response(response_list, 'changed') 
+
+
+async def change_anime(anime_change: AnimeChange) -> dict[str, str | list[dict[str, str]]]: 
+    response = await change_anime_batch([anime_change]) 
+    return response['detail'][0] 
 
-    return {'code': 1, 'msg': 'Anime changed successfully', 'detail': ''} 
 
+def _get_unknown_field_list(field_list: list[str], field_name_list: list[str]) -> list[str]: 
+    return [field for field in field_list if field not in field_name_list] 
+
+
+def _inquire_anime_fts(session: Session, column_name_list: list[str], name: str, cursor: str | None, limit: int) -> list: 
+    # bm25 越小越相关, 以 (bm25, uuid) 作为分页的顺序, cursor 的格式为 'bm25:uuid' 
+    # 在同一条语句中按 rowid 连接 AnimeDB 取出需要的字段, 结果中另有 score 字段 
+    anime_table_name = AnimeDB.__tablename__ 
+    column_sql = ', '.join(f'{anime_table_name}."{column_name}"' for column_name in column_name_list) 
+    sql = ( 
+        f'SELECT * FROM (SELECT {column_sql}, bm25({ANIME_FTS_TABLE_NAME}) AS score ' 
+        f'FROM {ANIME_FTS_TABLE_NAME} JOIN {anime_table_name} ON {anime_table_name}.rowid = {ANIME_FTS_TABLE_NAME}.rowid ' 
+        f'WHERE {ANIME_FTS_TABLE_NAME} MATCH :query)' 
+    ) 
+    params = {'query': '"' + name.replace('"', '""') + '"', 'limit': limit} 
+    if cursor is not None: 
+        score_str, uuid = cursor.split(':', 1) 
+        sql += ' WHERE score > :score OR (score = :score AND uuid > :uuid)' 
+        params |= {'score': float(score_str), 'uuid': uuid} 
+    sql += ' ORDER BY score, uuid LIMIT :limit' 
+
+    return session.connection().execute(text(sql), params).mappings().all() 
+
+
+@run_in_db_executor 
+def inquire_anime(anime_inquire: AnimeInquire) -> dict[str, str | list[dict[str, str]] | None]: 
+    """
+    分页查询, 每页最多 limit 个, 结果中的 next_cursor 用于查询下一页, 为 None 时表示没有更多结果 
+
+    按名字查询时, 使用全文索引匹配番剧名和搜索关键词并按相关度排序, 
+    关键词少于 3 个字符或 SQLite 不支持全文索引时使用 LIKE 匹配, 其他查询按 uuid 排序 
+    """
+    anime_table = AnimeDB.__table__ 
+    field_name_list = [column.name for column in anime_table.columns] 
+    field_list = anime_inquire.fields if anime_inquire.fields is not None else field_name_list 
+
+    unknown_field_list = _get_unknown_field_list(field_list, field_name_list) 
+    if len(unknown_field_list) > 0: 
+        return {'code': 0, 'msg': f'Unknown fields: {", ".join(unknown_field_list)}', 'detail': [], 'next_cursor': None} 
+
+    # episodes_str 由 AnimeEpisodeDB 生成, uuid 用于分页, 总是需要查询 
+    column_list = [ 
+        anime_table.c[column_name] 
+        for column_name in dict.fromkeys(['uuid'] + [field for field in field_list if field != 'episodes_str']) 
+    ] 
+
+    use_fts = ( 
+        anime_inquire.uuid is None and anime_inquire.name is not None 
+        and anime_fts_available and len(anime_inquire.name) >= ANIME_FTS_MIN_QUERY_LENGTH 
+    ) 
 
-def inquire_anime(anime_inquire: AnimeInquire) -> dict[str, str | list[dict[str, str]]]: 
     with Session(engine) as session: 
-        if anime_inquire.uuid is not None: 
-            list_anime_db = session.exec(select(AnimeDB).where(AnimeDB.uuid == anime_inquire.uuid)).all() 
-        
-        elif anime_inquire.name is not None: 
-            list_anime_db = session.exec(select(AnimeDB).where(AnimeDB.name.contains(anime_inquire.name))).all() 
+        if use_fts: 
+            try: 
+                row_list = _inquire_anime_fts( 
+                    session, [column.name for column in column_list], 
+                    anime_inquire.name, anime_inquire.cursor, anime_inquire.limit + 1, 
+                ) 
+            except ValueError: 
+                return {'code': 0, 'msg': 'Invalid cursor', 'detail': [], 'next_cursor': None} 
+
+            cursor_list = [f'{row["score"]!r}:{row["uuid"]}' for row in row_list] 
 
         else: 
-            list_anime_db = session.exec(select(AnimeDB)).all() 
-
-        if len(list_anime_db) == 0: 
-            return {'code': 0, 'msg': 'Anime dose not exist', 'detail': []} 
-        
-        list_anime_db = [anime_db.model_dump() for anime_db in list_anime_db] 
-        
-        return {'code': 1, 'msg': 'Anime inquire successful', 'detail': list_anime_db} 
+            condition_list = list() 
+            if anime_inquire.uuid is not None: 
+                condition_list.append(anime_table.c.uuid == anime_inquire.uuid) 
+            elif anime_inquire.name is not None: 
+                condition_list.append(or_( 
+                    anime_table.c.name.contains(anime_inquire.name), 
+                    anime_table.c.search_text.contains(anime_inquire.name), 
+                )) 
+            if anime_inquire.cursor is not None: 
+                condition_list.append(anime_table.c.uuid > anime_inquire.cursor) 
+
+            row_list = session.connection().execute( 
+                select(*column_list).where( 
+                    and_(true(), *condition_list) 
+                ).order_by(anime_table.c.uuid).limit(anime_inquire.limit + 1) 
+            ).mappings().all() 
+            cursor_list = [row['uuid'] for row in row_list] 
+
+        if len(row_list) == 0: 
+            return {'code': 0, 'msg': 'Anime dose not exist', 'detail': [], 'next_cursor': None} 
+
+        next_cursor = None 
+        if len(row_list) > anime_inquire.limit: 
+            row_list = row_list[:anime_inquire.limit] 
+            next_cursor = cursor_list[anime_inquire.limit - 1] 
+
+        uuid_episode_num_list_dict: dict[str, list[int]] = defaultdict(list) 
+        if 'episodes_str' in field_list: 
+            for uuid, episode_num in session.exec( 
+                select(AnimeEpisodeDB.uuid, AnimeEpisodeDB.episode_num).where( 
+                    AnimeEpisodeDB.uuid.in_([row['uuid'] for row in row_list]) 
+                ).order_by(AnimeEpisodeDB.uuid, AnimeEpisodeDB.episode_num) 
+            ).all(): 
+                uuid_episode_num_list_dict[uuid].append(episode_num) 
+
+        detail = [ 
+            { 
+                field: ','.join(map(str, uuid_episode_num_list_dict[row['uuid']])) if field == 'episodes_str' else row[field] 
+                for field in field_list 
+            } 
+            for row in row_list 
+        ] 
+
+        return {'code': 1, 'msg': 'Anime inquire successful', 'detail': detail, 'next_cursor': next_cursor} 
     
 
-def delete_anime(anime_delete: AnimeDelete) -> dict[str, str | list[str, str]]: 
-    with Session(engine) as session: 
-        anime_db = session.exec(select(AnimeDB).where(AnimeDB.uuid == anime_delete.uuid).with_for_update()).first() 
+@run_in_db_executor 
+def delete_anime_batch(anime_delete_list: list[AnimeDelete]) -> dict[str, str | list]: 
+    """
+    在一个事务中删除全部番剧及其已下载剧集的记录, detail 中按顺序返回每个番剧的结果 
 
-        if anime_db is None: 
-            return {'code': 0, 'msg': 'Anime dose not exist', 'detail': []} 
-        
-        if anime_db.under_management: 
-            return {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
+    删除的结果以 DELETE 实际返回的 uuid 为准, 读取后被更新任务锁定的番剧不会被删除 
+    """
+    response_list: list[dict[str, str | list] | None] = [None] * len(anime_delete_list) 
 
-        session.delete(anime_db) 
-        session.commit() 
+    with Session(engine) as session: 
+        uuid_under_management_dict = dict(session.exec(select(AnimeDB.uuid, AnimeDB.under_management).where( 
+            AnimeDB.uuid.in_({anime_delete.uuid for anime_delete in anime_delete_list}) 
+        )).all()) 
+
+        uuid_set: set[str] = set() 
+        index_uuid_dict: dict[int, str] = dict() 
+        for index, anime_delete in enumerate(anime_delete_list): 
+            if anime_delete.uuid not in uuid_under_management_dict: 
+                response_list[index] = {'code': 0, 'msg': 'Anime dose not exist', 'detail': []} 
+            elif anime_delete.uuid in uuid_set: 
+                response_list[index] = {'code': 0, 'msg': 'Anime is repeated in the batch', 'detail': []} 
+            elif uuid_under_management_dict[anime_delete.uuid]: 
+                response_list[index] = {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
+            else: 
+                uuid_set.add(anime_delete.uuid) 
+                index_uuid_dict[index] = anime_delete.uuid 
+
+        if len(uuid_set) > 0: 
+            deleted_uuid_set = set(session.connection().execute( 
+                delete(AnimeDB).where(and_( 
+                    AnimeDB.uuid.in_(uuid_set), AnimeDB.under_management == False 
+                )).returning(AnimeDB.uuid) 
+            ).scalars().all()) 
+            if len(deleted_uuid_set) > 0: 
+                session.exec(delete(AnimeEpisodeDB).where(AnimeEpisodeDB.uuid.in_(deleted_uuid_set))) 
+
+            for index, uuid in index_uuid_dict.items(): 
+                if uuid in deleted_uuid_set: 
+                    response_list[index] = {'code': 1, 'msg': 'Anime deleted successfully', 'detail': []} 
+                else: 
+                    response_list[index] = {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
 
+        session.commit() 
+        anime_inquire_cache.bump() 
+
+    return _batch_response(response_list, 'deleted') 
+
+
+async def delete_anime(anime_delete: AnimeDelete) -> dict[str, str | list[str, str]]: 
+    response = await delete_anime_batch([anime_delete]) 
+    return response['detail'][0] 
+
+
+@run_in_db_executor 
+def inquire_episode(episode_inquire: EpisodeInquire) -> dict[str, str | list[dict[str, str]] | int | None]: 
+    """
+    按任务 id 顺序分页查询, 用法与 inquire_anime 相同 
+    """
+    episode_table = EpisodeUpdateTaskDB.__table__ 
+    field_column_dict = { 
+        'name': episode_table.c.name, 
+        'season': episode_table.c.season, 
+        'episode': episode_table.c.episode_num, 
+        'success': episode_table.c.success, 
+    } 
+    field_list = episode_inquire.fields if episode_inquire.fields is not None else list(field_column_dict.keys()) 
+
+    unknown_field_list = _get_unknown_field_list(field_list, list(field_column_dict.keys())) 
+    if len(unknown_field_list) > 0: 
+        return {'code': 0, 'msg': f'Unknown fields: {", ".join(unknown_field_list)}', 'detail': [], 'next_cursor': None} 
+
+    condition_list = list() 
+    if episode_inquire.done is not None: 
+        condition_list.append(episode_table.c.done == episode_inquire.done) 
+    if episode_inquire.under_management is not None: 
+        condition_list.append(episode_table.c.under_management == episode_inquire.under_management) 
+    if episode_inquire.cursor is not None: 
+        condition_list.append(episode_table.c.id_ > episode_inquire.cursor) 
 
-def inquire_episode(episode_inquire: EpisodeInquire) -> dict[str, str | list[str, str]]: 
     with Session(engine) as session: 
-        if episode_inquire.done is None and episode_inquire.under_management is None: 
-            episode_update_task_db_list = session.exec(select(EpisodeUpdateTaskDB)).all() 
-        elif episode_inquire.done is not None and episode_inquire.under_management is not None: 
-            episode_update_task_db_list = session.exec( 
-                select(EpisodeUpdateTaskDB).where( 
-                    and_(
-                        EpisodeUpdateTaskDB.done == episode_inquire.done, 
-                        EpisodeUpdateTaskDB.under_management == episode_inquire.under_management
-                    ) 
-                ) 
-            ).all() 
-        elif episode_inquire.done is not None: 
-            episode_update_task_db_list = session.exec(
-                select(EpisodeUpdateTaskDB).where(EpisodeUpdateTaskDB.done == episode_inquire.done)
-            ).all() 
-        else: 
-            episode_update_task_db_list = session.exec(
-                select(EpisodeUpdateTaskDB).where(
-                    EpisodeUpdateTaskDB.under_management == episode_inquire.under_management
-                ) 
-            ).all() 
-            
+        row_list = session.connection().execute( 
+            select(episode_table.c.id_, *(field_column_dict[field].label(field) for field in field_list)).where( 
+                and_(true(), *condition_list) 
+            ).order_by(episode_table.c.id_).limit(episode_inquire.limit + 1) 
+        ).mappings().all() 
 
-        detail: list[dict[str, str]] = [] 
-        for episode_update_task_db in episode_update_task_db_list: 
-            detail.append({
-                'name': episode_update_task_db.name, 
-                'season': str(episode_update_task_db.season), 
-                'episode': str(episode_update_task_db.episode_num), 
-                'success': str(episode_update_task_db.success) 
-            }) 
+    next_cursor = None 
+    if len(row_list) > episode_inquire.limit: 
+        row_list = row_list[:episode_inquire.limit] 
+        next_cursor = row_list[-1]['id_'] 
 
-        return {'code': 1, 'msg': 'success', 'detail': detail} 
+    detail: list[dict[str, str]] = [{field: str(row[field]) for field in field_list} for row in row_list] 
 
+    return {'code': 1, 'msg': 'success', 'detail': detail, 'next_cursor': next_cursor} 
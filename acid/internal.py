@@ -2,59 +2,112 @@ import os
 import asyncio 
 from datetime import datetime, timezone 
 
-from sqlmodel import Session, select, and_  
+from sqlmodel import Session, select, and_, or_, func  
+from sqlalchemy import update, delete, bindparam 
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert 
 
 from settings import user_settings 
 from model import EpisodeAdd 
-from database import engine, AnimeDB, EpisodeUpdateTaskDB 
+from database import ( 
+    run_in_db_executor, engine, 
+    AnimeDB, AnimeEpisodeDB, EpisodeUpdateTaskDB, EpisodeUpdateTaskArchiveDB, FeedCacheDB, TorrentCacheDB, 
+) 
+from acid.cache import anime_inquire_cache, episode_inquire_cache 
 from utils import episode 
 
 
+# 种子文件先写入磁盘, 之后才写入缓存记录与任务, 在此期间的文件不视为孤立文件 
+TORRENT_FILE_SWEEP_GRACE_PERIOD = 3600 
+
+@run_in_db_executor 
 def change_anime_db_clean_up() -> None: 
     with Session(engine) as session: 
-        anime_db_list = session.exec(select(AnimeDB).with_for_update()).all() 
-        for anime_db in anime_db_list: 
-            anime_db.under_management = False 
-
-        session.add_all(anime_db_list) 
+        session.exec(update(AnimeDB).where(AnimeDB.under_management == True).values(under_management=False)) 
         session.commit() 
+        anime_inquire_cache.bump() 
 
 
+@run_in_db_executor 
 def change_anime_db_unlock(uuid_set: set[str]) -> None: 
-    with Session(engine) as session: 
-        anime_db_list = session.exec( 
-            select(AnimeDB).where(AnimeDB.under_management == True).with_for_update() 
-        ).all() 
-        
-        for anime_db in anime_db_list: 
-            if anime_db.uuid in uuid_set: 
-                anime_db.under_management = False 
+    if len(uuid_set) == 0: 
+        return 
 
-        session.add_all(anime_db_list) 
+    with Session(engine) as session: 
+        session.connection().execute( 
+            update(AnimeDB.__table__).where(and_( 
+                AnimeDB.__table__.c.uuid == bindparam('b_uuid'), AnimeDB.__table__.c.under_management == True, 
+            )).values(under_management=False), 
+            [{'b_uuid': uuid} for uuid in uuid_set], 
+        ) 
         session.commit() 
+        anime_inquire_cache.bump() 
 
 
-def change_anime_db_update_result(
-        uuid_episode_num_list_dict: dict[str, list[int]], uuid_episode_newest_pub_date: dict[str, float]
+@run_in_db_executor 
+def change_anime_db_update_result( 
+        uuid_set: set[str], anime_episode_db_list: list[AnimeEpisodeDB], 
+        uuid_unresolved_pub_date_dict: dict[str, float] | None = None, 
     ) -> None: 
-    with Session(engine) as session: 
-        anime_db_list = session.exec( 
-            select(AnimeDB).where(AnimeDB.under_management == True).with_for_update() 
-        ).all() 
-        
-        for anime_db in anime_db_list: 
-            if anime_db.uuid in uuid_episode_num_list_dict: 
-                if len(anime_db.episodes_str) > 0: 
-                    anime_db.episodes_str += ',' 
+    """
+    newest_pub_date 最多前进到最早的未完成剧集的发布时间, 下次解析 RSS 时仍能读到该剧集 
+    """
+    uuid_newest_pub_date_dict: dict[str, float] = dict() 
+    for anime_episode_db in anime_episode_db_list: 
+        uuid_newest_pub_date_dict[anime_episode_db.uuid] = max( 
+            uuid_newest_pub_date_dict.get(anime_episode_db.uuid, 0.), anime_episode_db.pub_date 
+        ) 
 
-                anime_db.episodes_str += ','.join(map(str, uuid_episode_num_list_dict[anime_db.uuid])) 
-                anime_db.newest_pub_date = max(anime_db.newest_pub_date, uuid_episode_newest_pub_date[anime_db.uuid]) 
-                anime_db.under_management = False 
+    for uuid, unresolved_pub_date in (uuid_unresolved_pub_date_dict or dict()).items(): 
+        if uuid in uuid_newest_pub_date_dict: 
+            uuid_newest_pub_date_dict[uuid] = min(uuid_newest_pub_date_dict[uuid], unresolved_pub_date) 
 
-        session.add_all(anime_db_list) 
+    if len(uuid_set) == 0: 
+        return 
+
+    anime_table = AnimeDB.__table__ 
+    anime_episode_table = AnimeEpisodeDB.__table__ 
+
+    with Session(engine) as session: 
+        if len(anime_episode_db_list) > 0: 
+            insert_stmt = sqlite_insert(anime_episode_table) 
+            session.connection().execute( 
+                insert_stmt.on_conflict_do_update( 
+                    index_elements=[anime_episode_table.c.uuid, anime_episode_table.c.episode_num], 
+                    set_={ 
+                        'pub_date': insert_stmt.excluded.pub_date, 
+                        'torrent_hash': insert_stmt.excluded.torrent_hash, 
+                    }, 
+                ), 
+                [anime_episode_db.model_dump() for anime_episode_db in anime_episode_db_list], 
+            ) 
+
+        session.connection().execute( 
+            update(anime_table).where(and_( 
+                anime_table.c.uuid == bindparam('b_uuid'), anime_table.c.under_management == True, 
+            )).values( 
+                newest_pub_date=func.max(anime_table.c.newest_pub_date, bindparam('b_newest_pub_date')), 
+                under_management=False, 
+            ), 
+            [ 
+                {'b_uuid': uuid, 'b_newest_pub_date': uuid_newest_pub_date_dict.get(uuid, 0.)} 
+                for uuid in uuid_set 
+            ], 
+        ) 
         session.commit() 
+        anime_inquire_cache.bump() 
+
+
+@run_in_db_executor 
+def inquire_anime_episode_exist(uuid: str, episode_num_set: set[int]) -> set[int]: 
+    with Session(engine) as session: 
+        return set(session.exec( 
+            select(AnimeEpisodeDB.episode_num).where( 
+                and_(AnimeEpisodeDB.uuid == uuid, AnimeEpisodeDB.episode_num.in_(episode_num_set)) 
+            ) 
+        ).all()) 
 
 
+@run_in_db_executor 
 def inquire_anime_update_ready(auto_update: bool) -> list[AnimeDB]: 
     with Session(engine, expire_on_commit=False) as session: 
         if not auto_update: 
@@ -76,13 +129,160 @@ def inquire_anime_update_ready(auto_update: bool) -> list[AnimeDB]:
         
         session.add_all(anime_db_list) 
         session.commit() 
+        anime_inquire_cache.bump() 
 
         return anime_db_list 
 
 
-async def _episode_add_to_episode_update_task_db(episode_add: EpisodeAdd) -> EpisodeUpdateTaskDB: 
+@run_in_db_executor 
+def inquire_feed_cache(http_url_set: set[str]) -> dict[str, FeedCacheDB]: 
+    with Session(engine, expire_on_commit=False) as session: 
+        feed_cache_db_list = session.exec( 
+            select(FeedCacheDB).where(FeedCacheDB.http_url.in_(http_url_set)) 
+        ).all() 
+
+        return {feed_cache_db.http_url: feed_cache_db for feed_cache_db in feed_cache_db_list} 
+
+
+@run_in_db_executor 
+def change_feed_cache(feed_cache_db_list: list[FeedCacheDB], uuid_set: set[str]) -> None: 
+    """
+    uuid_set 为参与本次更新的番剧, 已解析过哪些剧集按番剧记录, 校验值按地址保存, 
+    只有使用该地址的番剧全部参与了本次更新时才保存, 否则没有参与的番剧下次更新时会收到 304 而错过新的剧集 
+    """
+    with Session(engine) as session: 
+        http_url_skip_set = set(session.exec(select(AnimeDB.http_url).where(and_( 
+            AnimeDB.http_url.in_({feed_cache_db.http_url for feed_cache_db in feed_cache_db_list}), 
+            AnimeDB.uuid.not_in(uuid_set), 
+        ))).all()) 
+
+        for feed_cache_db in feed_cache_db_list: 
+            if feed_cache_db.http_url not in http_url_skip_set: 
+                session.merge(feed_cache_db) 
+
+        session.commit() 
+
+
+@run_in_db_executor 
+def delete_feed_cache(uuid_set: set[str]) -> None: 
+    # 有剧集更新失败的番剧, 需要在下次更新时重新解析 RSS 
+    with Session(engine) as session: 
+        http_url_list = session.exec(select(AnimeDB.http_url).where(AnimeDB.uuid.in_(uuid_set))).all() 
+        feed_cache_db_list = session.exec( 
+            select(FeedCacheDB).where(FeedCacheDB.http_url.in_(http_url_list)) 
+        ).all() 
+
+        for feed_cache_db in feed_cache_db_list: 
+            session.delete(feed_cache_db) 
+
+        session.commit() 
+
+
+@run_in_db_executor 
+def inquire_torrent_cache(torrent_url: str) -> TorrentCacheDB | None: 
+    with Session(engine, expire_on_commit=False) as session: 
+        torrent_cache_db = session.get(TorrentCacheDB, torrent_url) 
+        if torrent_cache_db is None: 
+            return None 
+
+        if not os.path.isfile(torrent_cache_db.torrent_file_path): 
+            session.delete(torrent_cache_db) 
+            session.commit() 
+            return None 
+
+        torrent_cache_db.accessed_at = datetime.now(timezone.utc).timestamp() 
+        session.add(torrent_cache_db) 
+        session.commit() 
+
+        return torrent_cache_db 
+
+
+@run_in_db_executor 
+def add_torrent_cache(torrent_url: str, torrent_hash: str, torrent_file_path: str) -> None: 
+    with Session(engine) as session: 
+        session.merge(TorrentCacheDB( 
+            torrent_url=torrent_url, 
+            torrent_hash=torrent_hash, 
+            torrent_file_path=torrent_file_path, 
+            size=os.path.getsize(torrent_file_path), 
+            accessed_at=datetime.now(timezone.utc).timestamp(), 
+        )) 
+        session.commit() 
+
+
+@run_in_db_executor 
+def delete_torrent_cache_out_of_capacity() -> None: 
+    """
+    按照最近访问时间淘汰种子缓存, 超过 max_torrent_cache_age 的缓存被删除, 
+    之后从最久未访问的开始删除, 直到种子文件的总大小不超过 max_torrent_cache_size 
+
+    未完成的任务仍会用到的种子文件不会被删除, 种子目录中没有被缓存记录的文件也会被清理, 
+    但修改时间在 TORRENT_FILE_SWEEP_GRACE_PERIOD 之内的文件除外, 它们可能正在被添加任务的流程使用 
+    """
+    timestamp = datetime.now(timezone.utc).timestamp() 
+
+    with Session(engine) as session: 
+        in_use_hash_set = set(session.exec( 
+            select(EpisodeUpdateTaskDB.torrent_hash).where(EpisodeUpdateTaskDB.done == False) 
+        ).all()) 
+        torrent_cache_db_list = session.exec( 
+            select(TorrentCacheDB).order_by(TorrentCacheDB.accessed_at.desc()) 
+        ).all() 
+
+        # 多个地址可能对应同一个种子文件, 以其中最近的访问时间为准 
+        hash_size_dict: dict[str, int] = dict() 
+        hash_torrent_cache_db_list_dict: dict[str, list[TorrentCacheDB]] = dict() 
+        for torrent_cache_db in torrent_cache_db_list: 
+            hash_size_dict.setdefault(torrent_cache_db.torrent_hash, torrent_cache_db.size) 
+            hash_torrent_cache_db_list_dict.setdefault(torrent_cache_db.torrent_hash, []).append(torrent_cache_db) 
+
+        total_size = 0 
+        keep_hash_set = set() 
+        for torrent_hash, torrent_cache_db_list_ in hash_torrent_cache_db_list_dict.items(): 
+            expired = timestamp - torrent_cache_db_list_[0].accessed_at > user_settings.max_torrent_cache_age 
+            oversize = total_size + hash_size_dict[torrent_hash] > user_settings.max_torrent_cache_size 
+
+            if torrent_hash in in_use_hash_set or not (expired or oversize): 
+                keep_hash_set.add(torrent_hash) 
+                total_size += hash_size_dict[torrent_hash] 
+            else: 
+                for torrent_cache_db in torrent_cache_db_list_: 
+                    session.delete(torrent_cache_db) 
+
+        session.commit() 
+
+    torrent_dir_path = episode.get_torrent_dir_path() 
+    if not os.path.isdir(torrent_dir_path): 
+        return 
+
+    for file_name in os.listdir(torrent_dir_path): 
+        torrent_hash = file_name.removesuffix('.torrent') 
+        if torrent_hash in keep_hash_set or torrent_hash in in_use_hash_set: 
+            continue 
+
+        torrent_file_path = os.path.join(torrent_dir_path, file_name) 
+        try: 
+            if timestamp - os.path.getmtime(torrent_file_path) < TORRENT_FILE_SWEEP_GRACE_PERIOD: 
+                continue 
+
+            os.remove(torrent_file_path) 
+        except FileNotFoundError: 
+            continue 
+
+
+async def _episode_add_to_episode_update_task_db(episode_add: EpisodeAdd) -> EpisodeUpdateTaskDB | None: 
+    torrent_url = episode_add.torrent_url.unicode_string() 
+    torrent_cache_db = await inquire_torrent_cache(torrent_url) 
+
     try:
-        torrent_hash, torrent_file_path, torrent_magnet = await episode.parse_torrent_url_async(episode_add.torrent_url) 
+        if torrent_cache_db is not None: 
+            torrent_hash, torrent_file_path, torrent_magnet = ( 
+                torrent_cache_db.torrent_hash, torrent_cache_db.torrent_file_path, '' 
+            ) 
+        else: 
+            torrent_hash, torrent_file_path, torrent_magnet = await episode.parse_torrent_url_async(episode_add.torrent_url) 
+            if torrent_file_path: 
+                await add_torrent_cache(torrent_url, torrent_hash, torrent_file_path) 
     except AssertionError as e: 
         print(e) 
         return None 
@@ -106,111 +306,181 @@ async def _episode_add_to_episode_update_task_db(episode_add: EpisodeAdd) -> Epi
         ) 
 
 
-async def add_episode_add_list(episode_add_list: list[EpisodeAdd]) -> None: 
-    
-    episode_update_task_db_list: list[EpisodeUpdateTaskDB] = await asyncio.gather(*( 
+@run_in_db_executor 
+def _add_episode_update_task_db_list(episode_update_task_db_list: list[EpisodeUpdateTaskDB]) -> None: 
+    with Session(engine) as session: 
+        session.add_all(episode_update_task_db_list) 
+        session.commit() 
+        episode_inquire_cache.bump() 
+
+
+async def add_episode_add_list(episode_add_list: list[EpisodeAdd]) -> list[EpisodeAdd]: 
+    """
+    返回种子解析失败, 没有写入任务队列的剧集 
+    """
+    episode_update_task_db_list: list[EpisodeUpdateTaskDB | None] = await asyncio.gather(*( 
         asyncio.create_task(_episode_add_to_episode_update_task_db(episode_add)) 
         for episode_add in episode_add_list 
     )) 
+    episode_add_fail_list = [ 
+        episode_add for episode_add, episode_update_task_db in zip(episode_add_list, episode_update_task_db_list) 
+        if episode_update_task_db is None 
+    ] 
     episode_update_task_db_list = [ 
         episode_update_task_db for episode_update_task_db in episode_update_task_db_list 
         if episode_update_task_db is not None 
     ] 
 
-    with Session(engine) as session: 
-        session.add_all(episode_update_task_db_list) 
-        session.commit() 
+    if len(episode_update_task_db_list) > 0: 
+        await _add_episode_update_task_db_list(episode_update_task_db_list) 
+
+    return episode_add_fail_list 
 
 
+@run_in_db_executor 
 def change_episode_update_task_db_cleanup() -> None:
     with Session(engine) as session: 
-        episode_update_task_db_list = session.exec(select(EpisodeUpdateTaskDB).with_for_update()).all() 
-        id_ = 1 
-        for episode_update_task_db in episode_update_task_db_list: 
-            episode_update_task_db.id_ = id_ 
-            episode_update_task_db.under_management = False 
-            episode_update_task_db.done = True 
-            id_ += 1 
-
-        session.add_all(episode_update_task_db_list) 
+        session.exec( 
+            update(EpisodeUpdateTaskDB).where( 
+                or_(EpisodeUpdateTaskDB.under_management == True, EpisodeUpdateTaskDB.done == False) 
+            ).values(under_management=False, done=True) 
+        ) 
         session.commit() 
+        episode_inquire_cache.bump() 
 
 
+@run_in_db_executor 
 def change_episode_update_task_db_update_result(id_set_success: set[int], id_set_fail: set[int]) -> None: 
-    with Session(engine) as session: 
-        episode_update_task_db_list = session.exec(
-            select(EpisodeUpdateTaskDB).where(EpisodeUpdateTaskDB.under_management == True).with_for_update()
-        ).all() 
+    episode_table = EpisodeUpdateTaskDB.__table__ 
+    update_stmt = update(episode_table).where(and_( 
+        episode_table.c.id_ == bindparam('b_id'), episode_table.c.under_management == True, 
+    )) 
 
-        for episode_update_task_db in episode_update_task_db_list: 
-            if episode_update_task_db.id_ in id_set_success: 
-                episode_update_task_db.under_management = False 
-                episode_update_task_db.done = True 
-                episode_update_task_db.success = True 
-            
-            elif episode_update_task_db.id_ in id_set_fail: 
-                episode_update_task_db.under_management = False 
-                episode_update_task_db.done = True 
+    with Session(engine) as session: 
+        if len(id_set_success) > 0: 
+            session.connection().execute( 
+                update_stmt.values(under_management=False, done=True, success=True), 
+                [{'b_id': id_} for id_ in id_set_success], 
+            ) 
+
+        if len(id_set_fail) > 0: 
+            session.connection().execute( 
+                update_stmt.values(under_management=False, done=True), 
+                [{'b_id': id_} for id_ in id_set_fail], 
+            ) 
 
-        session.add_all(episode_update_task_db_list) 
         session.commit() 
+        episode_inquire_cache.bump() 
 
 
+@run_in_db_executor 
 def inquire_episode_update_ready() -> list[EpisodeUpdateTaskDB]: 
+    """
+    从未完成的任务中取出可以执行的任务, 相同地址的确定方法为: uuid 和 episode_num, 不能采用 torrent hash 
+
+    1. 如果相同的地址有任务正在进行, 则搁置该地址所有的任务 
+    2. 否则只执行该地址最新放入的任务, 更早的任务直接标记为完成, 它们的种子文件由缓存淘汰时清理 
+    """
+    episode_table = EpisodeUpdateTaskDB.__table__ 
+    partition_by = (episode_table.c.uuid, episode_table.c.episode_num) 
+    ranked = select( 
+        episode_table.c.id_, 
+        func.row_number().over(partition_by=partition_by, order_by=episode_table.c.id_.desc()).label('row_num'), 
+        func.max(episode_table.c.under_management).over(partition_by=partition_by).label('suspended'), 
+    ).where(episode_table.c.done == False).subquery() 
+
+    def ranked_id_select(*condition): 
+        return select(ranked.c.id_).where(and_(ranked.c.suspended == False, *condition)) 
+
     with Session(engine, expire_on_commit=False) as session: 
-        episode_list = session.exec(
-            select(EpisodeUpdateTaskDB).where(
-                EpisodeUpdateTaskDB.done == False
-            ).order_by(EpisodeUpdateTaskDB.id_).with_for_update() 
+        # 先写入再读取, 两条更新在同一个写事务中, 并发调用时不会取出相同的任务 
+        session.connection().execute( 
+            update(episode_table).where(episode_table.c.id_.in_(ranked_id_select(ranked.c.row_num > 1))).values(done=True) 
+        ) 
+        id_list = session.connection().execute( 
+            update(episode_table).where( 
+                episode_table.c.id_.in_(ranked_id_select(ranked.c.row_num == 1)) 
+            ).values(under_management=True).returning(episode_table.c.id_) 
+        ).scalars().all() 
+
+        episode_update_task_db_list = session.exec( 
+            select(EpisodeUpdateTaskDB).where(EpisodeUpdateTaskDB.id_.in_(id_list)).order_by(EpisodeUpdateTaskDB.id_) 
         ).all() 
-        
-        """
-        从未完成的任务中, 按照放入任务队列的顺序, 将任务取出 
-
-        1. 如果相同的下载地址, 有任务正在进行, 则搁置之后所有的同地址任务 
-        2. 如果相同的下载地址, 没有正在进行的任务, 但是有更新的任务, 则覆盖旧的任务, 并删除旧任务的种子文件 
-
-        相同地址的确定方法为: uuid 和 episode_num, 不能采用 torrent hash 
-        """
-        uuid_add_num_episode_dict: dict[str, EpisodeUpdateTaskDB] = dict()
-        suspend_uuid_add_num_set: set[str] = set() 
-        for episode in episode_list: 
-            uuid_add_num = episode.uuid + str(episode.episode_num) 
-
-            if episode.under_management: 
-                suspend_uuid_add_num_set.add(uuid_add_num) 
-
-            elif uuid_add_num in suspend_uuid_add_num_set: 
-                continue 
-
-            elif uuid_add_num in uuid_add_num_episode_dict: 
-                uuid_add_num_episode_dict[uuid_add_num].done = True 
+        session.commit() 
+        episode_inquire_cache.bump() 
 
-                if os.path.isfile(uuid_add_num_episode_dict[uuid_add_num].torrent_file_path): 
-                    os.remove(uuid_add_num_episode_dict[uuid_add_num].torrent_file_path) 
+        return episode_update_task_db_list 
 
-                uuid_add_num_episode_dict[uuid_add_num] = episode 
 
-            else: 
-                uuid_add_num_episode_dict[uuid_add_num] = episode 
+@run_in_db_executor 
+def _inquire_episode_update_task_db_archive_range() -> tuple[int, int] | None: 
+    # 保留最新的 max_episode_update_task_db_capacity 个已完成任务, 返回更早的已完成任务的 id 区间 
+    # id 没有 AUTOINCREMENT, 删除 id 最大的任务后该 id 会被新任务重用, 因此 id 最大的任务总是保留 
+    with Session(engine) as session: 
+        id_end = session.exec( 
+            select(EpisodeUpdateTaskDB.id_).where(and_( 
+                EpisodeUpdateTaskDB.done == True, 
+                EpisodeUpdateTaskDB.id_ < select(func.max(EpisodeUpdateTaskDB.id_)).scalar_subquery(), 
+            )).order_by( 
+                EpisodeUpdateTaskDB.id_.desc() 
+            ).offset(user_settings.max_episode_update_task_db_capacity).limit(1) 
+        ).first() 
+        if id_end is None: 
+            return None 
+
+        id_start = session.exec( 
+            select(func.min(EpisodeUpdateTaskDB.id_)).where(EpisodeUpdateTaskDB.done == True) 
+        ).one() 
+
+        return id_start, id_end 
+
+
+@run_in_db_executor 
+def _change_episode_update_task_db_archive_batch(id_start: int, id_end: int) -> int: 
+    episode_table = EpisodeUpdateTaskDB.__table__ 
+    archive_table = EpisodeUpdateTaskArchiveDB.__table__ 
+    column_name_list = [column.name for column in archive_table.columns] 
+    condition = and_( 
+        episode_table.c.id_.between(id_start, id_end), 
+        episode_table.c.done == True, 
+        episode_table.c.under_management == False, 
+    ) 
 
-        episode_update_task_db_list=list(uuid_add_num_episode_dict.values()) 
+    with Session(engine) as session: 
+        # 归档中已有相同 id 的任务不会被覆盖, 只删除实际写入归档的任务, 其余的保留在任务表中 
+        archive_id_list = session.connection().execute( 
+            sqlite_insert(archive_table).from_select( 
+                column_name_list, select(*(episode_table.c[name] for name in column_name_list)).where(condition) 
+            ).on_conflict_do_nothing().returning(archive_table.c.id_) 
+        ).scalars().all() 
+        if len(archive_id_list) > 0: 
+            session.connection().execute( 
+                delete(episode_table).where(episode_table.c.id_ == bindparam('archive_id')), 
+                [{'archive_id': archive_id} for archive_id in archive_id_list], 
+            ) 
+        session.commit() 
+        episode_inquire_cache.bump() 
 
-        for episode_update_task_db in episode_update_task_db_list: 
-            episode_update_task_db.under_management = True 
+        return len(archive_id_list) 
 
-        session.add_all(episode_list) 
-        session.commit() 
 
-        return episode_update_task_db_list 
+async def change_episode_update_task_db_archive() -> None: 
+    """
+    将超出 max_episode_update_task_db_capacity 的已完成任务, 从旧到新按 id 区间分批移入 EpisodeUpdateTaskArchiveDB 
 
+    每一批在单独的事务中完成, 不会长时间占用写锁, 任务的 id 保持不变 
+    """
+    archive_range = await _inquire_episode_update_task_db_archive_range() 
+    if archive_range is None: 
+        return 
 
-def delete_episode_update_task_db_out_of_capacity() -> None: 
-    with Session(engine) as session: 
-        episode_update_task_db_list = session.exec(select(EpisodeUpdateTaskDB).with_for_update()).all() 
-        if len(episode_update_task_db_list) > user_settings.max_episode_update_task_db_capacity: 
-            for episode_update_task_db in episode_update_task_db_list[-user_settings.max_episode_update_task_db_capacity:]: 
-                session.delete(episode_update_task_db) 
+    id_start, id_end = archive_range 
+    batch_size = user_settings.episode_update_task_archive_batch_size 
 
-            session.commit() 
+    archive_num = 0 
+    for batch_start in range(id_start, id_end + 1, batch_size): 
+        archive_num += await _change_episode_update_task_db_archive_batch( 
+            batch_start, min(batch_start + batch_size - 1, id_end) 
+        ) 
 
+    print(f'{archive_num} finished update tasks are archived') 
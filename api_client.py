@@ -1,9 +1,12 @@
-from typing import Iterable 
+import os 
+import asyncio 
+from typing import Any, Iterable 
 
-from qbittorrentapi import Client as QbittorrentClient 
+from aiohttp import ClientResponseError, ClientTimeout, FormData 
 from jellyfin_apiclient_python import JellyfinClient 
 
 from settings import autoanime_settings, user_settings 
+from utils.request import open_client_session 
 
 
 def login_jellyfin() -> JellyfinClient: 
@@ -29,35 +32,108 @@ def refresh_jellyfin(client: JellyfinClient) -> None:
         client.jellyfin._post("Library/Refresh") 
 
 
-def login_qbittorrent() -> QbittorrentClient: 
-    qbittorrent_client: QbittorrentClient = QbittorrentClient(
-        host=user_settings.qbittorrent_addr.host, 
-        port=user_settings.qbittorrent_addr.port, 
-        username=user_settings.qbittorrent_username, 
-        password=user_settings.qbittorrent_password.get_secret_value(), 
-    )
+QBITTORRENT_CHUNK_SIZE = 50 
 
-    return qbittorrent_client 
 
+class TorrentClientError(Exception): 
+    pass 
 
-def add_qbittorrent(
-        client: QbittorrentClient, 
-        torrent_urls: Iterable[str] | None = None, 
-        torrent_files: Iterable[str] | None = None
-    ) -> str: 
 
-    return client.torrents_add(urls=torrent_urls, torrent_files=torrent_files) 
+class TorrentClientForbiddenError(TorrentClientError): 
+    pass 
+
+
+def _get_qbittorrent_url(api: str) -> str: 
+    return user_settings.qbittorrent_addr.unicode_string().rstrip('/') + '/api/v2/' + api 
+
+
+def _chunk(item_list: list, chunk_size: int = QBITTORRENT_CHUNK_SIZE) -> list[list]: 
+    return [item_list[i:i + chunk_size] for i in range(0, len(item_list), chunk_size)] 
+
+
+async def _request_qbittorrent(sid: str, method: str, api: str, json_response: bool = False, **kwargs) -> Any: 
+    # 手动携带 SID, 默认的 cookie jar 不接受来自 IP 地址的 cookie 
+    session = await open_client_session() 
+
+    async with session.request( 
+        method, _get_qbittorrent_url(api), headers={'Cookie': f'SID={sid}'}, 
+        timeout=ClientTimeout(total=user_settings.timeout_proxy), **kwargs 
+    ) as resp: 
+        if resp.status == 403: 
+            raise TorrentClientForbiddenError(f'qbittorrent {api} is forbidden') 
+
+        resp.raise_for_status() 
+
+        return await resp.json() if json_response else await resp.text() 
+
+
+async def login_qbittorrent() -> str: 
+    session = await open_client_session() 
+
+    async with session.post( 
+        _get_qbittorrent_url('auth/login'), 
+        data={ 
+            'username': user_settings.qbittorrent_username, 
+            'password': user_settings.qbittorrent_password.get_secret_value(), 
+        }, 
+        timeout=ClientTimeout(total=user_settings.timeout_proxy), 
+    ) as resp: 
+        resp.raise_for_status() 
+
+        if await resp.text() != 'Ok.' or 'SID' not in resp.cookies: 
+            raise TorrentClientError('qbittorrent login failed') 
+
+        return resp.cookies['SID'].value 
+
 
+def _add_qbittorrent_form_data(torrent_urls: list[str], torrent_files: list[str]) -> FormData: 
+    form_data = FormData() 
+    if len(torrent_urls) > 0: 
+        form_data.add_field('urls', '\n'.join(torrent_urls)) 
 
-def delete_qbittorrent(client: QbittorrentClient, torrent_hashes: Iterable[str]) -> None: 
-    return client.torrents_delete(delete_files=False, torrent_hashes=torrent_hashes)
+    for torrent_file in torrent_files: 
+        with open(torrent_file, mode='rb') as f: 
+            form_data.add_field( 
+                'torrents', f.read(), filename=os.path.basename(torrent_file), content_type='application/x-bittorrent' 
+            ) 
 
+    return form_data 
 
-def info_qbittorrent(
-        client: QbittorrentClient, 
-        torrent_hashes: Iterable[str]
-) -> Iterable[dict[str, str | float]]: 
-    return client.torrents_info(torrent_hashes=torrent_hashes) 
+
+# 以下请求每次只处理一个分块, 分块与并发由 TorrentClient 负责, 403 时只重试失败的分块 
+async def add_qbittorrent(sid: str, torrent_urls: list[str], torrent_files: list[str]) -> str: 
+    # 种子文件在线程中读取, 不阻塞事件循环; FormData 只能发送一次, 重试时重新生成 
+    form_data = await asyncio.to_thread(_add_qbittorrent_form_data, torrent_urls, torrent_files) 
+    return await _request_qbittorrent(sid, 'POST', 'torrents/add', data=form_data) 
+
+
+async def delete_qbittorrent(sid: str, torrent_hashes: list[str]) -> None: 
+    await _request_qbittorrent(sid, 'POST', 'torrents/delete', data={'hashes': '|'.join(torrent_hashes), 'deleteFiles': 'false'}) 
+
+
+async def resume_qbittorrent(sid: str, torrent_hashes: list[str]) -> None: 
+    # qBittorrent 5.0 起 torrents/resume 更名为 torrents/start 
+    try: 
+        await _request_qbittorrent(sid, 'POST', 'torrents/resume', data={'hashes': '|'.join(torrent_hashes)}) 
+    except ClientResponseError as e: 
+        if e.status != 404: 
+            raise 
+
+        await _request_qbittorrent(sid, 'POST', 'torrents/start', data={'hashes': '|'.join(torrent_hashes)}) 
+
+
+async def recheck_qbittorrent(sid: str, torrent_hashes: list[str]) -> None: 
+    await _request_qbittorrent(sid, 'POST', 'torrents/recheck', data={'hashes': '|'.join(torrent_hashes)}) 
+
+
+async def info_qbittorrent(sid: str, torrent_hashes: list[str]) -> list[dict[str, str | float]]: 
+    # torrent_hashes 为空时返回全部种子 
+    params = {'hashes': '|'.join(torrent_hashes)} if len(torrent_hashes) > 0 else None 
+    return await _request_qbittorrent(sid, 'GET', 'torrents/info', json_response=True, params=params) 
+
+
+async def sync_qbittorrent(sid: str, rid: int) -> dict: 
+    return await _request_qbittorrent(sid, 'GET', 'sync/maindata', json_response=True, params={'rid': rid}) 
 
 
 class MediaClient:  
@@ -78,38 +154,140 @@ class MediaClient:
 
 
 class TorrentClient: 
-    def __init__(self, login_method, add_method, delete_methode, info_method): 
+    """
+    请求返回 403 时 (SID 过期或客户端重启), 重新登录后重试一次 
+
+    种子数量较多的请求按 QBITTORRENT_CHUNK_SIZE 分块并发, 每个分块单独重试, 已成功的分块不会重复发送 
+    """
+    def __init__(self, login_method, add_method, delete_methode, resume_method, recheck_method, info_method, sync_method): 
         self.login_method = login_method 
         self.add_method = add_method 
         self.delete_method = delete_methode 
+        self.resume_method = resume_method 
+        self.recheck_method = recheck_method 
         self.info_method = info_method 
+        self.sync_method = sync_method 
         self.client = None 
         self.re_login = False 
+        self.login_lock = asyncio.Lock() 
 
-    def login(self) -> None: 
-        self.client = self.login_method() 
+    async def login(self) -> None: 
+        self.client = await self.login_method() 
+        self.re_login = False 
 
-    def add( 
+    async def _request(self, method, *args) -> Any: 
+        if not self.client or self.re_login: 
+            async with self.login_lock: 
+                if not self.client or self.re_login: 
+                    await self.login() 
+
+        client = self.client 
+        try: 
+            return await method(client, *args) 
+        except TorrentClientForbiddenError: 
+            async with self.login_lock: 
+                # 其他请求已经重新登录时, 直接使用新的 SID 
+                if self.client == client: 
+                    await self.login() 
+
+            return await method(self.client, *args) 
+
+    async def add( 
         self, torrent_urls: Iterable[str] | None = None, 
         torrent_files: Iterable[str] | None = None 
     ) -> str: 
-        if not self.client or self.re_login: 
-            self.login() 
-        
-        return self.add_method(self.client, torrent_urls, torrent_files) 
+        # 分块后并发请求, 全部成功时返回 Ok. 
+        res_list = await asyncio.gather( 
+            *(self._request(self.add_method, chunk, []) for chunk in _chunk(list(torrent_urls or []))), 
+            *(self._request(self.add_method, [], chunk) for chunk in _chunk(list(torrent_files or []))), 
+        ) 
+
+        return next((res for res in res_list if res != 'Ok.'), 'Ok.') 
     
-    def delete(self, torrent_hashes: Iterable[str]) -> None: 
-        if not self.client or self.re_login: 
-            self.login() 
+    async def delete(self, torrent_hashes: Iterable[str]) -> None: 
+        await asyncio.gather(*(self._request(self.delete_method, chunk) for chunk in _chunk(list(torrent_hashes)))) 
+    
+    async def resume(self, torrent_hashes: Iterable[str]) -> None: 
+        await asyncio.gather(*(self._request(self.resume_method, chunk) for chunk in _chunk(list(torrent_hashes)))) 
+    
+    async def recheck(self, torrent_hashes: Iterable[str]) -> None: 
+        await asyncio.gather(*(self._request(self.recheck_method, chunk) for chunk in _chunk(list(torrent_hashes)))) 
+    
+    async def info(self, torrent_hashes: Iterable[str]) -> list[dict[str, str | float]]: 
+        torrent_hash_list = list(torrent_hashes) 
+        if len(torrent_hash_list) == 0: 
+            return await self._request(self.info_method, []) 
+
+        res_list = await asyncio.gather(*(self._request(self.info_method, chunk) for chunk in _chunk(torrent_hash_list))) 
 
-        return self.delete_method(self.client, torrent_hashes) 
+        return [torrent_info for res in res_list for torrent_info in res] 
     
-    def info(self, torrent_hashes: Iterable[str]) -> Iterable[dict[str, str | float]]:
-        if not self.client or self.re_login: 
-            self.login() 
+    async def sync(self, rid: int) -> dict: 
+        return await self._request(self.sync_method, rid) 
+
+
+def get_torrent_info_hash(torrent_info: dict[str, str | float]) -> str: 
+    """
+    qBittorrent 4.4 起混合 (v1 + v2) 种子的 hash 为截断的 v2 hash, 与 get_torrent_infohash 得到的 v1 hash 不同, 
+    优先使用 infohash_v1, 纯 v2 种子或旧版本没有该字段时使用 hash 
+    """
+    return torrent_info.get('infohash_v1') or torrent_info['hash'] 
+
+
+class TorrentStatePoller: 
+    """
+    基于 sync/maindata 的增量接口维护 v1 hash -> 种子状态 的表, 每次刷新只合并变化的部分 
+
+    增量数据以 qBittorrent 的种子 id 为 key, 且只包含变化的字段, 因此另外保存 id -> v1 hash 的映射, 
+    种子 id 同时保存在状态的 hash 字段中, 用于按 id 操作种子的接口 
+    """
+    def __init__(self, torrent_client: TorrentClient): 
+        self.torrent_client = torrent_client 
+        self.rid = 0 
+        self.id_hash_dict: dict[str, str] = dict() 
+        self.hash_state_dict: dict[str, dict[str, str | float]] = dict() 
+        self.refresh_task: asyncio.Task | None = None 
+
+    def _merge_torrent_state(self, torrent_id: str, torrent_state: dict[str, str | float]) -> None: 
+        torrent_hash = torrent_state.get('infohash_v1') or self.id_hash_dict.get(torrent_id, torrent_id) 
+        self.id_hash_dict[torrent_id] = torrent_hash 
+        self.hash_state_dict.setdefault(torrent_hash, {'hash': torrent_id}).update(torrent_state) 
+
+    async def refresh(self) -> None: 
+        # 多个下载批次同时轮询时共享同一次请求 
+        if self.refresh_task is None or self.refresh_task.done(): 
+            self.refresh_task = asyncio.create_task(self._refresh()) 
+
+        await asyncio.shield(self.refresh_task) 
+
+    async def _refresh(self) -> None: 
+        maindata = await self.torrent_client.sync(rid=self.rid) 
+
+        if maindata.get('full_update', False): 
+            self.id_hash_dict = dict() 
+            self.hash_state_dict = dict() 
+
+        for torrent_id, torrent_state in maindata.get('torrents', dict()).items(): 
+            self._merge_torrent_state(torrent_id, torrent_state) 
+
+        for torrent_id in maindata.get('torrents_removed', list()): 
+            self.hash_state_dict.pop(self.id_hash_dict.pop(torrent_id, torrent_id), None) 
+
+        self.rid = maindata['rid'] 
+
+    def merge(self, torrent_info_list: list[dict[str, str | float]]) -> None: 
+        # 合并 torrents/info 的结果, 使下一次增量刷新之前也能读到这些种子的状态 
+        for torrent_info in torrent_info_list: 
+            self._merge_torrent_state(torrent_info['hash'], torrent_info) 
 
-        return self.info_method(self.client, torrent_hashes) 
+    def get(self, torrent_hash: str) -> dict[str, str | float] | None: 
+        # torrent_hash 为 v1 hash 
+        return self.hash_state_dict.get(torrent_hash) 
 
 
 jellyfin_client = MediaClient(login_jellyfin, refresh_jellyfin) 
-qbittorrent_client = TorrentClient(login_qbittorrent, add_qbittorrent, delete_qbittorrent, info_qbittorrent) 
+qbittorrent_client = TorrentClient( 
+    login_qbittorrent, add_qbittorrent, delete_qbittorrent, resume_qbittorrent, recheck_qbittorrent, 
+    info_qbittorrent, sync_qbittorrent, 
+) 
+torrent_state_poller = TorrentStatePoller(qbittorrent_client) 
@@ -1,33 +1,45 @@
+import json 
+import asyncio 
 from contextlib import asynccontextmanager 
 from datetime import datetime, timedelta  
 
-from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, Request 
-from fastapi.responses import JSONResponse   
+from fastapi import FastAPI, APIRouter, Depends, Request 
+from fastapi.responses import JSONResponse, Response, StreamingResponse   
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel 
 from apscheduler.job import Job 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler 
 from starlette.staticfiles import StaticFiles 
 from starlette.templating import Jinja2Templates  
 
 from settings import autoanime_settings, user_settings, read_user_settings_file  
-from model import AnimeAdd, AnimeChange, AnimeInquire, AnimeDelete, AnimeSearch, EpisodeInquire 
+from model import AnimeAdd, AnimeChange, AnimeInquire, AnimeDelete, AnimeSearch, AnimeSearchAll, EpisodeInquire 
 from start_up import cleanup_database, load_and_test_settings 
-from acid.external import add_anime, change_anime, inquire_anime, delete_anime, inquire_episode 
+from acid.external import ( 
+    add_anime, change_anime, inquire_anime, delete_anime, inquire_episode, 
+    add_anime_batch, change_anime_batch, delete_anime_batch, 
+) 
+from acid.internal import change_episode_update_task_db_archive, delete_torrent_cache_out_of_capacity 
+from acid.cache import InquireCache, anime_inquire_cache, episode_inquire_cache 
 from update import update_add_task, update_run_task, update_auto_update 
-from search import search_anime 
+from search import search_anime, search_anime_all, search_cache 
+from utils.request import reopen_client_session, close_client_session 
+from database import open_db_executor, close_db_executor 
 
 
 asyncio_scheduler = AsyncIOScheduler() 
 # tamplates = Jinja2Templates(directory='static') 
 settings_checked = False 
+# 保存后台任务的引用, 避免运行中被回收 
+background_task_set: set[asyncio.Task] = set() 
 
 
 def put_off_auto_update(func): 
-    async def warp_func(): 
+    async def warp_func(*args, **kwargs): 
         job: Job = asyncio_scheduler.get_job(job_id='auto_update') 
         job.modify(next_run_time = None) 
 
-        res = await func() 
+        res = await func(*args, **kwargs) 
 
         job.modify(next_run_time = datetime.now() + timedelta(seconds=user_settings.auto_update_online_interval)) 
         return res 
@@ -38,11 +50,13 @@ def put_off_auto_update(func):
 # lifespan 
 @asynccontextmanager 
 async def lifespan(app: FastAPI): 
+    open_db_executor() 
+
     response = read_user_settings_file(user_settings) 
     if response['code'] == 1: 
         print(response['msg']) 
 
-        response = load_and_test_settings() 
+        response = await load_and_test_settings() 
         if response['code'] == 1: 
             global settings_checked 
             settings_checked = True 
@@ -51,16 +65,37 @@ async def lifespan(app: FastAPI):
     
     else: 
         print(response['msg']) 
+
+    # 会话在读取配置之后创建, 连接池使用配置文件中的参数 
+    await reopen_client_session() 
     
-    cleanup_database() 
+    await cleanup_database() 
     print('Cleaning database completed') 
 
+    # lifespan 再次运行时 (测试, reload) 事件循环已经不同 
+    asyncio_scheduler.configure(event_loop=asyncio.get_running_loop()) 
     asyncio_scheduler.add_job( 
         func=update_auto_update, 
         trigger='interval', 
         id='auto_update', 
         replace_existing=True, 
         seconds=user_settings.auto_update_offline_interval) 
+    # 已完成任务的归档在后台定期进行, 启动时不需要扫描任务表 
+    asyncio_scheduler.add_job( 
+        func=change_episode_update_task_db_archive, 
+        trigger='interval', 
+        id='archive_episode_update_task', 
+        replace_existing=True, 
+        next_run_time=datetime.now(), 
+        seconds=user_settings.episode_update_task_archive_interval) 
+    # 种子文件的清理同样在后台进行, 不占用更新任务的数据库事务 
+    asyncio_scheduler.add_job( 
+        func=delete_torrent_cache_out_of_capacity, 
+        trigger='interval', 
+        id='sweep_torrent_cache', 
+        replace_existing=True, 
+        next_run_time=datetime.now(), 
+        seconds=user_settings.torrent_cache_sweep_interval) 
     asyncio_scheduler.start() 
 
     job: Job = asyncio_scheduler.get_job(job_id='auto_update') 
@@ -69,6 +104,17 @@ async def lifespan(app: FastAPI):
 
     yield 
 
+    asyncio_scheduler.shutdown(wait=False) 
+    # shutdown 在事件循环的下一轮执行 
+    await asyncio.sleep(0) 
+    # 搜索缓存的后台刷新会使用 http 会话, 需要在会话关闭前取消 
+    await search_cache.cancel_refresh_tasks() 
+    await close_client_session() 
+    print('The http client session is closed') 
+
+    close_db_executor() 
+    print('The database executor is closed') 
+
 
 app = FastAPI(
     debug=True, 
@@ -119,7 +165,7 @@ settings_router = APIRouter(prefix='/settings')
 async def check_settings() -> dict[str, int | str | list]: 
     global settings_checked 
 
-    response = load_and_test_settings() 
+    response = await load_and_test_settings() 
     if response['code'] == 1: 
         settings_checked = True 
     else: 
@@ -134,7 +180,13 @@ add_router = APIRouter(prefix='/add')
 
 @add_router.post('/') 
 async def add_anime_api(anime_add: AnimeAdd) -> dict[str, int | str | list]: 
-    response = add_anime(anime_add) 
+    response = await add_anime(anime_add) 
+    return response 
+
+
+@add_router.post('/batch') 
+async def add_anime_batch_api(anime_add_list: list[AnimeAdd]) -> dict[str, int | str | list]: 
+    response = await add_anime_batch(anime_add_list) 
     return response 
 
 
@@ -144,7 +196,13 @@ change_router = APIRouter(prefix='/change')
 
 @change_router.post('/')
 async def change_anime_api(anime_change: AnimeChange) -> dict[str, int | str | list]: 
-    response = change_anime(anime_change) 
+    response = await change_anime(anime_change) 
+    return response 
+
+
+@change_router.post('/batch') 
+async def change_anime_batch_api(anime_change_list: list[AnimeChange]) -> dict[str, int | str | list]: 
+    response = await change_anime_batch(anime_change_list) 
     return response 
 
 
@@ -152,15 +210,28 @@ async def change_anime_api(anime_change: AnimeChange) -> dict[str, int | str | l
 inquire_router = APIRouter(prefix='/inquire') 
 
 
+async def _inquire_with_cache( 
+        inquire_cache: InquireCache, inquire_model: BaseModel, inquire_func, request: Request 
+    ) -> Response: 
+    # 数据没有变化时, 带有相同 ETag 的轮询请求直接返回 304 
+    key = inquire_model.model_dump_json() 
+    etag = inquire_cache.get_etag(key) 
+    if request.headers.get('If-None-Match') == etag: 
+        return Response(status_code=304, headers={'ETag': etag}) 
+
+    etag, body = await inquire_cache.get_or_inquire(key, inquire_func, inquire_model) 
+    return Response(content=body, media_type='application/json', headers={'ETag': etag}) 
+
+
 @inquire_router.post('/anime')
-async def inquire_anime_api(anime_inquire: AnimeInquire) -> dict[str, int | str | list]: 
-    response = inquire_anime(anime_inquire) 
+async def inquire_anime_api(anime_inquire: AnimeInquire, request: Request) -> Response: 
+    response = await _inquire_with_cache(anime_inquire_cache, anime_inquire, inquire_anime, request) 
     return response 
 
 
 @inquire_router.post('/episode') 
-async def inquire_episode_api(episode_inquire: EpisodeInquire) -> dict[str, int | str | list]: 
-    response = inquire_episode(episode_inquire) 
+async def inquire_episode_api(episode_inquire: EpisodeInquire, request: Request) -> Response: 
+    response = await _inquire_with_cache(episode_inquire_cache, episode_inquire, inquire_episode, request) 
     return response 
 
 
@@ -170,7 +241,13 @@ delete_router = APIRouter(prefix='/delete')
 
 @delete_router.delete('/') 
 async def delete_anime_api(anime_delete: AnimeDelete) -> dict[str, int | str | list]: 
-    response = delete_anime(anime_delete) 
+    response = await delete_anime(anime_delete) 
+    return response 
+
+
+@delete_router.delete('/batch') 
+async def delete_anime_batch_api(anime_delete_list: list[AnimeDelete]) -> dict[str, int | str | list]: 
+    response = await delete_anime_batch(anime_delete_list) 
     return response 
 
 
@@ -184,14 +261,34 @@ async def search_anime_api(anime_search: AnimeSearch) -> dict[str, int | str | l
     return response 
 
 
+@search_router.post('/all') 
+async def search_anime_all_api(anime_search_all: AnimeSearchAll) -> StreamingResponse: 
+    # 每个来源的结果为一行 JSON, 按返回的先后顺序发送 
+    async def ndjson_generator(): 
+        async for response in search_anime_all(anime_search_all): 
+            yield json.dumps(response, ensure_ascii=False) + '\n' 
+
+    return StreamingResponse(ndjson_generator(), media_type='application/x-ndjson') 
+
+
+@search_router.get('/cache/') 
+async def search_cache_api() -> dict[str, int | str | dict[str, int]]: 
+    return {'code': 1, 'msg': 'success', 'detail': search_cache.stats()} 
+
+
 # 与更新有关的接口 
 update_router = APIRouter(prefix='/update') 
 
 
 @update_router.get('/') 
-async def update_add_task_and_run_task_api(background_tasks: BackgroundTasks) -> dict[str, int | str | list]: 
-    response = await update_add_task(auto_update=False)
-    background_tasks.add_task(put_off_auto_update(update_run_task)) 
+async def update_add_task_and_run_task_api() -> dict[str, int | str | list]: 
+    # 下载在第一个任务写入后即开始, 接口在全部 RSS 处理完成后返回, 下载继续在后台进行 
+    task_committed_queue: asyncio.Queue[bool | None] = asyncio.Queue() 
+    run_task = asyncio.create_task(put_off_auto_update(update_run_task)(task_committed_queue)) 
+    background_task_set.add(run_task) 
+    run_task.add_done_callback(background_task_set.discard) 
+
+    response = await update_add_task(auto_update=False, task_committed_queue=task_committed_queue) 
     return response  
 
 
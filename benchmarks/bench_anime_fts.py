@@ -0,0 +1,109 @@
+"""
+AnimeDB 中有 50k 个番剧时, 按名字查询 (全文索引与 LIKE) 以及逐个修改, 删除番剧的耗时 
+
+fts sql 为全文索引查询语句本身的耗时, fts inquire 与 like inquire 为 inquire_anime 的耗时, 
+包括事件循环, 数据库线程池与 SQLAlchemy 的开销 
+
+    python benchmarks/bench_anime_fts.py [rows] 
+"""
+import sys 
+import random 
+import asyncio 
+
+from common import prepare, print_table, timer 
+
+prepare() 
+
+from sqlmodel import Session, SQLModel 
+from sqlalchemy import update, delete 
+
+import acid.external 
+from database import engine, AnimeDB 
+from model import AnimeInquire 
+from acid.external import inquire_anime, _inquire_anime_fts 
+
+
+ROWS_DEFAULT = 50_000 
+QUERY_NUM = 200 
+WRITE_NUM = 500 
+WORD_LIST = [ 
+    'sousou', 'frieren', 'dungeon', 'meshi', 'kusuriya', 'hitorigoto', 'oshi', 'jujutsu', 'kaisen', 'spy', 
+    'family', 'bocchi', 'rock', 'mushoku', 'tensei', 'shingeki', 'kyojin', 'yofukashi', 'no', 'uta', 
+] 
+
+
+def fill_database(rows: int) -> None: 
+    random.seed(0) 
+    with engine.begin() as connection: 
+        for table in reversed(SQLModel.metadata.sorted_tables): 
+            connection.execute(table.delete()) 
+
+        connection.execute(AnimeDB.__table__.insert(), [ 
+            { 
+                'uuid': f'uuid{i:08d}', 'name': ' '.join(random.sample(WORD_LIST, 3)) + f' {i}', 'season': 1, 
+                'dir_path': '', 'source': 'dmhy', 'search_text': ' '.join(random.sample(WORD_LIST, 2)), 
+                'http_url': '', 'episodes_str': '', 'newest_pub_date': 0., 'auto_update': True, 
+                'under_management': False, 
+            } 
+            for i in range(rows) 
+        ]) 
+
+
+def bench_inquire(use_fts: bool) -> float: 
+    fts_available = acid.external.anime_fts_available 
+    acid.external.anime_fts_available = fts_available and use_fts 
+
+    time_list: list[float] = list() 
+    try: 
+        for i in range(QUERY_NUM): 
+            anime_inquire = AnimeInquire(uuid=None, name=f'{WORD_LIST[i % len(WORD_LIST)]} {i}', limit=20) 
+            with timer(time_list): 
+                asyncio.run(inquire_anime(anime_inquire)) 
+    finally: 
+        acid.external.anime_fts_available = fts_available 
+
+    return sum(time_list) / len(time_list) 
+
+
+def bench_fts_sql() -> float: 
+    time_list: list[float] = list() 
+    with Session(engine) as session: 
+        for i in range(QUERY_NUM): 
+            with timer(time_list): 
+                _inquire_anime_fts(session, ['uuid', 'name'], f'{WORD_LIST[i % len(WORD_LIST)]} {i}', None, 21) 
+
+    return sum(time_list) / len(time_list) 
+
+
+def bench_write(rows: int) -> tuple[float, float]: 
+    update_time_list: list[float] = list() 
+    delete_time_list: list[float] = list() 
+    for i in random.sample(range(rows), WRITE_NUM): 
+        with timer(update_time_list), engine.begin() as connection: 
+            connection.execute(update(AnimeDB).where(AnimeDB.uuid == f'uuid{i:08d}').values(search_text='renamed')) 
+        with timer(delete_time_list), engine.begin() as connection: 
+            connection.execute(delete(AnimeDB).where(AnimeDB.uuid == f'uuid{i:08d}')) 
+
+    return sum(update_time_list) / WRITE_NUM, sum(delete_time_list) / WRITE_NUM 
+
+
+def main() -> None: 
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS_DEFAULT 
+    fill_database(rows) 
+
+    if not acid.external.anime_fts_available: 
+        print('SQLite does not support FTS5 trigram, only LIKE is measured') 
+
+    fts_sql_ms = bench_fts_sql() if acid.external.anime_fts_available else float('nan') 
+    fts_ms = bench_inquire(use_fts=True) 
+    like_ms = bench_inquire(use_fts=False) 
+    update_ms, delete_ms = bench_write(rows) 
+
+    print_table( 
+        ['rows', 'fts sql ms', 'fts inquire ms', 'like inquire ms', 'update ms', 'delete ms'], 
+        [[rows, f'{fts_sql_ms:.2f}', f'{fts_ms:.2f}', f'{like_ms:.2f}', f'{update_ms:.2f}', f'{delete_ms:.2f}']], 
+    ) 
+
+
+if __name__ == '__main__': 
+    main() 
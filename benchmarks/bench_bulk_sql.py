@@ -0,0 +1,115 @@
+"""
+任务表行数增加时, 启动清理与写入更新结果的耗时和语句数 
+
+每一轮清空数据库后写入 rows 行番剧与任务, 其中 1% 处于 under_management, 然后测量: 
+启动清理 (change_anime_db_clean_up + change_episode_update_task_db_cleanup), 
+解锁 500 个番剧, 写入 500 个任务的结果 (成功与失败各一半) 
+
+    python benchmarks/bench_bulk_sql.py [rows ...] 
+"""
+import sys 
+import asyncio 
+
+from common import prepare, print_table, timer 
+
+prepare() 
+
+from sqlmodel import SQLModel 
+from sqlalchemy import event, select 
+
+from database import engine, AnimeDB, EpisodeUpdateTaskDB 
+from acid.internal import ( 
+    change_anime_db_clean_up, 
+    change_anime_db_unlock, 
+    change_episode_update_task_db_cleanup, 
+    change_episode_update_task_db_update_result, 
+) 
+
+
+ROWS_LIST_DEFAULT = [1_000, 10_000, 100_000] 
+RESULT_BATCH_SIZE = 500 
+
+
+def fill_database(rows: int) -> None: 
+    locked_num = max(rows // 100, RESULT_BATCH_SIZE) 
+    with engine.begin() as connection: 
+        for table in reversed(SQLModel.metadata.sorted_tables): 
+            connection.execute(table.delete()) 
+
+        connection.execute(AnimeDB.__table__.insert(), [ 
+            { 
+                'uuid': f'uuid{i}', 'name': f'anime{i}', 'season': 1, 'dir_path': '', 'source': 'dmhy', 
+                'search_text': None, 'http_url': '', 'episodes_str': '', 'newest_pub_date': 0., 
+                'auto_update': True, 'under_management': i < locked_num, 
+            } 
+            for i in range(rows) 
+        ]) 
+        connection.execute(EpisodeUpdateTaskDB.__table__.insert(), [ 
+            { 
+                'torrent_hash': f'hash{i}', 'torrent_file_path': '', 'torrent_magnet': '', 'uuid': f'uuid{i}', 
+                'name': f'anime{i}', 'season': 1, 'episode_num': 1, 'file_path': '', 'pub_date': 0., 
+                'under_management': i < locked_num, 'done': i >= locked_num, 'success': i >= locked_num, 
+            } 
+            for i in range(rows) 
+        ]) 
+
+
+def count_statements(func, *args) -> tuple[float, int]: 
+    statement_list: list[str] = list() 
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany): 
+        statement_list.append(statement) 
+
+    time_list: list[float] = list() 
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute) 
+    try: 
+        with timer(time_list): 
+            asyncio.run(func(*args)) 
+    finally: 
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute) 
+
+    return time_list[0], len(statement_list) 
+
+
+async def startup_cleanup() -> None: 
+    await change_anime_db_clean_up() 
+    await change_episode_update_task_db_cleanup() 
+
+
+def main() -> None: 
+    rows_list = [int(x) for x in sys.argv[1:]] or ROWS_LIST_DEFAULT 
+
+    row_list = list() 
+    for rows in rows_list: 
+        fill_database(rows) 
+        cleanup_ms, cleanup_num = count_statements(startup_cleanup) 
+
+        fill_database(rows) 
+        uuid_set = {f'uuid{i}' for i in range(RESULT_BATCH_SIZE)} 
+        with engine.connect() as connection: 
+            id_list = connection.execute( 
+                select(EpisodeUpdateTaskDB.__table__.c.id_).where(EpisodeUpdateTaskDB.__table__.c.done == False) 
+                .limit(RESULT_BATCH_SIZE) 
+            ).scalars().all() 
+        unlock_ms, unlock_num = count_statements(change_anime_db_unlock, uuid_set) 
+        result_ms, result_num = count_statements( 
+            change_episode_update_task_db_update_result, 
+            set(id_list[:RESULT_BATCH_SIZE // 2]), set(id_list[RESULT_BATCH_SIZE // 2:]), 
+        ) 
+
+        row_list.append([ 
+            rows, 
+            f'{cleanup_ms:.1f}', cleanup_num, 
+            f'{unlock_ms:.1f}', unlock_num, 
+            f'{result_ms:.1f}', result_num, 
+        ]) 
+
+    print_table( 
+        ['rows', 'cleanup ms', 'stmts', f'unlock {RESULT_BATCH_SIZE} ms', 'stmts', 
+         f'result {RESULT_BATCH_SIZE} ms', 'stmts'], 
+        row_list, 
+    ) 
+
+
+if __name__ == '__main__': 
+    main() 
@@ -0,0 +1,37 @@
+import os 
+import sys 
+import time 
+import atexit 
+import tempfile 
+from contextlib import contextmanager 
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
+sys.path.insert(0, REPO_PATH) 
+
+
+def prepare() -> None: 
+    """
+    在导入 database 之前调用: 数据库建在临时目录中, 缺少配置文件时临时创建一个空文件 
+    """
+    settings_file_path = os.path.join(REPO_PATH, 'user_settings.yaml') 
+    if not os.path.isfile(settings_file_path): 
+        open(settings_file_path, mode='w').close() 
+        atexit.register(os.remove, settings_file_path) 
+
+    from settings import user_settings 
+    user_settings.work_path = tempfile.mkdtemp(prefix='autoanime-bench-') 
+
+
+@contextmanager 
+def timer(result_list: list[float]): 
+    start = time.perf_counter() 
+    try: 
+        yield 
+    finally: 
+        result_list.append((time.perf_counter() - start) * 1000) 
+
+
+def print_table(header_list: list[str], row_list: list[list]) -> None: 
+    width_list = [max(len(str(x)) for x in column) for column in zip(header_list, *row_list)] 
+    for row in [header_list, *row_list]: 
+        print('  '.join(str(x).rjust(width) for x, width in zip(row, width_list))) 
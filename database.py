@@ -1,9 +1,29 @@
+import asyncio 
+import sqlite3 
+from concurrent.futures import ThreadPoolExecutor 
+from functools import partial, wraps 
+from typing import Awaitable, Callable, ParamSpec, TypeVar 
+
 from sqlmodel import SQLModel, Field, create_engine 
+from sqlalchemy import Connection, Index, event, inspect, select, and_ 
+from sqlalchemy.exc import DatabaseError 
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert 
 
 from settings import user_settings 
 
 
+SQLITE_BUSY_TIMEOUT = 5000 
+SQLITE_MMAP_SIZE = 268435456 
+# SQLite 同时只有一个写入者, 线程数不需要很多, 主要用于读与写并行 
+DB_EXECUTOR_MAX_WORKERS = 4 
+
+P = ParamSpec('P') 
+R = TypeVar('R') 
+
+
 class AnimeDB(SQLModel, table=True): 
+    __table_args__ = (Index('ix_animedb_name_season', 'name', 'season'), ) 
+
     uuid: str = Field(primary_key=True) 
     name: str 
     season: int 
@@ -11,13 +31,23 @@ class AnimeDB(SQLModel, table=True):
     source: str 
     search_text: str | None 
     http_url: str 
-    episodes_str: str 
+    # 已下载的剧集保存在 AnimeEpisodeDB 中, 此字段仅用于迁移旧数据 
+    episodes_str: str = '' 
     newest_pub_date: float 
     auto_update: bool 
-    under_management: bool 
+    under_management: bool = Field(index=True) 
+
+
+class AnimeEpisodeDB(SQLModel, table=True): 
+    uuid: str = Field(primary_key=True) 
+    episode_num: int = Field(primary_key=True) 
+    pub_date: float 
+    torrent_hash: str 
 
 
 class EpisodeUpdateTaskDB(SQLModel, table=True): 
+    __table_args__ = (Index('ix_episodeupdatetaskdb_uuid_episode_num', 'uuid', 'episode_num'), ) 
+
     id_: int | None = Field(default=None, primary_key=True) 
     torrent_hash: str 
     torrent_file_path: str 
@@ -28,14 +58,229 @@ class EpisodeUpdateTaskDB(SQLModel, table=True):
     episode_num: int 
     file_path: str 
     pub_date: float 
-    under_management: bool 
-    done: bool 
+    under_management: bool = Field(index=True) 
+    done: bool = Field(index=True) 
     success: bool 
 
 
+class EpisodeUpdateTaskArchiveDB(SQLModel, table=True): 
+    # 已完成的下载任务按 id 区间从 EpisodeUpdateTaskDB 移入, 只保留查询历史需要的字段, 保持原有的 id 
+    id_: int = Field(primary_key=True) 
+    torrent_hash: str 
+    uuid: str 
+    name: str 
+    season: int 
+    episode_num: int 
+    pub_date: float 
+    success: bool 
+
+
+class TorrentCacheDB(SQLModel, table=True): 
+    torrent_url: str = Field(primary_key=True) 
+    torrent_hash: str = Field(index=True) 
+    torrent_file_path: str 
+    size: int 
+    accessed_at: float 
+
+
+class FeedCacheDB(SQLModel, table=True): 
+    http_url: str = Field(primary_key=True) 
+    etag: str | None 
+    last_modified: str | None 
+
+
+# 番剧名与搜索关键词的全文索引, 由触发器与 AnimeDB 保持同步, trigram 分词需要 SQLite 3.34 以上 
+ANIME_FTS_TABLE_NAME = 'anime_fts' 
+# trigram 分词无法匹配少于 3 个字符的关键词 
+ANIME_FTS_MIN_QUERY_LENGTH = 3 
+# 外部内容表: 内容从 AnimeDB 按 rowid 读取, 触发器按 rowid 删除索引, 不需要扫描全文索引表 
+# AnimeDB 的 rowid 不是 INTEGER PRIMARY KEY, VACUUM 后可能变化, 启动时由 _check_anime_fts 检查并重建索引 
+ANIME_FTS_DDL_LIST = [ 
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {ANIME_FTS_TABLE_NAME} USING fts5(" 
+    f"uuid UNINDEXED, name, search_text, content='animedb', content_rowid='rowid', tokenize='trigram')", 
+    f"CREATE TRIGGER IF NOT EXISTS animedb_fts_insert AFTER INSERT ON animedb BEGIN " 
+    f"INSERT INTO {ANIME_FTS_TABLE_NAME}(rowid, uuid, name, search_text) " 
+    f"VALUES (new.rowid, new.uuid, new.name, new.search_text); END", 
+    f"CREATE TRIGGER IF NOT EXISTS animedb_fts_delete AFTER DELETE ON animedb BEGIN " 
+    f"INSERT INTO {ANIME_FTS_TABLE_NAME}({ANIME_FTS_TABLE_NAME}, rowid, uuid, name, search_text) " 
+    f"VALUES ('delete', old.rowid, old.uuid, old.name, old.search_text); END", 
+    f"CREATE TRIGGER IF NOT EXISTS animedb_fts_update AFTER UPDATE OF uuid, name, search_text ON animedb BEGIN " 
+    f"INSERT INTO {ANIME_FTS_TABLE_NAME}({ANIME_FTS_TABLE_NAME}, rowid, uuid, name, search_text) " 
+    f"VALUES ('delete', old.rowid, old.uuid, old.name, old.search_text); " 
+    f"INSERT INTO {ANIME_FTS_TABLE_NAME}(rowid, uuid, name, search_text) " 
+    f"VALUES (new.rowid, new.uuid, new.name, new.search_text); END", 
+] 
+
+
+def _create_anime_fts(connection: Connection) -> bool: 
+    compile_option_list = connection.exec_driver_sql('PRAGMA compile_options').scalars().all() 
+    if 'ENABLE_FTS5' not in compile_option_list or sqlite3.sqlite_version_info < (3, 34, 0): 
+        print('SQLite does not support FTS5 trigram, anime name inquiries fall back to LIKE') 
+        return False 
+
+    for ddl in ANIME_FTS_DDL_LIST: 
+        connection.exec_driver_sql(ddl) 
+
+    return True 
+
+
+@event.listens_for(AnimeDB.__table__, 'after_create') 
+def _create_anime_fts_after_create(target, connection: Connection, **kw) -> None: 
+    # 新数据库不执行迁移, 全文索引随 AnimeDB 一起创建 
+    _create_anime_fts(connection) 
+
+
+def _migration_episodes_str(connection: Connection) -> None: 
+    # 将 AnimeDB.episodes_str 中逗号分隔的剧集迁移到 AnimeEpisodeDB, 发布时间与种子 hash 从成功的下载任务中恢复 
+    anime_table = AnimeDB.__table__ 
+    anime_episode_table = AnimeEpisodeDB.__table__ 
+    episode_table = EpisodeUpdateTaskDB.__table__ 
+
+    uuid_episodes_str_list = connection.execute( 
+        select(anime_table.c.uuid, anime_table.c.episodes_str).where(anime_table.c.episodes_str != '') 
+    ).all() 
+    if len(uuid_episodes_str_list) == 0: 
+        return 
+
+    uuid_num_task_dict: dict[tuple[str, int], tuple[float, str]] = dict() 
+    for uuid, episode_num, pub_date, torrent_hash in connection.execute( 
+        select( 
+            episode_table.c.uuid, episode_table.c.episode_num, episode_table.c.pub_date, episode_table.c.torrent_hash 
+        ).where(and_( 
+            episode_table.c.success == True, 
+            episode_table.c.uuid.in_([uuid for uuid, _ in uuid_episodes_str_list]), 
+        )).order_by(episode_table.c.id_) 
+    ).all(): 
+        uuid_num_task_dict[(uuid, episode_num)] = (pub_date, torrent_hash) 
+
+    anime_episode_list: list[dict[str, str | int | float]] = list() 
+    for uuid, episodes_str in uuid_episodes_str_list: 
+        for episode_num in {int(x) for x in episodes_str.split(',') if len(x) > 0}: 
+            pub_date, torrent_hash = uuid_num_task_dict.get((uuid, episode_num), (0., '')) 
+            anime_episode_list.append( 
+                {'uuid': uuid, 'episode_num': episode_num, 'pub_date': pub_date, 'torrent_hash': torrent_hash} 
+            ) 
+
+    if len(anime_episode_list) > 0: 
+        connection.execute(sqlite_insert(anime_episode_table).on_conflict_do_nothing(), anime_episode_list) 
+
+    connection.execute(anime_table.update().values(episodes_str='')) 
+
+
+def _migration_indexes(connection: Connection) -> None: 
+    # create_all 不会为已存在的表创建新增的索引 
+    for table in SQLModel.metadata.sorted_tables: 
+        for index in table.indexes: 
+            index.create(connection, checkfirst=True) 
+
+
+def _migration_anime_fts(connection: Connection) -> None: 
+    if _create_anime_fts(connection): 
+        connection.exec_driver_sql(f"INSERT INTO {ANIME_FTS_TABLE_NAME}({ANIME_FTS_TABLE_NAME}) VALUES ('rebuild')") 
+
+
+def _check_anime_fts(connection: Connection) -> None: 
+    # rowid 变化后索引会指向错误的番剧, integrity-check 会与 AnimeDB 的内容比较, 不一致时重建 
+    try: 
+        connection.exec_driver_sql( 
+            f"INSERT INTO {ANIME_FTS_TABLE_NAME}({ANIME_FTS_TABLE_NAME}, rank) VALUES ('integrity-check', 1)" 
+        ) 
+    except DatabaseError: 
+        print('Anime full-text index does not match the anime table, rebuilding') 
+        connection.exec_driver_sql(f"INSERT INTO {ANIME_FTS_TABLE_NAME}({ANIME_FTS_TABLE_NAME}) VALUES ('rebuild')") 
+
+
+def _migration_anime_fts_external_content(connection: Connection) -> None: 
+    # 之前的全文索引自带内容并按 uuid 删除, 每次修改 AnimeDB 都会扫描整个索引表, 改为外部内容表 
+    for trigger_name in ('animedb_fts_insert', 'animedb_fts_delete', 'animedb_fts_update'): 
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger_name}') 
+    connection.exec_driver_sql(f'DROP TABLE IF EXISTS {ANIME_FTS_TABLE_NAME}') 
+
+    _migration_anime_fts(connection) 
+
+
+# 只能在末尾追加, 数据库的 user_version 记录已执行的迁移数量 
+migration_list: list[Callable[[Connection], None]] = [ 
+    _migration_episodes_str, 
+    _migration_indexes, 
+    _migration_anime_fts, 
+    _migration_anime_fts_external_content, 
+] 
+
+
+def migrate_database() -> None: 
+    is_new_database = len(inspect(engine).get_table_names()) == 0 
+    SQLModel.metadata.create_all(engine) 
+
+    with engine.begin() as connection: 
+        if is_new_database: 
+            connection.exec_driver_sql(f'PRAGMA user_version = {len(migration_list)}') 
+            return 
+
+        version = connection.exec_driver_sql('PRAGMA user_version').scalar() 
+        for migration in migration_list[version:]: 
+            migration(connection) 
+            version += 1 
+            connection.exec_driver_sql(f'PRAGMA user_version = {version}') 
+            print(f'Database migrated to version {version}') 
+
+        if inspect(connection).has_table(ANIME_FTS_TABLE_NAME): 
+            _check_anime_fts(connection) 
+
+
 engine = create_engine(url=f'sqlite:///{user_settings.work_path}/autoanime.db') 
 # engine = create_engine(url=f'sqlite:///{user_settings.work_path}/autoanime.db', echo=True)  
-SQLModel.metadata.create_all(engine) 
+
+
+@event.listens_for(engine, 'connect') 
+def _set_sqlite_pragma(dbapi_connection, connection_record) -> None: 
+    # WAL 模式下读不会被写阻塞, 更新任务写入时接口仍可以正常查询 
+    cursor = dbapi_connection.cursor() 
+    cursor.execute('PRAGMA journal_mode = WAL') 
+    cursor.execute('PRAGMA synchronous = NORMAL') 
+    cursor.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}') 
+    cursor.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}') 
+    cursor.close() 
+
+
+migrate_database() 
+anime_fts_available = inspect(engine).has_table(ANIME_FTS_TABLE_NAME) 
+
+
+db_executor: ThreadPoolExecutor | None = None 
+
+
+def open_db_executor() -> ThreadPoolExecutor: 
+    # 关闭后再次调用时重新创建, lifespan 可以多次运行 (测试, reload) 
+    global db_executor 
+
+    if db_executor is None: 
+        db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_MAX_WORKERS, thread_name_prefix='autoanime-db') 
+
+    return db_executor 
+
+
+def close_db_executor() -> None: 
+    global db_executor 
+
+    if db_executor is not None: 
+        db_executor.shutdown(wait=True) 
+
+    db_executor = None 
+
+
+def run_in_db_executor(func: Callable[P, R]) -> Callable[P, Awaitable[R]]: 
+    """
+    将同步的数据库操作放到专用的线程池中执行, 调用方 await 时不阻塞事件循环 
+
+    被装饰的函数应在内部创建自己的 Session, 不要在线程之间共享 Session 
+    """
+    @wraps(func) 
+    async def warp_func(*args: P.args, **kwargs: P.kwargs) -> R: 
+        loop = asyncio.get_running_loop() 
+        return await loop.run_in_executor(open_db_executor(), partial(func, *args, **kwargs)) 
+
+    return warp_func 
 
 
 # if __name__ == '__main__': 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, DirectoryPath, HttpUrl, AnyUrl  
+from pydantic import BaseModel, DirectoryPath, HttpUrl, AnyUrl, Field  
 
 from settings import AnimeSources
 
@@ -20,9 +20,17 @@ class AnimeChange(BaseModel, validate_assignment=True):
     auto_update: bool | None = None 
 
 
+INQUIRE_LIMIT_DEFAULT = 100 
+INQUIRE_LIMIT_MAX = 1000 
+
+
 class AnimeInquire(BaseModel, validate_assignment=True): 
     uuid: str | None 
     name: str | None 
+    # 分页: cursor 为上一页返回的 next_cursor, fields 为需要返回的字段, 为空时返回全部字段 
+    cursor: str | None = None 
+    limit: int = Field(default=INQUIRE_LIMIT_DEFAULT, ge=1, le=INQUIRE_LIMIT_MAX) 
+    fields: list[str] | None = None 
 
 
 class AnimeDelete(BaseModel, validate_assignment=True): 
@@ -35,6 +43,10 @@ class AnimeSearch(BaseModel, validate_assignment=True):
     http_url: HttpUrl | None 
 
 
+class AnimeSearchAll(BaseModel, validate_assignment=True): 
+    search_text: str = Field(min_length=1) 
+
+
 class AnimeUpdate(BaseModel, validate_assignment=True): 
     uuid: str 
     name: str 
@@ -42,8 +54,6 @@ class AnimeUpdate(BaseModel, validate_assignment=True):
     dir_path: DirectoryPath 
     source: AnimeSources 
     http_url: HttpUrl 
-    episodes_list: list[int] 
-    xml: str 
 
 
 class EpisodeAdd(BaseModel, validate_assignment=True): 
@@ -59,6 +69,9 @@ class EpisodeAdd(BaseModel, validate_assignment=True):
 class EpisodeInquire(BaseModel, validate_assignment=True): 
     done: bool | None 
     under_management: bool | None
+    cursor: int | None = None 
+    limit: int = Field(default=INQUIRE_LIMIT_DEFAULT, ge=1, le=INQUIRE_LIMIT_MAX) 
+    fields: list[str] | None = None 
 
 
 class EpisodeUpdate(BaseModel, validate_assignment=True): 
@@ -1,7 +1,29 @@
-from settings import AnimeSourcesParsed 
-from model import AnimeSearch 
-from utils.request import request_xml_async 
-from utils.anime import get_http_url, get_episode_info 
+import asyncio 
+import unicodedata 
+from typing import AsyncIterator 
+
+from settings import AnimeSources, AnimeSourcesParsed, user_settings 
+from model import AnimeSearch, AnimeSearchAll 
+from utils.anime import get_http_url, request_episode_info_async 
+from utils.episode import get_magnet_infohash 
+from utils.ttlcache import TTLCache 
+
+
+search_cache = TTLCache() 
+
+
+async def _request_episode_info_tuple_async(source: AnimeSources, http_url: str) -> tuple[tuple[str, int, float, str], ...]: 
+    # 缓存的结果会返回给所有调用者, 保存为元组避免被其中一个调用者修改 
+    return tuple(await request_episode_info_async(source, http_url)) 
+
+
+async def _request_episode_info_cached_async(source: AnimeSources, http_url: str) -> tuple[tuple[str, int, float, str], ...]: 
+    # 搜索结果按 (来源, 地址) 缓存, 地址由搜索关键词生成或直接传入 
+    return await search_cache.get_or_fetch( 
+        (source.value, http_url), 
+        user_settings.search_cache_ttl, user_settings.search_cache_stale_ttl, user_settings.search_cache_max_size, 
+        _request_episode_info_tuple_async, source, http_url, 
+    ) 
 
 
 async def search_anime(anime_search: AnimeSearch) -> dict[str, str | list[dict[str, str | float]]]: 
@@ -27,8 +49,10 @@ async def search_anime(anime_search: AnimeSearch) -> dict[str, str | list[dict[s
         else:
             return {'code': 0, 'msg': f'The selected source {anime_search.source.value} must be passed the http url', 'detail': []} 
         
-    xml = await request_xml_async(http_url) 
-    episode_info_list = get_episode_info(anime_search.source, xml) 
+    try: 
+        episode_info_list = await _request_episode_info_cached_async(anime_search.source, http_url) 
+    except Exception as e: 
+        return {'code': 0, 'msg': f'Search failed: {repr(e)}', 'detail': []} 
 
     return { 
         'code': 1, 'msg': 'success', 
@@ -39,3 +63,69 @@ async def search_anime(anime_search: AnimeSearch) -> dict[str, str | list[dict[s
         ] 
     } 
 
+
+
+def _normalize_title(title: str) -> str: 
+    return ' '.join(unicodedata.normalize('NFKC', title).casefold().split()) 
+
+
+def _get_torrent_url_infohash(torrent_url: str) -> str | None: 
+    # 只有磁力链接可以直接得到 infohash, 种子文件地址按标题去重 
+    if not torrent_url.startswith('magnet:'): 
+        return None 
+
+    try: 
+        return get_magnet_infohash(torrent_url) 
+    except (AssertionError, ValueError): 
+        return None 
+
+
+async def _search_source_async( 
+        source: AnimeSourcesParsed, search_text: str 
+    ) -> tuple[AnimeSourcesParsed, tuple[tuple[str, int, float, str], ...] | Exception]: 
+    try: 
+        source_ = AnimeSources(source.value) 
+        return source, await _request_episode_info_cached_async(source_, get_http_url(source_, search_text)) 
+    except Exception as e: 
+        return source, e 
+
+
+async def search_anime_all(anime_search_all: AnimeSearchAll) -> AsyncIterator[dict[str, str | list[dict[str, str | float]]]]: 
+    """
+    同时搜索所有可解析的来源, 每个来源返回后立即产出该来源的结果 
+
+    之前的来源已经返回过的剧集会被去掉, 相同的剧集按磁力链接的 infohash 或规范化后的标题确定 
+    """
+    task_list = [ 
+        asyncio.create_task(_search_source_async(source, anime_search_all.search_text)) 
+        for source in AnimeSourcesParsed 
+    ] 
+
+    infohash_set: set[str] = set() 
+    title_set: set[str] = set() 
+    try: 
+        for next_result in asyncio.as_completed(task_list): 
+            source, episode_info_list = await next_result 
+
+            if isinstance(episode_info_list, Exception): 
+                yield {'code': 0, 'source': source.value, 'msg': f'Search failed: {repr(episode_info_list)}', 'detail': []} 
+                continue 
+
+            detail: list[dict[str, str | float]] = list() 
+            for title, episode_num, pub_date, torrent_url in episode_info_list: 
+                infohash = _get_torrent_url_infohash(torrent_url) 
+                normalized_title = _normalize_title(title) 
+                if infohash in infohash_set or normalized_title in title_set: 
+                    continue 
+
+                if infohash is not None: 
+                    infohash_set.add(infohash) 
+                title_set.add(normalized_title) 
+                detail.append({'title': title, 'episode_num': str(episode_num), 'pub_date': pub_date}) 
+
+            yield {'code': 1, 'source': source.value, 'msg': 'success', 'detail': detail} 
+
+    finally: 
+        # 客户端断开时不再等待其余的来源 
+        for task in task_list: 
+            task.cancel() 
@@ -28,6 +28,14 @@ class AnimeSourcesSubscribed(str, Enum):
     pass 
 
 
+class ImportStrategies(str, Enum): 
+    auto = 'auto' 
+    hardlink = 'hardlink' 
+    reflink = 'reflink' 
+    rename = 'rename' 
+    copy = 'copy' 
+
+
 class UserSettings(BaseModel, validate_assignment=True): 
     # Base Settings 
     host_name: str 
@@ -43,6 +51,10 @@ class UserSettings(BaseModel, validate_assignment=True):
     qbittorrent_password: Secret[str] 
     # Update Settings 
     refresh_time: int 
+    copy_worker_num: int = 2 
+    update_add_worker_num: int = 2 
+    update_queue_size: int = 16 
+    import_strategy: ImportStrategies = ImportStrategies.auto 
     auto_update_offline_interval: int 
     auto_update_online_interval: int 
     default_source: AnimeSources 
@@ -51,6 +63,25 @@ class UserSettings(BaseModel, validate_assignment=True):
     timeout_update: int 
     http_proxy: HttpUrl | None 
     max_episode_update_task_db_capacity: int 
+    max_torrent_cache_size: int = 268435456 
+    max_torrent_cache_age: int = 2592000 
+    torrent_cache_sweep_interval: int = 3600 
+    episode_update_task_archive_interval: int = 3600 
+    episode_update_task_archive_batch_size: int = 1000 
+    # Network Settings 
+    http_max_connections: int = 100 
+    http_max_connections_per_host: int = 4 
+    http_keepalive_timeout: int = 60 
+    http_dns_cache_ttl: int = 300 
+    fetch_max_in_flight_per_source: int = 2 
+    fetch_retry_times: int = 3 
+    fetch_retry_backoff: float = 1. 
+    fetch_circuit_breaker_threshold: int = 5 
+    fetch_circuit_breaker_cooldown: int = 600 
+    feed_single_flight_ttl: int = 30 
+    search_cache_max_size: int = 256 
+    search_cache_ttl: int = 300 
+    search_cache_stale_ttl: int = 3600 
 
 
     @field_serializer('jellyfin_addr', when_used='json')
@@ -68,6 +99,11 @@ class UserSettings(BaseModel, validate_assignment=True):
         return default_source.value 
     
     
+    @field_serializer('import_strategy', when_used='json') 
+    def import_strategy_serializer(self, import_strategy: ImportStrategies) -> str: 
+        return import_strategy.value 
+    
+
     @field_serializer('http_proxy', when_used='json') 
     def http_proxy_serializer(self, http_proxy: HttpUrl | None) -> str | None: 
         if http_proxy is None: 
@@ -123,6 +159,10 @@ user_settings = UserSettings(
     qbittorrent_username = 'admin', 
     qbittorrent_password = '', 
     refresh_time = 2, 
+    copy_worker_num = 2, 
+    update_add_worker_num = 2, 
+    update_queue_size = 16, 
+    import_strategy = ImportStrategies.auto.value, 
     auto_update_offline_interval = 7200, 
     auto_update_online_interval = 604800, 
     default_source = list(AnimeSources)[0].value, 
@@ -131,6 +171,24 @@ user_settings = UserSettings(
     timeout_update = 3600, 
     http_proxy = None, 
     max_episode_update_task_db_capacity = 500, 
+    max_torrent_cache_size = 268435456, 
+    max_torrent_cache_age = 2592000, 
+    torrent_cache_sweep_interval = 3600, 
+    episode_update_task_archive_interval = 3600, 
+    episode_update_task_archive_batch_size = 1000, 
+    http_max_connections = 100, 
+    http_max_connections_per_host = 4, 
+    http_keepalive_timeout = 60, 
+    http_dns_cache_ttl = 300, 
+    fetch_max_in_flight_per_source = 2, 
+    fetch_retry_times = 3, 
+    fetch_retry_backoff = 1., 
+    fetch_circuit_breaker_threshold = 5, 
+    fetch_circuit_breaker_cooldown = 600, 
+    feed_single_flight_ttl = 30, 
+    search_cache_max_size = 256, 
+    search_cache_ttl = 300, 
+    search_cache_stale_ttl = 3600, 
 ) 
 
 # user_settings_default = user_settings.model_copy() 
@@ -3,25 +3,27 @@ import requests
 from settings import user_settings, read_user_settings_file  
 from api_client import jellyfin_client as media_client 
 from api_client import qbittorrent_client as torrent_client 
+from utils.request import reopen_client_session 
 
 
 from acid.internal import (
     change_anime_db_clean_up, 
     change_episode_update_task_db_cleanup, 
-    delete_episode_update_task_db_out_of_capacity, 
 )
 
 
-def cleanup_database() -> None: 
-    change_anime_db_clean_up() 
-    delete_episode_update_task_db_out_of_capacity() 
-    change_episode_update_task_db_cleanup() 
+async def cleanup_database() -> None: 
+    await change_anime_db_clean_up() 
+    await change_episode_update_task_db_cleanup() 
 
 
-def load_and_test_settings() -> dict[str, str | list]: 
+async def load_and_test_settings() -> dict[str, str | list]: 
     response = read_user_settings_file(user_settings) 
     if response['code'] == 0: 
         return response 
+
+    # 连接池按新的配置创建 
+    await reopen_client_session() 
     
     # 测试 media_client 
     print('测试媒体客户端....', end='') 
@@ -36,8 +38,8 @@ def load_and_test_settings() -> dict[str, str | list]:
     # 测试 torrent_client 
     print('测试 Torrent 客户端....', end='') 
     try:
-        torrent_client.login() 
-        torrent_client.info(torrent_hashes=[]) 
+        await torrent_client.login() 
+        await torrent_client.info(torrent_hashes=[]) 
         print('ok.') 
     except:
         print('fails.')
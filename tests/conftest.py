@@ -0,0 +1,65 @@
+import os 
+import sys 
+import tempfile 
+from contextlib import contextmanager 
+
+import pytest 
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) 
+sys.path.insert(0, REPO_PATH) 
+
+# UserSettings 要求配置文件存在, 没有时创建一个空文件, 测试结束后删除
+SETTINGS_FILE_PATH = os.path.join(REPO_PATH, 'user_settings.yaml') 
+settings_file_created = not os.path.isfile(SETTINGS_FILE_PATH) 
+if settings_file_created: 
+    open(SETTINGS_FILE_PATH, mode='w').close() 
+
+from settings import user_settings 
+
+# 数据库在导入 database 时创建于 work_path, 测试使用临时目录, 不影响实际的数据库
+user_settings.work_path = tempfile.mkdtemp(prefix='autoanime-test-') 
+
+from sqlmodel import SQLModel 
+from sqlalchemy import event 
+
+from database import engine 
+from acid.cache import anime_inquire_cache, episode_inquire_cache 
+
+
+def pytest_unconfigure(config): 
+    if settings_file_created and os.path.isfile(SETTINGS_FILE_PATH): 
+        os.remove(SETTINGS_FILE_PATH) 
+
+
+@pytest.fixture(autouse=True) 
+def clean_database(): 
+    # AnimeDB 的删除触发器会同时清理全文索引
+    with engine.begin() as connection: 
+        for table in reversed(SQLModel.metadata.sorted_tables): 
+            connection.execute(table.delete()) 
+
+    anime_inquire_cache.bump() 
+    episode_inquire_cache.bump() 
+    yield 
+
+
+@contextmanager 
+def count_statements(): 
+    """
+    记录期间执行的 SQL 语句, executemany 只记录一次 
+    """
+    statement_list: list[str] = list() 
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany): 
+        statement_list.append(statement) 
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute) 
+    try: 
+        yield statement_list 
+    finally: 
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute) 
+
+
+@pytest.fixture 
+def statement_counter(): 
+    return count_statements 
@@ -0,0 +1,166 @@
+import asyncio 
+
+from aiohttp import web 
+
+from settings import user_settings 
+from utils.request import close_client_session 
+from api_client import ( 
+    TorrentClient, 
+    login_qbittorrent, add_qbittorrent, delete_qbittorrent, resume_qbittorrent, recheck_qbittorrent, 
+    info_qbittorrent, sync_qbittorrent, 
+) 
+
+
+class FakeQBittorrent: 
+    """
+    模拟 qBittorrent Web API 的测试服务器, 记录收到的请求 
+    """
+    def __init__(self, start_only: bool = False): 
+        # start_only 时模拟 qBittorrent 5.0, torrents/resume 返回 404
+        self.start_only = start_only 
+        self.username = user_settings.qbittorrent_username 
+        self.sid_num = 0 
+        self.sid_set: set[str] = set() 
+        self.login_num = 0 
+        self.request_list: list[tuple[str, list[str]]] = list() 
+        self.torrent_file_dict: dict[str, bytes] = dict() 
+        # 种子 id -> 状态, 混合种子的 id 与 v1 hash 不同, 其他字段 (infohash_v1, progress) 保存在 torrent_field_dict 
+        self.hash_state_dict: dict[str, str] = dict() 
+        self.torrent_field_dict: dict[str, dict[str, str | float]] = dict() 
+        # 请求中包含这些 hash 时, 延迟后使全部 SID 失效并返回 403, 每个 hash 只触发一次
+        self.forbidden_once_hash_set: set[str] = set() 
+
+        self.app = web.Application() 
+        self.app.router.add_post('/api/v2/auth/login', self.login) 
+        self.app.router.add_post('/api/v2/torrents/add', self.add) 
+        self.app.router.add_post('/api/v2/torrents/delete', self.delete) 
+        self.app.router.add_post('/api/v2/torrents/resume', self.resume) 
+        self.app.router.add_post('/api/v2/torrents/start', self.start) 
+        self.app.router.add_post('/api/v2/torrents/recheck', self.recheck) 
+        self.app.router.add_get('/api/v2/torrents/info', self.info) 
+        self.app.router.add_get('/api/v2/sync/maindata', self.sync) 
+
+    async def login(self, request: web.Request) -> web.Response: 
+        self.login_num += 1 
+        data = await request.post() 
+        if data.get('username') != self.username: 
+            return web.Response(text='Fails.') 
+
+        self.sid_num += 1 
+        sid = f'sid{self.sid_num}' 
+        self.sid_set.add(sid) 
+
+        response = web.Response(text='Ok.') 
+        response.set_cookie('SID', sid) 
+        return response 
+
+    async def _check(self, request: web.Request, api: str, item_list: list[str]) -> None: 
+        forbidden_hash_set = self.forbidden_once_hash_set.intersection(item_list) 
+        if forbidden_hash_set: 
+            self.forbidden_once_hash_set -= forbidden_hash_set 
+            # 等待同时发出的其他分块完成, 再模拟 SID 过期
+            await asyncio.sleep(0.1) 
+            self.sid_set.clear() 
+
+        if request.cookies.get('SID') not in self.sid_set: 
+            raise web.HTTPForbidden() 
+
+        self.request_list.append((api, item_list)) 
+
+    async def add(self, request: web.Request) -> web.Response: 
+        # 只有地址时为 urlencoded, 带有种子文件时为 multipart 
+        data = await request.post() 
+        url_list: list[str] = data['urls'].split('\n') if 'urls' in data else list() 
+        file_list: list[tuple[str, bytes]] = [ 
+            (file_field.filename, file_field.file.read()) for file_field in data.getall('torrents', []) 
+        ] 
+
+        await self._check(request, 'add', url_list + [file_name for file_name, _ in file_list]) 
+        for url in url_list: 
+            self.hash_state_dict[url.removeprefix('magnet:?xt=urn:btih:')] = 'downloading' 
+        for file_name, torrent in file_list: 
+            self.torrent_file_dict[file_name] = torrent 
+
+        return web.Response(text='Ok.') 
+
+    async def delete(self, request: web.Request) -> web.Response: 
+        hash_list = (await request.post())['hashes'].split('|') 
+        await self._check(request, 'delete', hash_list) 
+        for torrent_hash in hash_list: 
+            self.hash_state_dict.pop(torrent_hash, None) 
+
+        return web.Response() 
+
+    async def resume(self, request: web.Request) -> web.Response: 
+        if self.start_only: 
+            raise web.HTTPNotFound() 
+
+        return await self.start(request, 'resume') 
+
+    async def start(self, request: web.Request, api: str = 'start') -> web.Response: 
+        hash_list = (await request.post())['hashes'].split('|') 
+        await self._check(request, api, hash_list) 
+        for torrent_hash in hash_list: 
+            self.hash_state_dict[torrent_hash] = 'downloading' 
+
+        return web.Response() 
+
+    async def recheck(self, request: web.Request) -> web.Response: 
+        hash_list = (await request.post())['hashes'].split('|') 
+        await self._check(request, 'recheck', hash_list) 
+        for torrent_hash in hash_list: 
+            self.hash_state_dict[torrent_hash] = 'checkingUP' 
+
+        return web.Response() 
+
+    def _get_torrent_info(self, torrent_hash: str) -> dict[str, str | float]: 
+        return {'hash': torrent_hash, 'state': self.hash_state_dict[torrent_hash], **self.torrent_field_dict.get(torrent_hash, {})} 
+
+    async def info(self, request: web.Request) -> web.Response: 
+        hash_list = request.query['hashes'].split('|') if 'hashes' in request.query else list(self.hash_state_dict) 
+        await self._check(request, 'info', hash_list) 
+
+        # 与 qBittorrent 相同, 按种子 id 过滤 
+        return web.json_response([ 
+            self._get_torrent_info(torrent_hash) for torrent_hash in hash_list if torrent_hash in self.hash_state_dict 
+        ]) 
+
+    async def sync(self, request: web.Request) -> web.Response: 
+        rid = int(request.query['rid']) 
+        await self._check(request, 'sync', []) 
+
+        return web.json_response({ 
+            'rid': rid + 1, 
+            'full_update': rid == 0, 
+            'torrents': { 
+                torrent_hash: {key: value for key, value in self._get_torrent_info(torrent_hash).items() if key != 'hash'} 
+                for torrent_hash in self.hash_state_dict 
+            }, 
+        }) 
+
+
+def run_with_fake_qbittorrent(fake_qbittorrent: FakeQBittorrent, test_func) -> None: 
+    # 在临时端口上启动测试服务器, 使用新的 TorrentClient 运行 test_func
+    async def main(): 
+        runner = web.AppRunner(fake_qbittorrent.app) 
+        await runner.setup() 
+        site = web.TCPSite(runner, '127.0.0.1', 0) 
+        await site.start() 
+
+        qbittorrent_addr = user_settings.qbittorrent_addr 
+        user_settings.qbittorrent_addr = f'http://127.0.0.1:{runner.addresses[0][1]}/' 
+        try: 
+            await test_func(TorrentClient( 
+                login_qbittorrent, add_qbittorrent, delete_qbittorrent, 
+                resume_qbittorrent, recheck_qbittorrent, info_qbittorrent, sync_qbittorrent, 
+            )) 
+        finally: 
+            user_settings.qbittorrent_addr = qbittorrent_addr 
+            await close_client_session() 
+            await runner.cleanup() 
+
+    asyncio.run(main()) 
+
+
+def get_hash_list(num: int) -> list[str]: 
+    return [f'{i:040x}' for i in range(num)] 
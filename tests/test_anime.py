@@ -0,0 +1,38 @@
+import asyncio 
+
+from settings import AnimeSources 
+from database import FeedCacheDB 
+from utils import anime 
+from utils.singleflight import SingleFlight 
+
+
+def test_shared_request_stops_at_watermark(monkeypatch): 
+    pub_date_list = [3., 2., 1.] 
+    request_newest_pub_date_list: list[float] = list() 
+
+    async def request_episode_info_async(source, http_url, newest_pub_date, feed_cache): 
+        request_newest_pub_date_list.append(newest_pub_date) 
+        await asyncio.sleep(0.01) 
+        return [ 
+            ('title', 1, pub_date, 'magnet:?xt=urn:btih:' + '0' * 40) 
+            for pub_date in pub_date_list if pub_date >= newest_pub_date 
+        ], feed_cache 
+
+    monkeypatch.setattr(anime, '_request_episode_info_async', request_episode_info_async) 
+    monkeypatch.setattr(anime, 'feed_single_flight', SingleFlight()) 
+
+    async def main(): 
+        return await asyncio.gather(*( 
+            anime.request_episode_info_async( 
+                AnimeSources.dmhy, 'http://example.com/rss', newest_pub_date, 
+                FeedCacheDB(http_url='http://example.com/rss', etag=None, last_modified=None), 
+            ) for newest_pub_date in (2., 3., 0.) 
+        )) 
+
+    episode_info_list_list = asyncio.run(main()) 
+
+    # 共享的解析在发起者的截止时间停止, 截止时间更早的调用者单独请求 
+    assert request_newest_pub_date_list == [2., 0.] 
+    assert [ 
+        [episode_info[2] for episode_info in episode_info_list] for episode_info_list in episode_info_list_list 
+    ] == [[3., 2.], [3.], [3., 2., 1.]] 
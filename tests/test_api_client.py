@@ -0,0 +1,116 @@
+import asyncio 
+
+import pytest 
+
+from settings import user_settings 
+from api_client import TorrentClient, TorrentClientError, QBITTORRENT_CHUNK_SIZE 
+from fake_qbittorrent import FakeQBittorrent, run_with_fake_qbittorrent, get_hash_list 
+
+
+def test_login_failure(): 
+    fake_qbittorrent = FakeQBittorrent() 
+
+    async def test_func(torrent_client: TorrentClient): 
+        qbittorrent_username = user_settings.qbittorrent_username 
+        user_settings.qbittorrent_username = qbittorrent_username + '_wrong' 
+        try: 
+            with pytest.raises(TorrentClientError): 
+                await torrent_client.login() 
+        finally: 
+            user_settings.qbittorrent_username = qbittorrent_username 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+
+def test_add_is_chunked(tmp_path): 
+    fake_qbittorrent = FakeQBittorrent() 
+    hash_list = get_hash_list(QBITTORRENT_CHUNK_SIZE * 2 + 1) 
+    url_list = [f'magnet:?xt=urn:btih:{torrent_hash}' for torrent_hash in hash_list] 
+    file_list = list() 
+    for i in range(2): 
+        torrent_file_path = tmp_path / f'{i}.torrent' 
+        torrent_file_path.write_bytes(f'torrent{i}'.encode()) 
+        file_list.append(str(torrent_file_path)) 
+
+    async def test_func(torrent_client: TorrentClient): 
+        assert await torrent_client.add(torrent_urls=url_list, torrent_files=file_list) == 'Ok.' 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    assert fake_qbittorrent.login_num == 1 
+    assert [api for api, _ in fake_qbittorrent.request_list] == ['add'] * 4 
+    assert sorted(fake_qbittorrent.hash_state_dict) == hash_list 
+    assert fake_qbittorrent.torrent_file_dict == {'0.torrent': b'torrent0', '1.torrent': b'torrent1'} 
+
+
+def test_info_delete_and_sync(): 
+    fake_qbittorrent = FakeQBittorrent() 
+    hash_list = get_hash_list(QBITTORRENT_CHUNK_SIZE * 2 + 1) 
+    fake_qbittorrent.hash_state_dict = {torrent_hash: 'pausedDL' for torrent_hash in hash_list} 
+
+    async def test_func(torrent_client: TorrentClient): 
+        assert len(await torrent_client.info(torrent_hashes=[])) == len(hash_list) 
+        assert { 
+            torrent_info['hash'] for torrent_info in await torrent_client.info(torrent_hashes=hash_list[:-1]) 
+        } == set(hash_list[:-1]) 
+
+        maindata = await torrent_client.sync(rid=0) 
+        assert maindata['rid'] == 1 and maindata['full_update'] 
+        assert set(maindata['torrents']) == set(hash_list) 
+
+        await torrent_client.delete(torrent_hashes=hash_list[1:]) 
+        assert [torrent_info['hash'] for torrent_info in await torrent_client.info(torrent_hashes=[])] == hash_list[:1] 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    assert [api for api, _ in fake_qbittorrent.request_list].count('info') == 4 
+    assert [api for api, _ in fake_qbittorrent.request_list].count('delete') == 2 
+
+
+def test_forbidden_relogin_retries_only_failed_chunk(): 
+    fake_qbittorrent = FakeQBittorrent() 
+    hash_list = get_hash_list(QBITTORRENT_CHUNK_SIZE * 3) 
+    url_list = [f'magnet:?xt=urn:btih:{torrent_hash}' for torrent_hash in hash_list] 
+    fake_qbittorrent.forbidden_once_hash_set = {url_list[0]} 
+
+    async def test_func(torrent_client: TorrentClient): 
+        assert await torrent_client.add(torrent_urls=url_list) == 'Ok.' 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    # 其他分块在 SID 失效前已经成功, 只有失败的分块在重新登录后重发
+    assert fake_qbittorrent.login_num == 2 
+    add_item_list = [item for api, item_list in fake_qbittorrent.request_list if api == 'add' for item in item_list] 
+    assert sorted(add_item_list) == sorted(url_list) 
+
+
+def test_forbidden_concurrent_requests_login_once(): 
+    fake_qbittorrent = FakeQBittorrent() 
+    hash_list = get_hash_list(4) 
+    fake_qbittorrent.hash_state_dict = {torrent_hash: 'downloading' for torrent_hash in hash_list} 
+
+    async def test_func(torrent_client: TorrentClient): 
+        await torrent_client.login() 
+        fake_qbittorrent.sid_set.clear() 
+
+        info_list = await asyncio.gather(*(torrent_client.info(torrent_hashes=[torrent_hash]) for torrent_hash in hash_list)) 
+        assert [info[0]['hash'] for info in info_list] == hash_list 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    assert fake_qbittorrent.login_num == 2 
+
+
+@pytest.mark.parametrize('start_only', [False, True]) 
+def test_resume_falls_back_to_start(start_only): 
+    fake_qbittorrent = FakeQBittorrent(start_only=start_only) 
+    hash_list = get_hash_list(2) 
+    fake_qbittorrent.hash_state_dict = {torrent_hash: 'stoppedDL' for torrent_hash in hash_list} 
+
+    async def test_func(torrent_client: TorrentClient): 
+        await torrent_client.resume(torrent_hashes=hash_list) 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    assert fake_qbittorrent.request_list == [('start' if start_only else 'resume', hash_list)] 
+    assert set(fake_qbittorrent.hash_state_dict.values()) == {'downloading'} 
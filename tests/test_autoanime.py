@@ -0,0 +1,96 @@
+import time 
+import asyncio 
+
+import httpx 
+from fastapi.testclient import TestClient 
+from sqlmodel import Session 
+
+from database import run_in_db_executor, engine, AnimeDB, EpisodeUpdateTaskDB 
+from acid.internal import change_episode_update_task_db_update_result 
+from autoanime import app, is_config_loaded_and_checked 
+
+
+WRITE_LOCK_SECONDS = 1. 
+# 写事务持有锁时, 查询仍应在这个时间内返回
+INQUIRE_LATENCY_MAX = .2 
+
+
+@run_in_db_executor 
+def _hold_write_transaction(seconds: float) -> None: 
+    # 模拟更新任务中的大事务: 写入大量任务后长时间持有写锁
+    with Session(engine) as session: 
+        session.connection().execute(EpisodeUpdateTaskDB.__table__.insert(), [ 
+            { 
+                'torrent_hash': f'hash{i}', 'torrent_file_path': '', 'torrent_magnet': '', 'uuid': f'uuid{i}', 
+                'name': '', 'season': 1, 'episode_num': i, 'file_path': '', 'pub_date': 0., 
+                'under_management': True, 'done': False, 'success': False, 
+            } 
+            for i in range(20000) 
+        ]) 
+        time.sleep(seconds) 
+        session.commit() 
+
+
+async def _heavy_update_cycle() -> None: 
+    # 第二个写入需要等待第一个写入释放锁
+    hold_task = asyncio.create_task(_hold_write_transaction(WRITE_LOCK_SECONDS)) 
+    await asyncio.sleep(.05) 
+    await asyncio.gather(hold_task, change_episode_update_task_db_update_result(set(range(1, 1000)), set())) 
+
+
+def test_inquire_anime_stays_responsive_during_update_cycle(): 
+    with Session(engine) as session: 
+        session.add_all( 
+            AnimeDB( 
+                uuid=f'uuid{i}', name=f'anime{i}', season=1, dir_path='', source='dmhy', search_text=None, 
+                http_url='', newest_pub_date=0., auto_update=True, under_management=False, 
+            ) 
+            for i in range(1000) 
+        ) 
+        session.commit() 
+
+    async def main() -> list[float]: 
+        latency_list: list[float] = list() 
+        transport = httpx.ASGITransport(app=app) 
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client: 
+            # 预热: 第一次请求需要建立连接与构建校验器 
+            await client.post('/inquire/anime', json={'uuid': None, 'name': 'warm up'}) 
+
+            update_task = asyncio.create_task(_heavy_update_cycle()) 
+            await asyncio.sleep(.1) 
+
+            while not update_task.done(): 
+                # 每次查询不同的名字, 不命中查询缓存
+                start = time.perf_counter() 
+                response = await client.post('/inquire/anime', json={'uuid': None, 'name': f'anime{len(latency_list)}'}) 
+                latency_list.append(time.perf_counter() - start) 
+
+                assert response.status_code == 200 
+                assert response.json()['code'] == 1 
+                await asyncio.sleep(.02) 
+
+            await update_task 
+
+        return latency_list 
+
+    app.dependency_overrides[is_config_loaded_and_checked] = lambda: None 
+    try: 
+        latency_list = asyncio.run(main()) 
+    finally: 
+        app.dependency_overrides.clear() 
+
+    # 写锁持有期间完成了多次查询, 且每次都没有等待写锁
+    assert len(latency_list) >= 10 
+    assert max(latency_list) < INQUIRE_LATENCY_MAX 
+
+
+def test_lifespan_can_run_again(): 
+    # 第一次运行结束时关闭的数据库线程池与调度器, 在第二次运行时重新创建 
+    app.dependency_overrides[is_config_loaded_and_checked] = lambda: None 
+    try: 
+        for _ in range(2): 
+            with TestClient(app) as client: 
+                response = client.post('/inquire/anime', json={'uuid': None, 'name': None}) 
+                assert response.status_code == 200 
+    finally: 
+        app.dependency_overrides.clear() 
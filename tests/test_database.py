@@ -0,0 +1,112 @@
+import asyncio 
+
+import pytest 
+from sqlmodel import Session, SQLModel, create_engine 
+from sqlalchemy import text, update, delete 
+
+import database 
+from database import engine, AnimeDB, ANIME_FTS_TABLE_NAME 
+from model import AnimeInquire 
+from acid.external import inquire_anime 
+
+
+pytestmark = pytest.mark.skipif(not database.anime_fts_available, reason='SQLite does not support FTS5 trigram') 
+
+
+def _add_anime_db(uuid: str, name: str, search_text: str | None = None) -> None: 
+    with Session(engine) as session: 
+        session.add(AnimeDB( 
+            uuid=uuid, name=name, season=1, dir_path='', source='dmhy', search_text=search_text, 
+            http_url='', newest_pub_date=0., auto_update=True, under_management=False, 
+        )) 
+        session.commit() 
+
+
+def _inquire_anime_uuid_list(name: str) -> list[str]: 
+    response = asyncio.run(inquire_anime(AnimeInquire(uuid=None, name=name, fields=['uuid']))) 
+    return [anime['uuid'] for anime in response['detail']] 
+
+
+def _check_anime_fts_integrity(connection) -> None: 
+    # 外部内容表的 integrity-check 会与 AnimeDB 的内容比较, 不一致时抛出异常
+    connection.execute(text(f"INSERT INTO {ANIME_FTS_TABLE_NAME}({ANIME_FTS_TABLE_NAME}, rank) VALUES ('integrity-check', 1)")) 
+
+
+def test_anime_fts_follows_insert_update_delete(): 
+    _add_anime_db('a', 'Frieren', 'sousou no frieren') 
+    _add_anime_db('b', 'Dungeon Meshi') 
+    assert _inquire_anime_uuid_list('sousou') == ['a'] 
+
+    with Session(engine) as session: 
+        session.exec(update(AnimeDB).where(AnimeDB.uuid == 'a').values(search_text='beyond journey')) 
+        session.commit() 
+    assert _inquire_anime_uuid_list('sousou') == [] 
+    assert _inquire_anime_uuid_list('journey') == ['a'] 
+
+    with Session(engine) as session: 
+        session.exec(delete(AnimeDB).where(AnimeDB.uuid == 'b')) 
+        session.commit() 
+    assert _inquire_anime_uuid_list('Dungeon') == [] 
+
+    with engine.begin() as connection: 
+        _check_anime_fts_integrity(connection) 
+
+
+def test_anime_fts_trigger_deletes_by_rowid(): 
+    with engine.connect() as connection: 
+        trigger_sql_list = connection.execute( 
+            text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'animedb_fts_%'") 
+        ).scalars().all() 
+
+    assert len(trigger_sql_list) == 3 
+    assert all('uuid = old.uuid' not in trigger_sql for trigger_sql in trigger_sql_list) 
+
+
+def test_check_anime_fts_rebuilds_after_rowid_change(): 
+    with Session(engine) as session: 
+        session.add_all([ 
+            AnimeDB( 
+                uuid=uuid, name=name, season=1, dir_path='', source='dmhy', search_text=None, 
+                http_url='', newest_pub_date=0., auto_update=True, under_management=False, 
+            ) 
+            for uuid, name in [('a', 'Frieren'), ('b', 'Dungeon Meshi')] 
+        ]) 
+        session.commit() 
+
+    # 模拟 VACUUM 改变 rowid, 触发器不会更新索引 
+    with engine.begin() as connection: 
+        connection.exec_driver_sql('UPDATE animedb SET rowid = rowid + 100') 
+
+    with engine.begin() as connection: 
+        database._check_anime_fts(connection) 
+        _check_anime_fts_integrity(connection) 
+        assert connection.execute( 
+            text(f"SELECT uuid FROM {ANIME_FTS_TABLE_NAME} WHERE {ANIME_FTS_TABLE_NAME} MATCH 'rie'") 
+        ).scalars().all() == ['a'] 
+
+
+def test_migration_anime_fts_external_content(tmp_path): 
+    old_engine = create_engine(f'sqlite:///{tmp_path}/old.db') 
+    SQLModel.metadata.create_all(old_engine) 
+
+    # 旧版本的全文索引: 自带内容, 触发器按 uuid 删除
+    with old_engine.begin() as connection: 
+        for trigger_name in ('animedb_fts_insert', 'animedb_fts_delete', 'animedb_fts_update'): 
+            connection.exec_driver_sql(f'DROP TRIGGER {trigger_name}') 
+        connection.exec_driver_sql(f'DROP TABLE {ANIME_FTS_TABLE_NAME}') 
+        connection.exec_driver_sql( 
+            f"CREATE VIRTUAL TABLE {ANIME_FTS_TABLE_NAME} USING fts5(uuid UNINDEXED, name, search_text, tokenize='trigram')" 
+        ) 
+        connection.exec_driver_sql( 
+            "INSERT INTO animedb(uuid, name, season, dir_path, source, search_text, http_url, episodes_str, " 
+            "newest_pub_date, auto_update, under_management) VALUES ('a', 'Frieren', 1, '', 'dmhy', NULL, '', '', 0, 1, 0)" 
+        ) 
+
+    with old_engine.begin() as connection: 
+        database._migration_anime_fts_external_content(connection) 
+        _check_anime_fts_integrity(connection) 
+        assert connection.execute( 
+            text(f"SELECT uuid FROM {ANIME_FTS_TABLE_NAME} WHERE {ANIME_FTS_TABLE_NAME} MATCH 'rie'") 
+        ).scalars().all() == ['a'] 
+
+    old_engine.dispose() 
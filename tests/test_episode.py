@@ -0,0 +1,36 @@
+import os 
+
+import pytest 
+
+from utils import episode 
+
+
+@pytest.fixture 
+def torrent_dir_path(): 
+    torrent_dir_path = episode.get_torrent_dir_path() 
+    yield torrent_dir_path 
+    for file_name in os.listdir(torrent_dir_path): 
+        os.remove(os.path.join(torrent_dir_path, file_name)) 
+
+
+def test_save_torrent_file_leaves_no_temp_file(torrent_dir_path): 
+    torrent_file_path = episode.save_torrent_file('hash', b'torrent') 
+
+    with open(torrent_file_path, mode='rb') as f: 
+        assert f.read() == b'torrent' 
+    assert os.listdir(torrent_dir_path) == ['hash.torrent'] 
+
+
+def test_save_torrent_file_interrupted_write_leaves_nothing(torrent_dir_path, monkeypatch): 
+    # 替换之前中断时, 不会留下不完整的种子文件, 之后可以重新写入
+    def replace(src, dst): 
+        raise OSError('interrupted') 
+
+    monkeypatch.setattr(episode.os, 'replace', replace) 
+    with pytest.raises(OSError): 
+        episode.save_torrent_file('hash', b'torrent') 
+    assert os.listdir(torrent_dir_path) == [] 
+
+    monkeypatch.undo() 
+    episode.save_torrent_file('hash', b'torrent') 
+    assert os.listdir(torrent_dir_path) == ['hash.torrent'] 
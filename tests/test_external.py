@@ -0,0 +1,83 @@
+import sys 
+import asyncio 
+from contextlib import contextmanager 
+
+import pytest 
+from sqlmodel import Session, select 
+from sqlalchemy import event 
+
+from database import engine, AnimeDB 
+from model import AnimeChange, AnimeDelete 
+from acid.external import change_anime_batch, delete_anime_batch 
+
+
+def _add_anime_db_list(num: int, under_management: bool = False) -> list[str]: 
+    uuid_list = [f'uuid{i}' for i in range(num)] 
+    with Session(engine) as session: 
+        session.add_all( 
+            AnimeDB( 
+                uuid=uuid, name=uuid, season=1, dir_path='', source='dmhy', search_text=uuid, 
+                http_url='', newest_pub_date=0., auto_update=False, under_management=under_management, 
+            ) 
+            for uuid in uuid_list 
+        ) 
+        session.commit() 
+
+    return uuid_list 
+
+
+@contextmanager 
+def _lock_before_write(statement_prefix: str, uuid: str): 
+    """
+    在写入番剧的语句执行前将番剧标记为 under_management, 模拟读取后被更新任务锁定 
+    """
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany): 
+        if statement.startswith(statement_prefix): 
+            cursor.connection.execute('UPDATE animedb SET under_management = 1 WHERE uuid = ?', (uuid,)) 
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute) 
+    try: 
+        yield 
+    finally: 
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute) 
+
+
+def _inquire_anime_db_dict() -> dict[str, AnimeDB]: 
+    with Session(engine) as session: 
+        return {anime_db.uuid: anime_db for anime_db in session.exec(select(AnimeDB)).all()} 
+
+
+# 3.12 之前的 Enum 不支持用字符串判断成员, 修改番剧的校验依赖这一点
+@pytest.mark.skipif(sys.version_info < (3, 12), reason='requires python 3.12') 
+def test_change_anime_batch_skips_anime_locked_after_read(): 
+    uuid_list = _add_anime_db_list(2) 
+
+    with _lock_before_write('UPDATE animedb SET source', uuid_list[0]): 
+        response = asyncio.run(change_anime_batch([AnimeChange(uuid=uuid, auto_update=True) for uuid in uuid_list])) 
+
+    assert response['code'] == 0 
+    assert [response_['code'] for response_ in response['detail']] == [0, 1] 
+    anime_db_dict = _inquire_anime_db_dict() 
+    assert not anime_db_dict[uuid_list[0]].auto_update 
+    assert anime_db_dict[uuid_list[1]].auto_update 
+
+
+def test_change_anime_batch_refuses_managed_anime(): 
+    uuid_list = _add_anime_db_list(1, under_management=True) 
+
+    response = asyncio.run(change_anime_batch([AnimeChange(uuid=uuid_list[0], auto_update=True)])) 
+
+    assert response['detail'] == [{'code': 0, 'msg': 'Anime is under management', 'detail': []}] 
+    assert not _inquire_anime_db_dict()[uuid_list[0]].auto_update 
+
+
+def test_delete_anime_batch_reports_rows_actually_deleted(): 
+    uuid_list = _add_anime_db_list(3) 
+
+    with _lock_before_write('DELETE FROM animedb', uuid_list[0]): 
+        response = asyncio.run(delete_anime_batch([AnimeDelete(uuid=uuid) for uuid in uuid_list])) 
+
+    assert response['code'] == 0 
+    assert response['detail'][0] == {'code': 0, 'msg': 'Anime is under management', 'detail': []} 
+    assert [response_['code'] for response_ in response['detail'][1:]] == [1, 1] 
+    assert list(_inquire_anime_db_dict()) == [uuid_list[0]] 
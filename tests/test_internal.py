@@ -0,0 +1,171 @@
+import os 
+import time 
+import asyncio 
+
+import pytest 
+from sqlmodel import Session, select 
+
+from database import engine, AnimeDB, EpisodeUpdateTaskDB, EpisodeUpdateTaskArchiveDB, FeedCacheDB 
+from settings import user_settings 
+from acid.internal import ( 
+    change_anime_db_clean_up, 
+    change_anime_db_unlock, 
+    change_feed_cache, 
+    change_episode_update_task_db_cleanup, 
+    change_episode_update_task_db_update_result, 
+    delete_torrent_cache_out_of_capacity, 
+    change_episode_update_task_db_archive, 
+    TORRENT_FILE_SWEEP_GRACE_PERIOD, 
+) 
+from utils.episode import get_torrent_dir_path, save_torrent_file 
+
+
+def _add_anime_db_list(num: int, under_management: bool = True) -> list[str]: 
+    uuid_list = [f'uuid{i}' for i in range(num)] 
+    with Session(engine) as session: 
+        session.add_all( 
+            AnimeDB( 
+                uuid=uuid, name=uuid, season=1, dir_path='', source='dmhy', search_text=None, 
+                http_url='', newest_pub_date=0., auto_update=True, under_management=under_management, 
+            ) 
+            for uuid in uuid_list 
+        ) 
+        session.commit() 
+
+    return uuid_list 
+
+
+def _add_episode_update_task_db_list(num: int, under_management: bool = True, done: bool = False) -> list[int]: 
+    with Session(engine) as session: 
+        session.add_all( 
+            EpisodeUpdateTaskDB( 
+                torrent_hash=f'hash{i}', torrent_file_path='', torrent_magnet='', uuid=f'uuid{i}', name='', 
+                season=1, episode_num=i, file_path='', pub_date=0., under_management=under_management, 
+                done=done, success=False, 
+            ) 
+            for i in range(num) 
+        ) 
+        session.commit() 
+
+        return list(session.exec(select(EpisodeUpdateTaskDB.id_)).all()) 
+
+
+@pytest.mark.parametrize('num', [10, 1000]) 
+def test_change_anime_db_clean_up_is_one_statement(num, statement_counter): 
+    _add_anime_db_list(num) 
+
+    with statement_counter() as statement_list: 
+        asyncio.run(change_anime_db_clean_up()) 
+
+    assert len(statement_list) == 1 
+    with Session(engine) as session: 
+        assert session.exec(select(AnimeDB).where(AnimeDB.under_management == True)).first() is None 
+
+
+@pytest.mark.parametrize('num', [10, 1000]) 
+def test_change_anime_db_unlock_is_one_statement(num, statement_counter): 
+    uuid_list = _add_anime_db_list(num) 
+
+    with statement_counter() as statement_list: 
+        asyncio.run(change_anime_db_unlock(set(uuid_list[:num // 2]))) 
+
+    assert len(statement_list) == 1 
+    with Session(engine) as session: 
+        locked_uuid_set = set(session.exec(select(AnimeDB.uuid).where(AnimeDB.under_management == True)).all()) 
+    assert locked_uuid_set == set(uuid_list[num // 2:]) 
+
+
+def test_change_anime_db_unlock_empty_runs_nothing(statement_counter): 
+    with statement_counter() as statement_list: 
+        asyncio.run(change_anime_db_unlock(set())) 
+
+    assert len(statement_list) == 0 
+
+
+@pytest.mark.parametrize('num', [10, 1000]) 
+def test_change_episode_update_task_db_cleanup_is_one_statement(num, statement_counter): 
+    _add_episode_update_task_db_list(num) 
+
+    with statement_counter() as statement_list: 
+        asyncio.run(change_episode_update_task_db_cleanup()) 
+
+    assert len(statement_list) == 1 
+    with Session(engine) as session: 
+        assert session.exec(select(EpisodeUpdateTaskDB).where(EpisodeUpdateTaskDB.done == False)).first() is None 
+
+
+@pytest.mark.parametrize('num', [10, 1000]) 
+def test_change_episode_update_task_db_update_result_is_one_statement_per_outcome(num, statement_counter): 
+    id_list = _add_episode_update_task_db_list(num) 
+    id_set_success, id_set_fail = set(id_list[:num // 2]), set(id_list[num // 2:]) 
+
+    with statement_counter() as statement_list: 
+        asyncio.run(change_episode_update_task_db_update_result(id_set_success, id_set_fail)) 
+
+    assert len(statement_list) == 2 
+    with Session(engine) as session: 
+        episode_update_task_db_list = session.exec(select(EpisodeUpdateTaskDB)).all() 
+    assert all(task.done and not task.under_management for task in episode_update_task_db_list) 
+    assert {task.id_ for task in episode_update_task_db_list if task.success} == id_set_success 
+
+
+def test_delete_torrent_cache_out_of_capacity_keeps_fresh_orphan_file(): 
+    # 刚写入的种子文件还没有缓存记录与任务, 不能被当作孤立文件删除 
+    fresh_file_path = save_torrent_file('fresh', b'torrent') 
+    stale_file_path = save_torrent_file('stale', b'torrent') 
+    stale_mtime = time.time() - TORRENT_FILE_SWEEP_GRACE_PERIOD - 1 
+    os.utime(stale_file_path, (stale_mtime, stale_mtime)) 
+
+    try: 
+        asyncio.run(delete_torrent_cache_out_of_capacity()) 
+
+        assert os.path.isfile(fresh_file_path) 
+        assert not os.path.isfile(stale_file_path) 
+    finally: 
+        for file_name in os.listdir(get_torrent_dir_path()): 
+            os.remove(os.path.join(get_torrent_dir_path(), file_name)) 
+
+
+def test_change_episode_update_task_db_archive_keeps_newest_task_id(monkeypatch): 
+    # 容量为 0 时 id 最大的任务仍然保留, 之后的新任务不会重用已归档的 id 
+    monkeypatch.setattr(user_settings, 'max_episode_update_task_db_capacity', 0) 
+    id_list = _add_episode_update_task_db_list(3, under_management=False, done=True) 
+
+    asyncio.run(change_episode_update_task_db_archive()) 
+
+    with Session(engine) as session: 
+        assert session.exec(select(EpisodeUpdateTaskArchiveDB.id_)).all() == id_list[:-1] 
+        assert session.exec(select(EpisodeUpdateTaskDB.id_)).all() == id_list[-1:] 
+
+    assert max(_add_episode_update_task_db_list(1)) == id_list[-1] + 1 
+
+
+def test_change_episode_update_task_db_archive_keeps_conflicting_task(monkeypatch): 
+    # 归档中已有相同 id 的任务时, 任务表中的任务不会被删除 
+    monkeypatch.setattr(user_settings, 'max_episode_update_task_db_capacity', 0) 
+    id_list = _add_episode_update_task_db_list(3, under_management=False, done=True) 
+    with Session(engine) as session: 
+        session.add(EpisodeUpdateTaskArchiveDB( 
+            id_=id_list[0], torrent_hash='old', uuid='old', name='', season=1, episode_num=0, pub_date=0., success=True, 
+        )) 
+        session.commit() 
+
+    asyncio.run(change_episode_update_task_db_archive()) 
+
+    with Session(engine) as session: 
+        assert session.get(EpisodeUpdateTaskArchiveDB, id_list[0]).uuid == 'old' 
+        assert session.get(EpisodeUpdateTaskArchiveDB, id_list[1]).uuid == 'uuid1' 
+        assert session.exec(select(EpisodeUpdateTaskDB.id_)).all() == [id_list[0], id_list[2]] 
+
+
+def test_change_feed_cache_requires_every_anime_of_url(): 
+    # 同一地址的番剧没有全部参与本次更新时不保存校验值, 否则没参与的番剧下次会收到 304 
+    uuid_list = _add_anime_db_list(2) 
+
+    asyncio.run(change_feed_cache([FeedCacheDB(http_url='', etag='etag', last_modified=None)], set(uuid_list[:1]))) 
+    with Session(engine) as session: 
+        assert session.get(FeedCacheDB, '') is None 
+
+    asyncio.run(change_feed_cache([FeedCacheDB(http_url='', etag='etag', last_modified=None)], set(uuid_list))) 
+    with Session(engine) as session: 
+        assert session.get(FeedCacheDB, '').etag == 'etag' 
@@ -0,0 +1,22 @@
+import asyncio 
+
+from settings import user_settings 
+from utils import request 
+
+
+def test_reopen_client_session_applies_reloaded_settings(monkeypatch): 
+    async def main(): 
+        session = await request.open_client_session() 
+        try: 
+            # 配置没有变化时继续使用原来的会话
+            assert await request.reopen_client_session() is session 
+
+            monkeypatch.setattr(user_settings, 'http_max_connections', user_settings.http_max_connections + 1) 
+            reopened_session = await request.reopen_client_session() 
+
+            assert reopened_session is not session and session.closed 
+            assert reopened_session.connector.limit == user_settings.http_max_connections 
+        finally: 
+            await request.close_client_session() 
+
+    asyncio.run(main()) 
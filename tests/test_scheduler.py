@@ -0,0 +1,15 @@
+from settings import AnimeSources, user_settings 
+from utils.scheduler import FetchScheduler 
+
+
+def test_semaphore_follows_reloaded_settings(monkeypatch): 
+    fetch_scheduler = FetchScheduler() 
+    semaphore = fetch_scheduler._get_semaphore(AnimeSources.dmhy) 
+    assert fetch_scheduler._get_semaphore(AnimeSources.dmhy) is semaphore 
+
+    max_in_flight = user_settings.fetch_max_in_flight_per_source + 1 
+    monkeypatch.setattr(user_settings, 'fetch_max_in_flight_per_source', max_in_flight) 
+    resized_semaphore = fetch_scheduler._get_semaphore(AnimeSources.dmhy) 
+
+    assert resized_semaphore is not semaphore 
+    assert resized_semaphore._value == max_in_flight 
@@ -0,0 +1,59 @@
+import asyncio 
+
+import search 
+from settings import AnimeSources 
+from utils.ttlcache import TTLCache 
+
+
+def test_cancel_refresh_tasks_cancels_stale_refresh(): 
+    refresh_started = asyncio.Event() 
+    refresh_cancelled = asyncio.Event() 
+
+    async def fetch(value: int) -> int: 
+        if value == 0: 
+            return value 
+
+        refresh_started.set() 
+        try: 
+            await asyncio.sleep(60) 
+        except asyncio.CancelledError: 
+            refresh_cancelled.set() 
+            raise 
+
+        return value 
+
+    async def main(): 
+        cache = TTLCache() 
+        await cache.get_or_fetch('key', 0, 60, 1, fetch, 0) 
+
+        # 过期但未超过 stale_ttl 时返回旧值, 同时在后台重新请求
+        assert await cache.get_or_fetch('key', 0, 60, 1, fetch, 1) == 0 
+        await refresh_started.wait() 
+        assert cache.stats()['refreshing'] == 1 
+
+        await cache.cancel_refresh_tasks() 
+
+        assert refresh_cancelled.is_set() 
+        assert cache.stats()['refreshing'] == 0 
+        assert await cache.get_or_fetch('key', 60, 60, 1, fetch, 0) == 0 
+
+    asyncio.run(main()) 
+
+
+def test_search_cache_returns_immutable_result(monkeypatch): 
+    async def request_episode_info_async(source, http_url): 
+        return [('title', 1, 0., 'magnet:?xt=urn:btih:' + '0' * 40)] 
+
+    monkeypatch.setattr(search, 'request_episode_info_async', request_episode_info_async) 
+    monkeypatch.setattr(search, 'search_cache', TTLCache()) 
+
+    async def main(): 
+        first = await search._request_episode_info_cached_async(AnimeSources.dmhy, 'http://example.com/rss') 
+        second = await search._request_episode_info_cached_async(AnimeSources.dmhy, 'http://example.com/rss') 
+        return first, second 
+
+    first, second = asyncio.run(main()) 
+
+    assert first is second 
+    assert isinstance(first, tuple) 
+    assert search.search_cache.stats()['hits'] == 1 
@@ -0,0 +1,125 @@
+import asyncio 
+
+import update 
+from model import EpisodeUpdate 
+from settings import user_settings 
+from database import EpisodeUpdateTaskDB 
+from api_client import TorrentClient, TorrentStatePoller 
+from fake_qbittorrent import FakeQBittorrent, run_with_fake_qbittorrent, get_hash_list 
+
+
+def test_reconcile_torrent_matches_v1_hash_and_rechecks_errored(monkeypatch): 
+    fake_qbittorrent = FakeQBittorrent() 
+    hash_list = get_hash_list(6) 
+    # 混合种子在 qBittorrent 中的 id 为截断的 v2 hash, 与 v1 hash 不同
+    hybrid_id_dict = {hash_list[1]: 'a' * 40, hash_list[3]: 'b' * 40} 
+    for torrent_hash, state, progress in [ 
+        (hash_list[0], 'stalledUP', 1.), (hash_list[1], 'pausedUP', 1.), (hash_list[2], 'missingFiles', 1.), 
+        (hash_list[3], 'error', 1.), (hash_list[4], 'pausedDL', .5), 
+    ]: 
+        torrent_id = hybrid_id_dict.get(torrent_hash, torrent_hash) 
+        fake_qbittorrent.hash_state_dict[torrent_id] = state 
+        fake_qbittorrent.torrent_field_dict[torrent_id] = {'infohash_v1': torrent_hash, 'progress': progress} 
+
+    hash_torrent_url_dict = {torrent_hash: f'magnet:?xt=urn:btih:{torrent_hash}' for torrent_hash in hash_list} 
+
+    async def test_func(torrent_client: TorrentClient): 
+        monkeypatch.setattr(update, 'torrent_client', torrent_client) 
+        monkeypatch.setattr(update, 'torrent_state_poller', TorrentStatePoller(torrent_client)) 
+
+        success, completed_hash_set = await update._reconcile_torrent(hash_torrent_url_dict, dict()) 
+
+        assert success 
+        assert completed_hash_set == {hash_list[0], hash_list[1]} 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    api_item_set_dict = dict() 
+    for api, item_list in fake_qbittorrent.request_list: 
+        api_item_set_dict.setdefault(api, set()).update(item_list) 
+
+    # 已存在的混合种子不会被重复添加, 恢复与校验使用种子 id
+    assert api_item_set_dict['add'] == {hash_torrent_url_dict[hash_list[5]]} 
+    assert api_item_set_dict['resume'] == {hash_list[4]} 
+    assert api_item_set_dict['recheck'] == {hash_list[2], hybrid_id_dict[hash_list[3]]} 
+    assert fake_qbittorrent.hash_state_dict[hybrid_id_dict[hash_list[3]]] == 'checkingUP' 
+
+
+def test_is_torrent_completed(): 
+    assert update._is_torrent_completed({'progress': 1., 'state': 'stalledUP'}) 
+    assert not update._is_torrent_completed({'progress': .5, 'state': 'downloading'}) 
+    assert not update._is_torrent_completed({'progress': 1., 'state': 'missingFiles'}) 
+    assert not update._is_torrent_completed({'progress': 1., 'state': 'checkingUP'}) 
+
+
+def test_update_run_task_shares_one_download_manager(monkeypatch): 
+    fake_qbittorrent = FakeQBittorrent() 
+    hash_list = get_hash_list(3) 
+    for torrent_hash in hash_list: 
+        fake_qbittorrent.torrent_field_dict[torrent_hash] = {'progress': 1.} 
+
+    # 每次写入通知认领一个任务 
+    episode_update_task_db_list_list = [ 
+        [EpisodeUpdateTaskDB( 
+            id_=i, torrent_hash=torrent_hash, torrent_file_path='', torrent_magnet=f'magnet:?xt=urn:btih:{torrent_hash}', 
+            uuid=f'uuid{i}', name='', season=1, episode_num=1, file_path='', pub_date=0., 
+            under_management=True, done=False, success=False, 
+        )] for i, torrent_hash in enumerate(hash_list) 
+    ] 
+    manager_num = 0 
+    copy_worker_num = 0 
+    result_list = list() 
+
+    async def inquire_episode_update_ready(): 
+        return episode_update_task_db_list_list.pop(0) if episode_update_task_db_list_list else list() 
+
+    update_download_manager = update._update_download_manager 
+
+    async def _update_download_manager(*args): 
+        nonlocal manager_num 
+        manager_num += 1 
+        await update_download_manager(*args) 
+
+    async def _update_copy_worker(copy_queue: asyncio.Queue[EpisodeUpdate | None]): 
+        nonlocal copy_worker_num 
+        copy_worker_num += 1 
+        while (episode_update := await copy_queue.get()) is not None: 
+            episode_update.copied = True 
+
+    async def change_episode_update_task_db_update_result(id_set_success, id_set_fail): 
+        result_list.append((id_set_success, id_set_fail)) 
+
+    async def change_anime_db_update_result(*args): 
+        pass 
+
+    async def delete_feed_cache(uuid_set): 
+        pass 
+
+    monkeypatch.setattr(update, 'inquire_episode_update_ready', inquire_episode_update_ready) 
+    monkeypatch.setattr(update, '_update_download_manager', _update_download_manager) 
+    monkeypatch.setattr(update, '_update_copy_worker', _update_copy_worker) 
+    monkeypatch.setattr(update, 'change_episode_update_task_db_update_result', change_episode_update_task_db_update_result) 
+    monkeypatch.setattr(update, 'change_anime_db_update_result', change_anime_db_update_result) 
+    monkeypatch.setattr(update, 'delete_feed_cache', delete_feed_cache) 
+    monkeypatch.setattr(update.media_client, 'refresh', lambda: None) 
+    monkeypatch.setattr(user_settings, 'refresh_time', 0) 
+
+    async def test_func(torrent_client: TorrentClient): 
+        monkeypatch.setattr(update, 'torrent_client', torrent_client) 
+        monkeypatch.setattr(update, 'torrent_state_poller', TorrentStatePoller(torrent_client)) 
+
+        task_committed_queue: asyncio.Queue[bool | None] = asyncio.Queue() 
+        run_task = asyncio.create_task(update.update_run_task(task_committed_queue)) 
+        for _ in hash_list: 
+            task_committed_queue.put_nowait(True) 
+            await asyncio.sleep(0.05) 
+        task_committed_queue.put_nowait(None) 
+        await run_task 
+
+    run_with_fake_qbittorrent(fake_qbittorrent, test_func) 
+
+    # 多次认领共用一个下载管理和一组复制任务, 结果在周期结束时一次写入 
+    assert manager_num == 1 
+    assert copy_worker_num == user_settings.copy_worker_num 
+    assert result_list == [({0, 1, 2}, set())] 
+    assert [api for api, _ in fake_qbittorrent.request_list].count('add') == len(hash_list) 
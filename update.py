@@ -2,29 +2,36 @@ import os
 import asyncio 
 from collections import defaultdict 
 
-from aioshutil import copy 
-
-from settings import user_settings 
+from settings import AnimeSources, user_settings 
 from model import AnimeUpdate, EpisodeAdd, EpisodeUpdate  
-from database import AnimeDB  
+from database import AnimeDB, AnimeEpisodeDB, FeedCacheDB  
 from utils import anime 
-from utils.request import request_xml_async  
+from utils.file import import_file_async 
 from acid.internal import (
     add_episode_add_list, inquire_anime_update_ready, 
     inquire_episode_update_ready, change_anime_db_unlock, 
     change_anime_db_update_result, change_episode_update_task_db_update_result, 
+    inquire_feed_cache, change_feed_cache, delete_feed_cache, inquire_anime_episode_exist, 
 ) 
 from api_client import (
     qbittorrent_client as torrent_client, 
-    jellyfin_client as media_client 
+    jellyfin_client as media_client, 
+    torrent_state_poller, 
+    get_torrent_info_hash, 
 )  
 
 
 id_download_progress_dict: dict[int, float] = dict() 
 id_copy_progress_dict: dict[int, float] = dict() 
+# 添加任务时种子解析失败的剧集, 以番剧中最早的发布时间限制 newest_pub_date 的前进, 在写入更新结果时取出 
+uuid_unresolved_pub_date_dict: dict[str, float] = dict() 
+
+
+def _add_unresolved_pub_date(unresolved_pub_date_dict: dict[str, float], uuid: str, pub_date: float) -> None: 
+    unresolved_pub_date_dict[uuid] = min(unresolved_pub_date_dict.get(uuid, pub_date), pub_date) 
 
 
-async def _anime_db_to_anime_update_async(anime_db: AnimeDB) -> AnimeUpdate:
+def _anime_db_to_anime_update(anime_db: AnimeDB) -> AnimeUpdate: 
     return AnimeUpdate(
         uuid=anime_db.uuid, 
         name=anime_db.name, 
@@ -32,105 +39,346 @@ async def _anime_db_to_anime_update_async(anime_db: AnimeDB) -> AnimeUpdate:
         dir_path=anime_db.dir_path, 
         source=anime_db.source, 
         http_url=anime_db.http_url, 
-        episodes_list=list(map(lambda x: int(x) if len(x) > 0 else -1, anime_db.episodes_str.split(','))), 
-        xml=await request_xml_async(anime_db.http_url),  
     ) 
 
 
-async def update_add_task(auto_update: bool) -> dict[str, str | list[dict[str, str]]]: 
-    anime_db_list = inquire_anime_update_ready(auto_update) 
+async def _episode_info_list_to_episode_add_list( 
+        anime_update: AnimeUpdate, episode_info_list: list[tuple[str, int, float, str]] 
+    ) -> list[EpisodeAdd]: 
+    episode_exist_set = await inquire_anime_episode_exist( 
+        anime_update.uuid, {episode_num for _, episode_num, _, _ in episode_info_list} 
+    ) 
 
-    anime_update_list = await asyncio.gather(*(
-        asyncio.create_task(_anime_db_to_anime_update_async(anime_db)) for anime_db in anime_db_list
-    )) 
+    episode_add_list: list[EpisodeAdd] = list() 
+    for _, episode_num, pub_date, torrent_url in reversed(episode_info_list): 
+        if episode_num == -1: 
+            continue 
 
-    # print(anime_db_list)
-    
-    episode_add_list = list() 
-    all_uuid_set = set() 
-    update_uuid_set = set() 
-    for anime_update in anime_update_list: 
-        all_uuid_set.add(anime_update.uuid) 
-        for _, episode_num, pub_date, torrent_url in reversed(anime.get_episode_info(anime_update.source, anime_update.xml)): 
-            if episode_num == -1: 
+        elif episode_num in episode_exist_set: 
+            continue 
+
+        episode_add_list.append(EpisodeAdd( 
+            torrent_url=torrent_url, 
+            uuid=anime_update.uuid, 
+            name=anime_update.name, 
+            season=anime_update.season, 
+            dir_path=str(anime_update.dir_path), 
+            episode_num=episode_num, 
+            pub_date=pub_date, 
+        )) 
+
+    return episode_add_list 
+
+
+async def _request_episode_info_async( 
+        source: AnimeSources, http_url: str, newest_pub_date: float, feed_cache: FeedCacheDB 
+    ) -> tuple[str, list[tuple[str, int, float, str]] | None | Exception]: 
+    # 未变化的 RSS 返回 None, 请求失败的 RSS 返回异常 
+    try: 
+        return http_url, await anime.request_episode_info_async(source, http_url, newest_pub_date, feed_cache) 
+    except Exception as e: 
+        return http_url, e 
+
+
+async def _update_add_worker( 
+        episode_add_queue: asyncio.Queue[list[EpisodeAdd] | None], uuid_set_fail: set[str], uuid_set_retry: set[str], 
+        task_committed_queue: asyncio.Queue[bool | None] | None, 
+    ) -> None: 
+    # uuid_set_fail: 没有任何剧集写入任务队列的番剧; uuid_set_retry: 有剧集没有写入任务队列, 下次需要重新解析 RSS 的番剧 
+    while True: 
+        episode_add_list = await episode_add_queue.get() 
+        if episode_add_list is None: 
+            return 
+
+        try: 
+            episode_add_fail_list = await add_episode_add_list(episode_add_list) 
+        except Exception as e: 
+            print(f'failed to add update task for {episode_add_list[0].name}: {repr(e)}') 
+            episode_add_fail_list = episode_add_list 
+
+        if len(episode_add_fail_list) > 0: 
+            uuid_set_retry.add(episode_add_list[0].uuid) 
+
+        if len(episode_add_fail_list) == len(episode_add_list): 
+            uuid_set_fail.add(episode_add_list[0].uuid) 
+            await change_anime_db_unlock({episode_add_list[0].uuid}) 
+            continue 
+
+        for episode_add in episode_add_fail_list: 
+            _add_unresolved_pub_date(uuid_unresolved_pub_date_dict, episode_add.uuid, episode_add.pub_date) 
+
+        # 任务写入后立即通知下载阶段, 不等待其他 RSS 
+        if task_committed_queue is not None: 
+            task_committed_queue.put_nowait(True) 
+
+
+async def update_add_task( 
+        auto_update: bool, task_committed_queue: asyncio.Queue[bool | None] | None = None 
+    ) -> dict[str, str | list[dict[str, str]]]: 
+    """
+    RSS 请求完成一个处理一个: 解析 -> 与已下载的剧集比较 -> 放入队列, 由 worker 解析种子并写入任务队列 
+
+    没有更新或请求失败的番剧会被立即解锁; 传入 task_committed_queue 时, 每次写入任务后放入 True, 结束时放入 None 
+    """
+    try: 
+        return await _update_add_task(auto_update, task_committed_queue) 
+    finally: 
+        if task_committed_queue is not None: 
+            task_committed_queue.put_nowait(None) 
+
+
+async def _update_add_task( 
+        auto_update: bool, task_committed_queue: asyncio.Queue[bool | None] | None 
+    ) -> dict[str, str | list[dict[str, str]]]: 
+    anime_db_list = await inquire_anime_update_ready(auto_update) 
+
+    # 相同地址的 RSS 只请求一次, 并以其中最早的 newest_pub_date 作为解析的截止时间 
+    http_url_newest_pub_date_dict: dict[str, float] = dict() 
+    http_url_anime_update_list_dict: dict[str, list[AnimeUpdate]] = defaultdict(list) 
+    for anime_db in anime_db_list: 
+        http_url_newest_pub_date_dict[anime_db.http_url] = min( 
+            http_url_newest_pub_date_dict.get(anime_db.http_url, anime_db.newest_pub_date), anime_db.newest_pub_date 
+        ) 
+        http_url_anime_update_list_dict[anime_db.http_url].append(_anime_db_to_anime_update(anime_db)) 
+
+    http_url_feed_cache_dict = await inquire_feed_cache(set(http_url_anime_update_list_dict.keys())) 
+    for http_url in http_url_anime_update_list_dict: 
+        if http_url not in http_url_feed_cache_dict: 
+            http_url_feed_cache_dict[http_url] = FeedCacheDB(http_url=http_url, etag=None, last_modified=None) 
+
+    uuid_set_fail: set[str] = set() 
+    uuid_set_retry: set[str] = set() 
+    episode_add_queue: asyncio.Queue[list[EpisodeAdd] | None] = asyncio.Queue(maxsize=user_settings.update_queue_size) 
+    worker_task_list = [ 
+        asyncio.create_task(_update_add_worker(episode_add_queue, uuid_set_fail, uuid_set_retry, task_committed_queue)) 
+        for _ in range(user_settings.update_add_worker_num) 
+    ] 
+
+    update_num = 0 
+    for next_episode_info in asyncio.as_completed([ 
+        _request_episode_info_async( 
+            anime_update_list[0].source, http_url, 
+            http_url_newest_pub_date_dict[http_url], http_url_feed_cache_dict[http_url], 
+        ) for http_url, anime_update_list in http_url_anime_update_list_dict.items() 
+    ]): 
+        http_url, episode_info_list = await next_episode_info 
+
+        unlock_uuid_set: set[str] = set() 
+        for anime_update in http_url_anime_update_list_dict[http_url]: 
+            if episode_info_list is None: 
+                unlock_uuid_set.add(anime_update.uuid) 
                 continue 
 
-            elif episode_num in anime_update.episodes_list: 
+            elif isinstance(episode_info_list, Exception): 
+                print(f'failed to update {anime_update.name}: {repr(episode_info_list)}') 
+                unlock_uuid_set.add(anime_update.uuid) 
                 continue 
-                
-            else:
-                update_uuid_set.add(anime_update.uuid) 
-
-            episode_add_list.append(EpisodeAdd( 
-                torrent_url=torrent_url, 
-                uuid=anime_update.uuid, 
-                name=anime_update.name, 
-                season=anime_update.season, 
-                dir_path=str(anime_update.dir_path), 
-                episode_num=episode_num, 
-                pub_date=pub_date, 
-            )) 
 
-    # print(episode_add_list) 
-    change_anime_db_unlock(all_uuid_set - update_uuid_set) 
+            episode_add_list = await _episode_info_list_to_episode_add_list(anime_update, episode_info_list) 
+            if len(episode_add_list) == 0: 
+                unlock_uuid_set.add(anime_update.uuid) 
+            else: 
+                await episode_add_queue.put(episode_add_list) 
+                update_num += 1 
+
+        await change_anime_db_unlock(unlock_uuid_set) 
+
+    for _ in worker_task_list: 
+        await episode_add_queue.put(None) 
+    await asyncio.gather(*worker_task_list) 
+
+    # 只有全部剧集都写入任务队列时才保存条件请求的校验值, 否则下次更新时需要重新解析 RSS 
+    http_url_retry_set = { 
+        http_url for http_url, anime_update_list in http_url_anime_update_list_dict.items() 
+        if any(anime_update.uuid in uuid_set_retry for anime_update in anime_update_list) 
+    } 
+    await change_feed_cache( 
+        [feed_cache for http_url, feed_cache in http_url_feed_cache_dict.items() if http_url not in http_url_retry_set], 
+        {anime_db.uuid for anime_db in anime_db_list}, 
+    ) 
+    await delete_feed_cache(uuid_set_retry) 
 
-    if len(episode_add_list) == 0: 
+    if update_num == len(uuid_set_fail): 
         return {'code': 0, 'msg': 'No updates for anime detected', 'detail': []} 
-    
-    await add_episode_add_list(episode_add_list) 
 
     return {'code': 1, 'msg': 'Anime update task added successfully', 'detail': []} 
 
 
-async def _update_download_manager(episode_update_list: list[EpisodeUpdate]) -> None: 
-    torrent_hash_set = {episode.torrent_hash for episode in episode_update_list} 
-    hash_episode_dict = {episode.torrent_hash: episode for episode in episode_update_list} 
+async def _update_download_manager( 
+        episode_update_queue: asyncio.Queue[tuple[list[EpisodeUpdate], dict[str, str], dict[str, str]] | None], 
+        copy_queue: asyncio.Queue[EpisodeUpdate | None], 
+    ) -> None: 
+    """
+    整个更新周期只有一个下载管理, 新认领的任务合并后只添加一次种子, 每轮只刷新一次种子状态 
+
+    收到 None 且没有下载中的种子时, 通知所有复制任务退出 
+    """
+    hash_episode_dict: dict[str, EpisodeUpdate] = dict() 
+    claim_done = False 
+
+    while not claim_done or len(hash_episode_dict) > 0: 
+        # 没有下载中的种子时等待新认领的任务, 否则只取出已经到达的任务 
+        claimed_list = [await episode_update_queue.get()] if len(hash_episode_dict) == 0 else list() 
+        while not episode_update_queue.empty(): 
+            claimed_list.append(episode_update_queue.get_nowait()) 
+
+        episode_update_list: list[EpisodeUpdate] = list() 
+        hash_torrent_url_dict: dict[str, str] = dict() 
+        hash_torrent_file_dict: dict[str, str] = dict() 
+        for claimed in claimed_list: 
+            if claimed is None: 
+                claim_done = True 
+                continue 
+
+            episode_update_list.extend(claimed[0]) 
+            hash_torrent_url_dict.update(claimed[1]) 
+            hash_torrent_file_dict.update(claimed[2]) 
+
+        if len(episode_update_list) > 0: 
+            try: 
+                add_success, completed_hash_set = await _reconcile_torrent(hash_torrent_url_dict, hash_torrent_file_dict) 
+            except Exception as e: 
+                print(f'failed to reconcile torrents: {repr(e)}') 
+                add_success, completed_hash_set = False, set() 
+
+            # 添加失败的剧集不再等待下载, 在周期结束时记为失败 
+            if not add_success: 
+                print("can't connect to the torrent server") 
+                episode_update_list = list() 
+
+            for episode_update in episode_update_list: 
+                # 已经下载完成的种子直接进入复制队列, 不等待轮询 
+                if episode_update.torrent_hash in completed_hash_set: 
+                    id_download_progress_dict[episode_update.id_] = 1. 
+                    episode_update.downloaded = True 
+                    copy_queue.put_nowait(episode_update) 
+                else: 
+                    hash_episode_dict[episode_update.torrent_hash] = episode_update 
+
+        if len(hash_episode_dict) == 0: 
+            continue 
+
+        await torrent_state_poller.refresh() 
+
+        for torrent_hash in list(hash_episode_dict): 
+            torrent_state = torrent_state_poller.get(torrent_hash) 
+            if torrent_state is None: 
+                continue 
+
+            id_download_progress_dict[hash_episode_dict[torrent_hash].id_] = float(torrent_state.get('progress', 0.)) 
+            if _is_torrent_completed(torrent_state): 
+                hash_episode_dict[torrent_hash].downloaded = True 
+                copy_queue.put_nowait(hash_episode_dict.pop(torrent_hash)) 
+
+        if len(hash_episode_dict) > 0: 
+            await asyncio.sleep(user_settings.refresh_time) 
+
+    # 全部下载完成后, 通知所有复制任务退出 
+    for _ in range(user_settings.copy_worker_num): 
+        copy_queue.put_nowait(None) 
+
 
-    while len(torrent_hash_set) > 0: 
-        torrent_info_list = torrent_client.info(torrent_hashes=torrent_hash_set) 
+async def _update_copy_worker(copy_queue: asyncio.Queue[EpisodeUpdate | None]) -> None: 
+    while True: 
+        episode_update = await copy_queue.get() 
+        if episode_update is None: 
+            return 
 
-        for torrent_info in torrent_info_list: 
-            download_progress = float(torrent_info['progress']) 
+        id_copy_progress_dict[episode_update.id_] = .5 
 
-            id_download_progress_dict[hash_episode_dict[torrent_info['infohash_v1']].id_] = download_progress 
-            if download_progress >= 1.: 
-                torrent_hash_set.remove(torrent_info['infohash_v1']) 
-                hash_episode_dict[torrent_info['infohash_v1']].downloaded = True 
+        try: 
+            src_path: str = torrent_state_poller.get(episode_update.torrent_hash).get('content_path', '') 
+            if os.path.isfile(src_path): 
+                dest_path = episode_update.file_path + src_path[src_path.rfind('.'):] 
 
-        await asyncio.sleep(user_settings.refresh_time) 
+                import_strategy = await import_file_async(src_path, dest_path) 
+                print(f'episode {episode_update.uuid} {episode_update.episode_num} imported by {import_strategy}') 
 
+        except Exception as e: 
+            print(f'failed to copy episode {episode_update.uuid} {episode_update.episode_num}: {repr(e)}') 
+            continue 
+
+        episode_update.copied = True 
+        id_copy_progress_dict[episode_update.id_] = 1. 
 
-async def _update_copy_worker(episode_update: EpisodeUpdate) -> None: 
-    while not episode_update.downloaded: 
-        await asyncio.sleep(user_settings.refresh_time) 
 
-    id_copy_progress_dict[episode_update.id_] = .5 
+TORRENT_PAUSED_STATE_SET = {'pausedDL', 'pausedUP', 'stoppedDL', 'stoppedUP'} 
+# 出错或文件丢失的种子需要重新校验, 校验完成之前的进度不能作为下载完成的依据 
+TORRENT_ERROR_STATE_SET = {'error', 'missingFiles'} 
+TORRENT_CHECKING_STATE_SET = {'checkingDL', 'checkingUP', 'checkingResumeData'} 
 
-    src_path: str = torrent_client.info(torrent_hashes=[episode_update.torrent_hash])[0]['content_path'] 
-    if os.path.isfile(src_path): 
-        dest_path = episode_update.file_path + src_path[src_path.rfind('.'):] 
 
-        await copy(src_path, dest_path) 
+def _is_torrent_completed(torrent_state: dict[str, str | float]) -> bool: 
+    return ( 
+        float(torrent_state.get('progress', 0.)) >= 1. 
+        and torrent_state.get('state') not in TORRENT_ERROR_STATE_SET 
+        and torrent_state.get('state') not in TORRENT_CHECKING_STATE_SET 
+    ) 
 
-    episode_update.copied = True 
-    id_copy_progress_dict[episode_update.id_] = 1. 
 
+async def _reconcile_torrent( 
+        hash_torrent_url_dict: dict[str, str], hash_torrent_file_dict: dict[str, str] 
+    ) -> tuple[bool, set[str]]: 
+    """
+    只添加 qBittorrent 中不存在的种子, 恢复已暂停的种子, 重新校验出错的种子, 返回添加是否成功和已下载完成的种子 hash 
+
+    种子以 v1 hash 匹配, 恢复与校验使用 qBittorrent 的种子 id (混合种子为截断的 v2 hash) 
+    """
+    torrent_hash_set = set(hash_torrent_url_dict) | set(hash_torrent_file_dict) 
+    torrent_info_list = await torrent_client.info(torrent_hashes=torrent_hash_set) 
+    hash_torrent_info_dict = { 
+        get_torrent_info_hash(torrent_info): torrent_info for torrent_info in torrent_info_list 
+        if get_torrent_info_hash(torrent_info) in torrent_hash_set 
+    } 
+    torrent_state_poller.merge(list(hash_torrent_info_dict.values())) 
+
+    # torrents/info 按种子 id 过滤, 用 v1 hash 查不到混合种子, 从增量同步的状态中查找 
+    if len(hash_torrent_info_dict) < len(torrent_hash_set): 
+        await torrent_state_poller.refresh() 
+        for torrent_hash in torrent_hash_set - hash_torrent_info_dict.keys(): 
+            torrent_state = torrent_state_poller.get(torrent_hash) 
+            if torrent_state is not None: 
+                hash_torrent_info_dict[torrent_hash] = torrent_state 
+
+    completed_hash_set = { 
+        torrent_hash for torrent_hash, torrent_info in hash_torrent_info_dict.items() if _is_torrent_completed(torrent_info) 
+    } 
+    paused_id_set = { 
+        torrent_info['hash'] for torrent_hash, torrent_info in hash_torrent_info_dict.items() 
+        if torrent_info.get('state') in TORRENT_PAUSED_STATE_SET and torrent_hash not in completed_hash_set 
+    } 
+    errored_id_set = { 
+        torrent_info['hash'] for torrent_info in hash_torrent_info_dict.values() 
+        if torrent_info.get('state') in TORRENT_ERROR_STATE_SET 
+    } 
+
+    if len(paused_id_set) > 0: 
+        await torrent_client.resume(torrent_hashes=paused_id_set) 
+
+    if len(errored_id_set) > 0: 
+        await torrent_client.recheck(torrent_hashes=errored_id_set) 
+
+    res = await torrent_client.add( 
+        torrent_urls=[url for torrent_hash, url in hash_torrent_url_dict.items() if torrent_hash not in hash_torrent_info_dict], 
+        torrent_files=[path for torrent_hash, path in hash_torrent_file_dict.items() if torrent_hash not in hash_torrent_info_dict], 
+    ) 
+
+    return res == 'Ok.', completed_hash_set 
 
-async def update_run_task() -> None: 
-    episode_update_task_db_list = inquire_episode_update_ready() 
+
+async def _inquire_episode_update_batch() -> tuple[list[EpisodeUpdate], dict[str, str], dict[str, str]]: 
+    # 认领当前可以执行的任务, 返回剧集与需要添加的种子地址和种子文件 
+    episode_update_task_db_list = await inquire_episode_update_ready() 
 
     episode_update_list: list[EpisodeUpdate] = list() 
-    torrent_file_path_list: list[str] = list() 
-    torrent_magnet_list: list[str] = list() 
-    torrent_hash_list: list[str] = list()
+    hash_torrent_file_dict: dict[str, str] = dict() 
+    hash_torrent_url_dict: dict[str, str] = dict() 
 
     for episode_update_task_db in episode_update_task_db_list: 
         if episode_update_task_db.torrent_file_path: 
-            torrent_file_path_list.append(episode_update_task_db.torrent_file_path) 
-            torrent_hash_list.append(episode_update_task_db.torrent_hash) 
+            hash_torrent_file_dict[episode_update_task_db.torrent_hash] = episode_update_task_db.torrent_file_path 
         elif episode_update_task_db.torrent_magnet: 
-            torrent_magnet_list.append(episode_update_task_db.torrent_magnet) 
-            torrent_hash_list.append(episode_update_task_db.torrent_hash) 
+            hash_torrent_url_dict[episode_update_task_db.torrent_hash] = episode_update_task_db.torrent_magnet 
         else: 
             continue 
         
@@ -147,57 +395,112 @@ async def update_run_task() -> None:
             ) 
         ) 
 
-    if len(episode_update_list) == 0: 
-        return 
+    return episode_update_list, hash_torrent_url_dict, hash_torrent_file_dict 
 
-    id_set_success: set[str] = set() 
-    id_set_fail: set[str] = set() 
-    uuid_episode_num_list_dict: dict[str, list[int]] = defaultdict(list) 
-    uuid_newest_pub_date: dict[str, float] = defaultdict(float) 
 
-    torrent_client.delete(torrent_hashes=torrent_hash_list) 
+async def _update_claim( 
+        task_committed_queue: asyncio.Queue[bool | None] | None, 
+        episode_update_queue: asyncio.Queue[tuple[list[EpisodeUpdate], dict[str, str], dict[str, str]] | None], 
+        episode_update_list: list[EpisodeUpdate], timeout: asyncio.Timeout, 
+    ) -> None: 
+    """
+    每收到一次写入通知只认领任务并交给下载管理, 同时到达的通知合并为一次认领 
 
-    if torrent_client.add(torrent_urls=torrent_magnet_list, torrent_files=torrent_file_path_list) != 'Ok.': 
-        print("can't connect to the torrent server") 
-        for episode_update in episode_update_list: 
-            id_set_fail.add(episode_update.id_) 
-            uuid_episode_num_list_dict[episode_update.uuid] 
-            uuid_newest_pub_date[episode_update.uuid] 
+    第一次认领到任务时开始计算整个周期的超时, 超时后不再认领, 剩余的任务留到下个周期 
+    """
+    try: 
+        add_task_done = task_committed_queue is None 
+        while True: 
+            if task_committed_queue is not None: 
+                add_task_done = await task_committed_queue.get() is None 
+                while not task_committed_queue.empty(): 
+                    add_task_done = task_committed_queue.get_nowait() is None or add_task_done 
+
+            if not timeout.expired(): 
+                episode_update_batch = await _inquire_episode_update_batch() 
+                if len(episode_update_batch[0]) > 0: 
+                    if timeout.when() is None: 
+                        timeout.reschedule(asyncio.get_running_loop().time() + user_settings.timeout_update) 
+
+                    episode_update_list.extend(episode_update_batch[0]) 
+                    episode_update_queue.put_nowait(episode_update_batch) 
+
+            if add_task_done: 
+                return 
+
+    finally: 
+        episode_update_queue.put_nowait(None) 
+
+
+async def update_run_task(task_committed_queue: asyncio.Queue[bool | None] | None = None) -> None: 
+    """
+    不传入 task_committed_queue 时执行一次全部可以执行的任务 
+
+    传入时与 update_add_task 同时运行: 每收到一次写入通知就认领任务并交给同一个下载管理, 不等待全部 RSS 处理完成; 
+    整个周期共用一个复制队列与固定数量的复制任务, 收到 None 后认领剩余的任务, 全部完成后写入结果 
+    """
+    episode_update_list: list[EpisodeUpdate] = list() 
+    episode_update_queue: asyncio.Queue[tuple[list[EpisodeUpdate], dict[str, str], dict[str, str]] | None] = asyncio.Queue() 
+    copy_queue: asyncio.Queue[EpisodeUpdate | None] = asyncio.Queue() 
 
-        change_episode_update_task_db_update_result(id_set_success, id_set_fail) 
-        change_anime_db_update_result(uuid_episode_num_list_dict, uuid_newest_pub_date) 
-        return 
-    
     try: 
-        async with asyncio.timeout(user_settings.timeout_update): 
+        async with asyncio.timeout(None) as timeout: 
+            claim_task = asyncio.create_task( 
+                _update_claim(task_committed_queue, episode_update_queue, episode_update_list, timeout) 
+            ) 
             await asyncio.gather( 
-                asyncio.create_task(_update_download_manager(episode_update_list)), 
-                *(asyncio.create_task(_update_copy_worker(episode)) for episode in episode_update_list) 
+                asyncio.create_task(_update_download_manager(episode_update_queue, copy_queue)), 
+                *(asyncio.create_task(_update_copy_worker(copy_queue)) for _ in range(user_settings.copy_worker_num)) 
             ) 
     
     except asyncio.TimeoutError: 
         print('the update task timed out') 
         for episode_update in episode_update_list: 
             print('episode uuid: ', episode_update.uuid) 
-            print('episode download progress: ', id_download_progress_dict[episode_update.id_]) 
-            print('episode copy progress: ', id_copy_progress_dict[episode_update.id_]) 
+            print('episode download progress: ', id_download_progress_dict.get(episode_update.id_, 0.)) 
+            print('episode copy progress: ', id_copy_progress_dict.get(episode_update.id_, 0.)) 
             print() 
 
+    await claim_task 
+
+    if len(episode_update_list) == 0: 
+        return 
+
+    id_set_success: set[str] = set() 
+    id_set_fail: set[str] = set() 
+    uuid_set = {episode_update.uuid for episode_update in episode_update_list} 
+    uuid_set_fail: set[str] = set() 
+    uuid_unresolved_pub_date_dict_: dict[str, float] = { 
+        uuid: uuid_unresolved_pub_date_dict.pop(uuid) for uuid in uuid_set if uuid in uuid_unresolved_pub_date_dict 
+    } 
+    anime_episode_db_list: list[AnimeEpisodeDB] = list() 
     for episode_update in episode_update_list: 
         if episode_update.copied: 
             id_set_success.add(episode_update.id_) 
-            uuid_episode_num_list_dict[episode_update.uuid].append(episode_update.episode_num) 
-            uuid_newest_pub_date[episode_update.uuid] = max(uuid_newest_pub_date[episode_update.uuid], episode_update.pub_date) 
+            anime_episode_db_list.append(AnimeEpisodeDB( 
+                uuid=episode_update.uuid, 
+                episode_num=episode_update.episode_num, 
+                pub_date=episode_update.pub_date, 
+                torrent_hash=episode_update.torrent_hash, 
+            )) 
         else: 
             id_set_fail.add(episode_update.id_) 
+            uuid_set_fail.add(episode_update.uuid) 
+            _add_unresolved_pub_date(uuid_unresolved_pub_date_dict_, episode_update.uuid, episode_update.pub_date) 
 
-    change_episode_update_task_db_update_result(id_set_success, id_set_fail) 
-    change_anime_db_update_result(uuid_episode_num_list_dict, uuid_newest_pub_date) 
+    await change_episode_update_task_db_update_result(id_set_success, id_set_fail) 
+    await change_anime_db_update_result(uuid_set, anime_episode_db_list, uuid_unresolved_pub_date_dict_) 
+    await delete_feed_cache(uuid_set_fail) 
 
     media_client.refresh() 
 
 
 async def update_auto_update() -> None: 
-    _ = await update_add_task(auto_update=True) 
-    await update_run_task() 
+    task_committed_queue: asyncio.Queue[bool | None] = asyncio.Queue() 
+    run_task = asyncio.create_task(update_run_task(task_committed_queue)) 
+
+    try: 
+        _ = await update_add_task(auto_update=True, task_committed_queue=task_committed_queue) 
+    finally: 
+        await run_task 
 
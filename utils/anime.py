@@ -2,11 +2,15 @@ import os
 import re 
 from hashlib import sha1 
 from urllib.parse import quote 
-from typing import Callable 
+from typing import AsyncIterable, AsyncIterator, Callable 
 from xml.etree import ElementTree 
 from datetime import datetime, timezone 
 
 from settings import AnimeSources, user_settings 
+from database import FeedCacheDB 
+from utils.request import request_xml_stream_async 
+from utils.scheduler import fetch_scheduler 
+from utils.singleflight import SingleFlight 
 
 
 def get_uuid(name: str, season: int) -> str: 
@@ -43,7 +47,9 @@ def get_http_url(source: AnimeSources, search_text: str) -> str:
     return anime_http_url_constructor[source.value](search_text) 
 
 
-def _xml_parser_generator(time_format: str) -> Callable[[str], list[tuple[str, int, float, str]]]: 
+def _xml_parser_generator( 
+        time_format: str 
+    ) -> Callable[[AsyncIterable[bytes], float], AsyncIterator[tuple[str, int, float, str]]]: 
 
     def _parse_episode(name: str) -> int: 
         res = -1
@@ -55,30 +61,40 @@ def _xml_parser_generator(time_format: str) -> Callable[[str], list[tuple[str, i
 
         return int(res) 
 
-    def _xml_parser(xml: str) -> list[tuple[str, int, float, str]]: 
-        episode_info_list: list[tuple[str, int, float, str]] = list() 
+    async def _xml_parser( 
+            content: AsyncIterable[bytes], newest_pub_date: float = 0. 
+        ) -> AsyncIterator[tuple[str, int, float, str]]: 
+        """
+        边读取边解析, RSS 按发布时间从新到旧排列, 遇到早于 newest_pub_date 的条目即停止 
+        """
+        parser = ElementTree.XMLPullParser(events=('end', )) 
 
         try: 
-            root = ElementTree.fromstring(xml).find('channel') 
-        except: 
-            print(xml) 
-            return list() 
-
-        for item in root.iter(tag='item'): 
-            title: str = item.find('title').text 
-            episode_num: int = _parse_episode(title) 
-            
-            pub_date = datetime.strptime(
-                item.find('pubDate').text, time_format
-            ).astimezone(timezone.utc).timestamp() 
-            torrent_url = item.find('enclosure').attrib['url'] 
-
-            episode_info_list.append((
-                title, episode_num, 
-                pub_date, torrent_url, 
-            ))
-
-        return episode_info_list 
+            async for chunk in content: 
+                parser.feed(chunk) 
+
+                for _, item in parser.read_events(): 
+                    if item.tag != 'item': 
+                        continue 
+
+                    pub_date = datetime.strptime( 
+                        item.find('pubDate').text, time_format 
+                    ).astimezone(timezone.utc).timestamp() 
+                    if pub_date < newest_pub_date: 
+                        return 
+
+                    title: str = item.find('title').text 
+                    episode_num: int = _parse_episode(title) 
+                    torrent_url = item.find('enclosure').attrib['url'] 
+                    item.clear() 
+
+                    yield title, episode_num, pub_date, torrent_url 
+
+            parser.close() 
+
+        except ElementTree.ParseError as e: 
+            print(e) 
+            return 
 
     return _xml_parser 
 
@@ -90,6 +106,71 @@ anime_xml_parser = {
 } 
 
 
-def get_episode_info(source: AnimeSources, xml: str) -> list[tuple[str, int, float, str]]: 
-    return anime_xml_parser[source.value](xml) 
+feed_single_flight = SingleFlight() 
+
+
+def get_episode_info( 
+        source: AnimeSources, content: AsyncIterable[bytes], newest_pub_date: float = 0. 
+    ) -> AsyncIterator[tuple[str, int, float, str]]: 
+    return anime_xml_parser[source.value](content, newest_pub_date) 
+
+
+async def _request_episode_info_async( 
+        source: AnimeSources, http_url: str, newest_pub_date: float, feed_cache: FeedCacheDB, 
+    ) -> tuple[list[tuple[str, int, float, str]] | None, FeedCacheDB]: 
+    async with request_xml_stream_async(http_url, feed_cache) as content: 
+        if content is None: 
+            return None, feed_cache 
+
+        return [ 
+            episode_info async for episode_info in get_episode_info(source, content, newest_pub_date) 
+        ], feed_cache 
+
+
+async def _request_episode_info_shared_async( 
+        source: AnimeSources, http_url: str, newest_pub_date: float, etag: str | None, last_modified: str | None, 
+    ) -> tuple[tuple[str | None, str | None], float, list[tuple[str, int, float, str]] | None, FeedCacheDB]: 
+    # 同时返回发送的校验值与解析的截止时间, 用于判断共享的结果对其他调用者是否成立 
+    feed_cache = FeedCacheDB(http_url=http_url, etag=etag, last_modified=last_modified) 
+
+    episode_info_list, feed_cache = await fetch_scheduler.run( 
+        source, _request_episode_info_async, source, http_url, newest_pub_date, feed_cache 
+    ) 
+
+    return (etag, last_modified), newest_pub_date, episode_info_list, feed_cache 
+
+
+async def request_episode_info_async( 
+        source: AnimeSources, http_url: str, 
+        newest_pub_date: float = 0., feed_cache: FeedCacheDB | None = None, 
+    ) -> list[tuple[str, int, float, str]] | None: 
+    """
+    请求并解析 RSS, 相同来源和地址的请求在进行中或 ttl 内只会执行一次, 解析在发起者的 newest_pub_date 处停止, 结果按调用者的 newest_pub_date 过滤 
+
+    传入 feed_cache 时发送条件请求, 未变化的 RSS 返回 None 
+    """
+    validators = (None, None) if feed_cache is None else (feed_cache.etag, feed_cache.last_modified) 
+
+    request_validators, request_newest_pub_date, episode_info_list, shared_feed_cache = await feed_single_flight.do( 
+        (source.value, http_url), user_settings.feed_single_flight_ttl, 
+        _request_episode_info_shared_async, source, http_url, newest_pub_date, *validators, 
+    ) 
+
+    # 共享的条件请求返回 304, 但当前调用者的校验值不同 (例如搜索时没有校验值); 
+    # 或共享的解析在更晚的发布时间停止, 缺少当前调用者需要的条目, 都需要单独请求 
+    if ( 
+        (episode_info_list is None and request_validators != validators) 
+        or (episode_info_list is not None and newest_pub_date < request_newest_pub_date) 
+    ): 
+        _, _, episode_info_list, shared_feed_cache = await _request_episode_info_shared_async( 
+            source, http_url, newest_pub_date, *validators 
+        ) 
+
+    if feed_cache is not None: 
+        feed_cache.etag = shared_feed_cache.etag 
+        feed_cache.last_modified = shared_feed_cache.last_modified 
+
+    if episode_info_list is None: 
+        return None 
 
+    return [episode_info for episode_info in episode_info_list if episode_info[2] >= newest_pub_date] 
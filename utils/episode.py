@@ -1,10 +1,123 @@
 import os 
+import asyncio 
+import tempfile 
+from hashlib import sha1 
 from base64 import b32decode 
+from typing import Iterator 
+from urllib.parse import parse_qs, urlsplit 
 
 from pydantic import AnyUrl 
-from torf import Torrent 
 
-from utils.request import request_tmp_file_async 
+from settings import user_settings 
+from utils.request import request_bytes_async 
+
+
+def _bencode_skip(data: bytes, pos: int) -> int: 
+    # 返回从 pos 开始的 bencode 值的结束位置 
+    depth = 0 
+    while True: 
+        token = data[pos:pos + 1] 
+        if token == b'i': 
+            pos = data.index(b'e', pos) + 1 
+        elif token == b'l' or token == b'd': 
+            depth += 1 
+            pos += 1 
+            continue 
+        elif token == b'e' and depth > 0: 
+            depth -= 1 
+            pos += 1 
+        elif token.isdigit(): 
+            colon = data.index(b':', pos) 
+            pos = colon + 1 + int(data[pos:colon]) 
+        else: 
+            raise ValueError(f'unexpected bencode token {token} at {pos}') 
+
+        if pos > len(data): 
+            raise ValueError('bencode value out of range') 
+
+        if depth == 0: 
+            return pos 
+
+
+def _bencode_dict_items(data: bytes, pos: int) -> Iterator[tuple[bytes, int, int]]: 
+    # 依次返回从 pos 开始的 bencode 字典的键, 以及对应值的起止位置 
+    if data[pos:pos + 1] != b'd': 
+        raise ValueError(f'bencode dict expected at {pos}') 
+
+    pos += 1 
+    while data[pos:pos + 1] != b'e': 
+        key_end = _bencode_skip(data, pos) 
+        key = data[data.index(b':', pos) + 1:key_end] 
+        value_end = _bencode_skip(data, key_end) 
+
+        yield key, key_end, value_end 
+
+        pos = value_end 
+
+
+def get_torrent_infohash(torrent: bytes) -> str: 
+    """
+    直接对种子中 info 字典的原始字节计算 sha1, 支持 v1 与 hybrid 种子 
+    """
+    try: 
+        for key, info_start, info_end in _bencode_dict_items(torrent, 0): 
+            if key != b'info': 
+                continue 
+
+            info_key_set = {info_key for info_key, _, _ in _bencode_dict_items(torrent, info_start)} 
+            if b'pieces' not in info_key_set: 
+                raise AssertionError('v2 only torrent not support yet') 
+
+            return sha1(torrent[info_start:info_end]).hexdigest() 
+
+    except (ValueError, IndexError) as e: 
+        raise AssertionError(f'torrent file is not valid: {e}') 
+
+    raise AssertionError('there is no info in torrent file') 
+
+
+def get_torrent_dir_path() -> str: 
+    return os.path.join(user_settings.work_path, 'torrents') 
+
+
+def save_torrent_file(torrent_hash: str, torrent: bytes) -> str: 
+    torrent_dir_path = get_torrent_dir_path() 
+    os.makedirs(torrent_dir_path, exist_ok=True) 
+
+    torrent_file_path = os.path.join(torrent_dir_path, f'{torrent_hash}.torrent') 
+    if not os.path.isfile(torrent_file_path): 
+        # 先写入同一目录下的临时文件再替换, 写入中断时不会留下不完整的种子文件 
+        fd, temp_file_path = tempfile.mkstemp(suffix='.tmp', dir=torrent_dir_path) 
+        try: 
+            with os.fdopen(fd, mode='wb') as f: 
+                f.write(torrent) 
+            os.replace(temp_file_path, torrent_file_path) 
+        except BaseException: 
+            os.remove(temp_file_path) 
+            raise 
+
+    return torrent_file_path 
+
+
+def get_magnet_infohash(torrent_magnet: str) -> str: 
+    """
+    从磁力链接的 xt 参数中取出 v1 infohash, 统一为小写的 16 进制 
+    """
+    xt_list = parse_qs(urlsplit(torrent_magnet).query).get('xt') 
+    if not xt_list: 
+        raise AssertionError(f'there is no xt in torrent magnet {torrent_magnet}') 
+
+    xt = next((xt for xt in xt_list if xt[:9] == 'urn:btih:'), None) 
+    if xt is None: 
+        raise AssertionError(f'torrent magnet xt {xt_list[0]} scheme not support yet') 
+
+    infohash = xt[9:] 
+    if len(infohash) == 32: 
+        return b32decode(infohash.upper()).hex() 
+    elif len(infohash) == 40: 
+        return infohash.lower() 
+    else: 
+        raise AssertionError(f'torrent magnet infohash {infohash} length not correct') 
 
 
 async def parse_torrent_url_async(torrent_url: AnyUrl) -> tuple[str, str, str]: 
@@ -15,27 +128,15 @@ async def parse_torrent_url_async(torrent_url: AnyUrl) -> tuple[str, str, str]:
 
     if torrent_url.scheme == 'http' or torrent_url.scheme == 'https': 
         torrent_magnet = '' 
-        torrent_file_path = await request_tmp_file_async(torrent_url.unicode_string()) 
-        torrent_hash = Torrent.read(torrent_file_path).infohash 
+        torrent = await request_bytes_async(torrent_url.unicode_string()) 
+        torrent_hash = get_torrent_infohash(torrent) 
+        torrent_file_path = await asyncio.to_thread(save_torrent_file, torrent_hash, torrent) 
 
     elif torrent_url.scheme == 'magnet': 
         torrent_file_path = '' 
         torrent_magnet = torrent_url.unicode_string() 
 
-        xt = torrent_url.query[3:torrent_url.query.find('&')] 
-        if xt is None: 
-            raise AssertionError(f'there is no xt in torrent magnet {torrent_magnet}') 
-
-        elif xt[:9] != 'urn:btih:': 
-            raise AssertionError(f'torrent magnet xt {xt} scheme not support yet') 
-        
-        infohash = xt[9:] 
-        if len(infohash) == 32:
-            torrent_hash = b32decode(infohash).hex() 
-        elif len(infohash) == 40: 
-            torrent_hash = infohash 
-        else: 
-            raise AssertionError(f'torrent magnet infohash {infohash} length not correct') 
+        torrent_hash = get_magnet_infohash(torrent_magnet) 
 
     else: 
         raise AssertionError(f'torrent url {torrent_url} scheme not support yet') 
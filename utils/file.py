@@ -0,0 +1,112 @@
+import os 
+import shutil 
+import asyncio 
+from typing import Callable 
+
+try: 
+    import fcntl 
+except ImportError: 
+    fcntl = None 
+
+from settings import ImportStrategies, user_settings 
+
+
+FICLONE = 0x40049409 
+CHUNK_SIZE = 1024 * 1024 
+
+
+def _hardlink(src_path: str, dest_path: str) -> None: 
+    os.link(src_path, dest_path) 
+
+
+def _rename(src_path: str, dest_path: str) -> None: 
+    os.rename(src_path, dest_path) 
+
+
+def _reflink(src_path: str, dest_path: str) -> None: 
+    if fcntl is None: 
+        raise OSError('reflink is not supported on this platform') 
+
+    with open(src_path, mode='rb') as fsrc, open(dest_path, mode='wb') as fdest: 
+        fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno()) 
+
+
+def _copy_file_range(src_path: str, dest_path: str) -> None: 
+    if not hasattr(os, 'copy_file_range'): 
+        raise OSError('copy_file_range is not supported on this platform') 
+
+    with open(src_path, mode='rb') as fsrc, open(dest_path, mode='wb') as fdest: 
+        remain = os.fstat(fsrc.fileno()).st_size 
+        while remain > 0: 
+            copied = os.copy_file_range(fsrc.fileno(), fdest.fileno(), min(remain, 1 << 30)) 
+            if copied == 0: 
+                raise OSError('copy_file_range stopped before the end of file') 
+            remain -= copied 
+
+
+def _sendfile(src_path: str, dest_path: str) -> None: 
+    if not hasattr(os, 'sendfile'): 
+        raise OSError('sendfile is not supported on this platform') 
+
+    with open(src_path, mode='rb') as fsrc, open(dest_path, mode='wb') as fdest: 
+        offset = 0 
+        size = os.fstat(fsrc.fileno()).st_size 
+        while offset < size: 
+            sent = os.sendfile(fdest.fileno(), fsrc.fileno(), offset, min(size - offset, 1 << 30)) 
+            if sent == 0: 
+                raise OSError('sendfile stopped before the end of file') 
+            offset += sent 
+
+
+def _copy(src_path: str, dest_path: str) -> None: 
+    with open(src_path, mode='rb') as fsrc, open(dest_path, mode='wb') as fdest: 
+        shutil.copyfileobj(fsrc, fdest, length=CHUNK_SIZE) 
+
+
+import_methods: dict[str, Callable[[str, str], None]] = { 
+    'hardlink': _hardlink, 
+    'reflink': _reflink, 
+    'rename': _rename, 
+    'copy_file_range': _copy_file_range, 
+    'sendfile': _sendfile, 
+    'copy': _copy, 
+} 
+
+
+def _get_import_method_names(src_path: str, dest_path: str) -> list[str]: 
+    byte_copy_method_names = ['copy_file_range', 'sendfile', 'copy'] 
+
+    if user_settings.import_strategy == ImportStrategies.copy: 
+        return ['copy'] 
+
+    elif user_settings.import_strategy != ImportStrategies.auto: 
+        return [user_settings.import_strategy.value] + byte_copy_method_names 
+
+    # 同一文件系统上优先使用硬链接和 reflink, 不占用额外的空间
+    if os.stat(src_path).st_dev == os.stat(os.path.dirname(dest_path)).st_dev: 
+        return ['hardlink', 'reflink'] + byte_copy_method_names 
+
+    return byte_copy_method_names 
+
+
+def import_file(src_path: str, dest_path: str) -> str: 
+    """
+    按顺序尝试各导入方式, 返回实际使用的方式 
+    """
+    method_name_list = list(dict.fromkeys(_get_import_method_names(src_path, dest_path))) 
+
+    for method_name in method_name_list: 
+        if os.path.lexists(dest_path): 
+            os.remove(dest_path) 
+
+        try: 
+            import_methods[method_name](src_path, dest_path) 
+        except OSError as e: 
+            if method_name == method_name_list[-1]: 
+                raise e 
+        else: 
+            return method_name 
+
+
+async def import_file_async(src_path: str, dest_path: str) -> str: 
+    return await asyncio.to_thread(import_file, src_path, dest_path) 
@@ -1,31 +1,105 @@
-from tempfile import NamedTemporaryFile 
+from typing import AsyncIterator 
+from contextlib import asynccontextmanager 
 
-from aiohttp import ClientSession, ClientTimeout 
+from aiohttp import ClientSession, ClientTimeout, TCPConnector 
 
 from settings import user_settings 
+from database import FeedCacheDB 
 
 
-async def request_tmp_file_async(url: str) -> str:
-    proxy = user_settings.http_proxy 
-    if proxy: 
-        proxy = user_settings.http_proxy.unicode_string() 
-    
-    async with ClientSession(timeout=ClientTimeout(total=user_settings.timeout_proxy)) as session: 
-        async with session.get(url, proxy=proxy) as resp: 
-            content = await resp.content.read() 
-            with NamedTemporaryFile(delete=False) as fp: 
-                fp.write(content) 
+client_session: ClientSession | None = None 
+# 创建会话时使用的连接池配置, 重新加载配置后与之比较 
+client_session_settings: tuple[int, int, int, int] | None = None 
 
-                return fp.name 
-            
 
-async def request_xml_async(url: str) -> str: 
+def _get_proxy() -> str | None: 
     proxy = user_settings.http_proxy 
     if proxy: 
         proxy = user_settings.http_proxy.unicode_string() 
 
-    async with ClientSession(timeout=ClientTimeout(total=user_settings.timeout_proxy)) as session: 
-        async with session.get(url, proxy=proxy) as resp: 
+    return proxy 
+
+
+def _get_client_session_settings() -> tuple[int, int, int, int]: 
+    return ( 
+        user_settings.http_max_connections, 
+        user_settings.http_max_connections_per_host, 
+        user_settings.http_keepalive_timeout, 
+        user_settings.http_dns_cache_ttl, 
+    ) 
+
+
+async def open_client_session() -> ClientSession: 
+    global client_session, client_session_settings 
+
+    if client_session is None or client_session.closed: 
+        client_session_settings = _get_client_session_settings() 
+        connector = TCPConnector( 
+            limit=user_settings.http_max_connections, 
+            limit_per_host=user_settings.http_max_connections_per_host, 
+            keepalive_timeout=user_settings.http_keepalive_timeout, 
+            ttl_dns_cache=user_settings.http_dns_cache_ttl, 
+        ) 
+        client_session = ClientSession(connector=connector) 
+
+    return client_session 
+
+
+async def close_client_session() -> None: 
+    global client_session 
+
+    if client_session is not None and not client_session.closed: 
+        await client_session.close() 
+
+    client_session = None 
+
+
+async def reopen_client_session() -> ClientSession: 
+    # 配置重新加载后连接池的配置有变化时, 关闭原来的会话并按新的配置创建 
+    if client_session is not None and client_session_settings != _get_client_session_settings(): 
+        await close_client_session() 
+
+    return await open_client_session() 
+
+
+async def request_bytes_async(url: str) -> bytes: 
+    session = await open_client_session() 
+
+    async with session.get(url, proxy=_get_proxy(), timeout=ClientTimeout(total=user_settings.timeout_proxy)) as resp: 
+
+        return await resp.read() 
+
+
+@asynccontextmanager 
+async def request_xml_stream_async( 
+        url: str, feed_cache: FeedCacheDB | None = None 
+    ) -> AsyncIterator[AsyncIterator[bytes] | None]: 
+    """
+    以流的形式返回 RSS 的内容, 避免将整个 XML 读入内存 
+
+    传入 feed_cache 时发送条件请求, 并在内容处理完成后就地更新其中的 ETag / Last-Modified, 若服务器返回 304, 则返回 None 
+    """
+    session = await open_client_session() 
+
+    headers: dict[str, str] = dict() 
+    if feed_cache is not None: 
+        if feed_cache.etag: 
+            headers['If-None-Match'] = feed_cache.etag 
+        if feed_cache.last_modified: 
+            headers['If-Modified-Since'] = feed_cache.last_modified 
+
+    async with session.get( 
+        url, proxy=_get_proxy(), headers=headers, timeout=ClientTimeout(total=user_settings.timeout_proxy) 
+    ) as resp: 
+        if feed_cache is not None and resp.status == 304: 
+            yield None 
+            return 
+
+        resp.raise_for_status() 
+
+        yield resp.content.iter_chunked(64 * 1024) 
 
-            return await resp.text() 
-        
+        # 内容被正常处理后才更新, 以免请求失败后的重试命中 304 
+        if feed_cache is not None: 
+            feed_cache.etag = resp.headers.get('ETag') 
+            feed_cache.last_modified = resp.headers.get('Last-Modified') 
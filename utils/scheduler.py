@@ -0,0 +1,88 @@
+import time 
+import random 
+import asyncio 
+from collections import defaultdict 
+from typing import Any, Awaitable, Callable 
+
+from aiohttp import ClientError, ClientResponseError 
+
+from settings import AnimeSources, user_settings 
+
+
+# 4xx 中只有请求超时和请求过多可以重试, 其余为永久性错误 
+RETRYABLE_CLIENT_ERROR_STATUS_SET = {408, 429} 
+
+
+class CircuitOpenError(Exception): 
+    pass 
+
+
+def _is_retryable(e: Exception) -> bool: 
+    if isinstance(e, ClientResponseError) and 400 <= e.status < 500: 
+        return e.status in RETRYABLE_CLIENT_ERROR_STATUS_SET 
+
+    return True 
+
+
+class FetchScheduler: 
+    """
+    按来源限制同时进行的请求数, 失败时以带抖动的指数退避重试 
+
+    同一来源连续失败达到阈值后熔断, 冷却期内直接跳过该来源, 冷却期后的第一次请求若仍失败则再次熔断 
+    """
+    def __init__(self): 
+        self.semaphore_dict: dict[str, asyncio.Semaphore] = dict() 
+        self.max_in_flight = user_settings.fetch_max_in_flight_per_source 
+        self.failure_count_dict: dict[str, int] = defaultdict(int) 
+        self.open_until_dict: dict[str, float] = defaultdict(float) 
+
+    def is_open(self, source: AnimeSources) -> bool: 
+        return time.monotonic() < self.open_until_dict[source.value] 
+
+    def _get_semaphore(self, source: AnimeSources) -> asyncio.Semaphore: 
+        # 重新加载配置后按新的并发数创建, 进行中的请求仍释放原来的 Semaphore 
+        if self.max_in_flight != user_settings.fetch_max_in_flight_per_source: 
+            self.max_in_flight = user_settings.fetch_max_in_flight_per_source 
+            self.semaphore_dict = dict() 
+
+        if source.value not in self.semaphore_dict: 
+            self.semaphore_dict[source.value] = asyncio.Semaphore(user_settings.fetch_max_in_flight_per_source) 
+
+        return self.semaphore_dict[source.value] 
+
+    def _record_success(self, source: AnimeSources) -> None: 
+        self.failure_count_dict[source.value] = 0 
+
+    def _record_failure(self, source: AnimeSources) -> None: 
+        self.failure_count_dict[source.value] += 1 
+        if self.failure_count_dict[source.value] >= user_settings.fetch_circuit_breaker_threshold: 
+            self.open_until_dict[source.value] = time.monotonic() + user_settings.fetch_circuit_breaker_cooldown 
+            print(f'source {source.value} is skipped for {user_settings.fetch_circuit_breaker_cooldown} seconds') 
+
+    async def run(self, source: AnimeSources, func: Callable[..., Awaitable[Any]], *args: Any) -> Any: 
+        for attempt in range(user_settings.fetch_retry_times + 1): 
+            if self.is_open(source): 
+                raise CircuitOpenError(f'source {source.value} is temporarily unavailable') 
+
+            try: 
+                async with self._get_semaphore(source): 
+                    res = await func(*args) 
+
+            except (ClientError, asyncio.TimeoutError) as e: 
+                # 永久性错误说明来源本身可用, 不计入熔断 
+                if not _is_retryable(e): 
+                    raise e 
+
+                if attempt == user_settings.fetch_retry_times: 
+                    self._record_failure(source) 
+                    raise e 
+
+                # 退避期间不占用并发数 
+                await asyncio.sleep(random.uniform(0, user_settings.fetch_retry_backoff * 2 ** attempt)) 
+
+            else: 
+                self._record_success(source) 
+                return res 
+
+
+fetch_scheduler = FetchScheduler() 
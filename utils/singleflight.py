@@ -0,0 +1,41 @@
+import time 
+import asyncio 
+from typing import Any, Awaitable, Callable, Hashable 
+
+
+class SingleFlight: 
+    """
+    相同 key 的并发调用共享同一个正在进行的任务, 成功的结果在 ttl 秒内可以被之后的调用复用 
+    """
+    def __init__(self): 
+        self.flight_dict: dict[Hashable, asyncio.Task] = dict() 
+        self.result_dict: dict[Hashable, tuple[float, Any]] = dict() 
+
+    def _purge(self) -> None: 
+        now = time.monotonic() 
+        for key in [key for key, (expire, _) in self.result_dict.items() if expire <= now]: 
+            del self.result_dict[key] 
+
+    async def _run(self, key: Hashable, ttl: float, func: Callable[..., Awaitable[Any]], *args: Any) -> Any: 
+        try: 
+            res = await func(*args) 
+        finally: 
+            del self.flight_dict[key] 
+
+        self._purge() 
+        if ttl > 0: 
+            self.result_dict[key] = (time.monotonic() + ttl, res) 
+
+        return res 
+
+    async def do(self, key: Hashable, ttl: float, func: Callable[..., Awaitable[Any]], *args: Any) -> Any: 
+        if key in self.result_dict: 
+            expire, res = self.result_dict[key] 
+            if time.monotonic() < expire: 
+                return res 
+
+        if key not in self.flight_dict: 
+            self.flight_dict[key] = asyncio.create_task(self._run(key, ttl, func, *args)) 
+
+        # 某个调用者被取消时, 不影响共享的任务和其他调用者
+        return await asyncio.shield(self.flight_dict[key]) 
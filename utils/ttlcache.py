@@ -0,0 +1,77 @@
+import time 
+import asyncio 
+from collections import OrderedDict 
+from typing import Any, Awaitable, Callable, Hashable 
+
+
+class TTLCache: 
+    """
+    有容量上限的 LRU 缓存, 结果在 ttl 秒内直接返回 
+
+    超过 ttl 但未超过 stale_ttl 的结果仍会立即返回, 同时在后台重新请求; 超过 stale_ttl 的结果需要等待重新请求 
+
+    同一个结果会返回给所有调用者, 缓存的值应当是不可变的, 例如元组 
+    """
+    def __init__(self): 
+        self.entry_dict: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict() 
+        self.refresh_task_dict: dict[Hashable, asyncio.Task] = dict() 
+        self.hits = 0 
+        self.stale_hits = 0 
+        self.misses = 0 
+
+    def _put(self, key: Hashable, max_size: int, value: Any) -> None: 
+        self.entry_dict[key] = (time.monotonic(), value) 
+        self.entry_dict.move_to_end(key) 
+        while len(self.entry_dict) > max_size: 
+            self.entry_dict.popitem(last=False) 
+
+    async def _refresh(self, key: Hashable, max_size: int, func: Callable[..., Awaitable[Any]], *args: Any) -> None: 
+        try: 
+            self._put(key, max_size, await func(*args)) 
+        except Exception as e: 
+            print(f'failed to refresh cache {key}: {repr(e)}') 
+        finally: 
+            del self.refresh_task_dict[key] 
+
+    async def get_or_fetch( 
+            self, key: Hashable, ttl: float, stale_ttl: float, max_size: int, 
+            func: Callable[..., Awaitable[Any]], *args: Any 
+        ) -> Any: 
+        if key in self.entry_dict: 
+            created_at, value = self.entry_dict[key] 
+            age = time.monotonic() - created_at 
+
+            if age < ttl: 
+                self.hits += 1 
+                self.entry_dict.move_to_end(key) 
+                return value 
+
+            elif age < stale_ttl: 
+                self.stale_hits += 1 
+                self.entry_dict.move_to_end(key) 
+                if key not in self.refresh_task_dict: 
+                    self.refresh_task_dict[key] = asyncio.create_task(self._refresh(key, max_size, func, *args)) 
+                return value 
+
+        self.misses += 1 
+        value = await func(*args) 
+        self._put(key, max_size, value) 
+
+        return value 
+
+    async def cancel_refresh_tasks(self) -> None: 
+        # 关闭时后台的重新请求不再需要, 取消后等待其结束 
+        refresh_task_list = list(self.refresh_task_dict.values()) 
+        for refresh_task in refresh_task_list: 
+            refresh_task.cancel() 
+
+        await asyncio.gather(*refresh_task_list, return_exceptions=True) 
+
+    def stats(self) -> dict[str, int]: 
+        return { 
+            'size': len(self.entry_dict), 
+            'hits': self.hits, 
+            'stale_hits': self.stale_hits, 
+            'misses': self.misses, 
+            'refreshing': len(self.refresh_task_dict), 
+        } 